@@ -0,0 +1,30 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: a7d3e91b5c20
+Revises: f2c6a8d41e57
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e91b5c20'
+down_revision: Union[str, Sequence[str], None] = 'f2c6a8d41e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_conversation_created_id', 'messages', ['conversation_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_notifications_user_created_id', 'notifications', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notifications_user_created_id', table_name='notifications')
+    op.drop_index('ix_messages_conversation_created_id', table_name='messages')
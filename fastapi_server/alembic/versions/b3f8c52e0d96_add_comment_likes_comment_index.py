@@ -0,0 +1,28 @@
+"""add_comment_likes_comment_index
+
+Revision ID: b3f8c52e0d96
+Revises: a7d3e91b5c20
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f8c52e0d96'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e91b5c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_comment_likes_comment_user', 'comment_likes', ['comment_id', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comment_likes_comment_user', table_name='comment_likes')
@@ -0,0 +1,40 @@
+"""add_post_counter_columns
+
+Revision ID: c41d7e2a9b10
+Revises: ad4c0e918c26
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e2a9b10'
+down_revision: Union[str, Sequence[str], None] = 'ad4c0e918c26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the association/comment tables; later drift is repaired by
+    # crud.reconcile_post_counters (reconcile_counters.py).
+    op.execute(
+        """
+        UPDATE posts SET
+            likes_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id),
+            comments_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('posts', 'comments_count')
+    op.drop_column('posts', 'likes_count')
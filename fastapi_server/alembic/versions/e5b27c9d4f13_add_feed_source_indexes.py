@@ -0,0 +1,36 @@
+"""add_feed_source_indexes
+
+Revision ID: e5b27c9d4f13
+Revises: d8a3f5b61c27
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b27c9d4f13'
+down_revision: Union[str, Sequence[str], None] = 'd8a3f5b61c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_posts_user_created', 'posts', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_posts_group_created', 'posts', ['group_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_profiles_user_id'), 'profiles', ['user_id'], unique=False)
+    op.create_index('ix_profiles_university_user', 'profiles', ['university', 'user_id'], unique=False)
+    op.create_index('ix_group_members_user_id', 'group_members', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_group_members_user_id', table_name='group_members')
+    op.drop_index('ix_profiles_university_user', table_name='profiles')
+    op.drop_index(op.f('ix_profiles_user_id'), table_name='profiles')
+    op.drop_index('ix_posts_group_created', table_name='posts')
+    op.drop_index('ix_posts_user_created', table_name='posts')
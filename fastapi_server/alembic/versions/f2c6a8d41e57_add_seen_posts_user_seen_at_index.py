@@ -0,0 +1,28 @@
+"""add_seen_posts_user_seen_at_index
+
+Revision ID: f2c6a8d41e57
+Revises: e5b27c9d4f13
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a8d41e57'
+down_revision: Union[str, Sequence[str], None] = 'e5b27c9d4f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_seen_posts_user_seen_at', 'seen_posts', ['user_id', 'seen_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_seen_posts_user_seen_at', table_name='seen_posts')
@@ -0,0 +1,108 @@
+# async_crud.py
+"""
+AsyncSession variants of the hot-path crud functions.
+
+Simple lookups are written as native async queries. The larger transactional
+functions reuse the sync implementations in crud.py through
+`AsyncSession.run_sync`, which executes them on the async connection (no
+worker-thread hop) and keeps a single source of truth for their logic.
+run_sync runs on the event loop thread, so feed ranking, which is CPU-heavy
+and fills caches guarded by threading locks (feed_window, social_graph), runs
+in a worker thread on a sync session instead.
+"""
+import asyncio
+from typing import Optional, Tuple
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import crud, feed_inbox, feed_session, models, schemas
+
+# --- Auth lookup ---
+
+async def get_user(db: AsyncSession, user_id: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    return result.scalar_one_or_none()
+
+# --- Feed ---
+
+async def get_feed_page(db: AsyncSession, sync_db: Session, user_id: str, cursor: Optional[str] = None, skip: int = 0, limit: int = 50, seed: float = None):
+    """`sync_db` ranks new snapshots in a worker thread; pages are loaded on `db`."""
+    session_id, snapshot, position = feed_session.find_snapshot(user_id, cursor, skip, seed)
+    if snapshot is None:
+        # Not run_sync: a cache lock held across a query that yields to the event loop
+        # would block the loop as soon as a second request waited on it.
+        post_ids = await asyncio.to_thread(crud.rank_feed_post_ids, sync_db, user_id)
+        snapshot = feed_session.store_snapshot(session_id, user_id, post_ids)
+    return await db.run_sync(feed_session.load_page, snapshot, session_id, position, limit)
+
+async def get_inbox_feed(db: AsyncSession, user_id: str, skip: int = 0, limit: int = 50, seed: float = None):
+    return await db.run_sync(feed_inbox.get_inbox_feed, user_id, skip, limit, seed)
+
+# --- Likes ---
+
+async def like_post_returning_count(db: AsyncSession, post_id: int, user_id: str) -> Optional[Tuple[bool, int]]:
+    if db.get_bind().dialect.name != "postgresql":
+        return await db.run_sync(crud.like_post_returning_count, post_id, user_id)
+    try:
+        result = await db.execute(crud.LIKE_POST_SQL, {"post_id": post_id, "user_id": user_id})
+        post_exists, added, likes_count = result.one()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return (added, likes_count or 0) if post_exists else None
+
+async def add_post_like_ultra_performance(db: AsyncSession, post_id: int, user_id: str) -> bool:
+    result = await like_post_returning_count(db, post_id, user_id)
+    return bool(result and result[0])
+
+async def remove_post_like_transactional(db: AsyncSession, post_id: int, user_id: str) -> bool:
+    return await db.run_sync(crud.remove_post_like_transactional, post_id, user_id)
+
+# --- Messages ---
+
+async def is_user_in_conversation(db: AsyncSession, user_id: str, conversation_id: int) -> bool:
+    result = await db.execute(
+        select(
+            exists().where(
+                and_(
+                    models.conversation_participants.c.user_id == user_id,
+                    models.conversation_participants.c.conversation_id == conversation_id,
+                )
+            )
+        )
+    )
+    return bool(result.scalar())
+
+async def get_messages(db: AsyncSession, conversation_id: int, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    return await db.run_sync(crud.get_messages, conversation_id, skip, limit, cursor)
+
+async def create_message_transactional(db: AsyncSession, msg: schemas.MessageCreate, sender_id: str, conversation_id: int = None):
+    return await db.run_sync(crud.create_message_transactional, msg, sender_id, conversation_id)
+
+# --- Notifications ---
+
+async def get_notifications(db: AsyncSession, user_id: str, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    return await db.run_sync(crud.get_notifications, user_id, skip, limit, cursor)
+
+async def get_unread_notification_count(db: AsyncSession, user_id: str) -> int:
+    result = await db.execute(
+        select(func.count(models.Notification.id)).where(
+            models.Notification.user_id == user_id,
+            models.Notification.is_read == False,
+        )
+    )
+    return result.scalar() or 0
+
+async def mark_notifications_read_transactional(db: AsyncSession, user_id: str):
+    return await db.run_sync(crud.mark_notifications_read_transactional, user_id)
+
+async def mark_notification_read(db: AsyncSession, notification_id: int, user_id: str):
+    return await db.run_sync(crud.mark_notification_read, notification_id, user_id)
+
+
+# --- ALIASES (mirroring crud.py) ---
+add_post_like = add_post_like_ultra_performance
+remove_post_like = remove_post_like_transactional
+create_message = create_message_transactional
+mark_notifications_read = mark_notifications_read_transactional
@@ -0,0 +1,30 @@
+import os
+import sys
+import argparse
+from sqlalchemy.orm import Session
+
+# Add the parent directory to the path so we can import the fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi_server.database import SessionLocal
+from fastapi_server import feed_inbox
+
+def backfill(days: int, batch_size: int):
+    db: Session = SessionLocal()
+    try:
+        print(f"Fanning out posts from the last {days} day(s) into feed_items...")
+        processed = feed_inbox.backfill_feed_inbox(db, days=days, batch_size=batch_size)
+        print(f"Done. Processed {processed} post(s); inbox rows older than the horizon were pruned.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Populate the fan-out-on-write feed inbox from existing posts.")
+    parser.add_argument("--days", "-d", type=int, default=feed_inbox.INBOX_DAYS, help="How far back to fan out posts.")
+    parser.add_argument("--batch-size", "-b", type=int, default=500, help="Posts per transaction.")
+
+    args = parser.parse_args()
+
+    backfill(days=args.days, batch_size=args.batch_size)
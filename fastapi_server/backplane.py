@@ -0,0 +1,219 @@
+# backplane.py
+"""
+Cross-worker broadcast for WebSocket events.
+
+Each worker keeps its own WebSocket connections (routers/messages.py), so a
+message sent through worker A used to reach only the recipients connected to A.
+The sending worker now delivers to its own connections and publishes an
+envelope to the backplane. Every worker subscribes and delivers the envelopes
+from the other workers:
+
+    {"origin": <worker id>, "participants": [user ids], "payload": {...}}
+
+Implementations:
+
+  PostgresBackplane  LISTEN/NOTIFY on WS_BACKPLANE_CHANNEL over one asyncpg
+                     connection per worker. LISTEN needs a session, so this
+                     connection cannot go through Supabase's transaction pooler
+                     on 6543. WS_BACKPLANE_URL defaults to DATABASE_URL on the
+                     session-mode port 5432. NOTIFY payloads are capped at
+                     8000 bytes (`max_payload`). If the connection drops, it
+                     reconnects with backoff, and envelopes published
+                     meanwhile reach only the sending worker's connections.
+  LocalBackplane     in-process. Backplanes sharing a LoopbackHub see each
+                     other's envelopes, which is how tests and the benchmark
+                     run several "workers" in one process. Alone it is a
+                     no-op, which matches a single worker.
+
+WS_BACKPLANE picks one: postgres, local, or auto (the default), which uses
+postgres when DATABASE_URL points at PostgreSQL.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Awaitable, Callable, List, Optional, Set
+
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+BACKPLANE_MODE = os.getenv("WS_BACKPLANE", "auto").lower()
+BACKPLANE_CHANNEL = os.getenv("WS_BACKPLANE_CHANNEL", "gounion_ws")
+SESSION_POOLER_PORT = 5432
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+NOTIFY_MAX_BYTES = 7900
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Backplane:
+    """Publishes envelopes to every worker; `start` registers the handler for incoming ones."""
+
+    max_payload: Optional[int] = None
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._handler: Optional[Handler] = None
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._handler = None
+
+    async def publish(self, envelope: dict) -> None:
+        raise NotImplementedError
+
+    async def _dispatch(self, envelope: dict) -> None:
+        if envelope.get("origin") == self.worker_id or self._handler is None:
+            return
+        self.received += 1
+        try:
+            await self._handler(envelope)
+        except Exception as e:
+            logger.warning(f"[backplane] Handler failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "publish_errors": self.publish_errors,
+        }
+
+
+class LoopbackHub:
+    def __init__(self):
+        self.members: List["LocalBackplane"] = []
+
+
+class LocalBackplane(Backplane):
+    def __init__(self, hub: LoopbackHub = None):
+        super().__init__()
+        self.hub = hub or LoopbackHub()
+        self.hub.members.append(self)
+
+    async def publish(self, envelope: dict) -> None:
+        self.published += 1
+        envelope = {**envelope, "origin": self.worker_id}
+        for member in list(self.hub.members):
+            if member is not self:
+                await member._dispatch(envelope)
+
+
+class PostgresBackplane(Backplane):
+    max_payload = NOTIFY_MAX_BYTES
+
+    def __init__(self, dsn: str, channel: str = BACKPLANE_CHANNEL, ssl=None):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.ssl = ssl
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # The loop only keeps weak references to tasks; hold dispatches until they finish.
+        self._dispatches: Set[asyncio.Task] = set()
+        self.reconnects = 0
+
+    async def start(self, handler: Handler) -> None:
+        await super().start(handler)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        delay = 1.0
+        while True:
+            try:
+                conn = await asyncpg.connect(self.dsn, ssl=self.ssl)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _conn: lost.set())
+                await conn.add_listener(self.channel, self._on_notify)
+                self._conn = conn
+                delay = 1.0
+                logger.info(f"[backplane] Listening on {self.channel}")
+                await lost.wait()
+                logger.warning("[backplane] Connection lost; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[backplane] Connect failed: {e}; retrying in {delay:.0f}s")
+            self._conn = None
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str) -> None:
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            return
+        task = asyncio.get_running_loop().create_task(self._dispatch(envelope))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def publish(self, envelope: dict) -> None:
+        conn = self._conn
+        if conn is None:
+            self.publish_errors += 1
+            return
+        data = json.dumps({**envelope, "origin": self.worker_id}, separators=(",", ":"), default=str)
+        try:
+            async with self._lock:
+                await conn.execute("SELECT pg_notify($1, $2)", self.channel, data)
+            self.published += 1
+        except Exception as e:
+            self.publish_errors += 1
+            logger.warning(f"[backplane] Publish failed: {e}")
+
+    def stats(self) -> dict:
+        return {**super().stats(), "connected": self._conn is not None, "reconnects": self.reconnects}
+
+
+def backplane_dsn(raw_url: str):
+    """asyncpg DSN and ssl setting for LISTEN: the session-mode port for Supabase's pooler."""
+    raw_url = (raw_url or "").strip()
+    if raw_url.startswith("postgres://"):
+        raw_url = raw_url.replace("postgres://", "postgresql://", 1)
+    if not raw_url.startswith("postgresql"):
+        return None, None
+    url = make_url(raw_url).set(drivername="postgresql")
+    supabase = "supabase.com" in (url.host or "")
+    if supabase and url.port == 6543:
+        url = url.set(port=SESSION_POOLER_PORT)
+    ssl = "require" if supabase or url.query.get("sslmode") == "require" else None
+    url = url.difference_update_query(["sslmode"])
+    return url.render_as_string(hide_password=False), ssl
+
+
+def create_backplane(mode: str = BACKPLANE_MODE) -> Backplane:
+    if mode in {"auto", "postgres"}:
+        dsn, ssl = backplane_dsn(os.getenv("WS_BACKPLANE_URL") or os.getenv("DATABASE_URL", ""))
+        if dsn:
+            return PostgresBackplane(dsn, ssl=ssl)
+        if mode == "postgres":
+            logger.warning("[backplane] WS_BACKPLANE=postgres but no PostgreSQL URL is set; using the local backplane.")
+    return LocalBackplane()
+
+
+backplane = create_backplane()
@@ -0,0 +1,104 @@
+"""
+Deep pagination: OFFSET vs keyset cursors (pagination.py).
+
+Fills a throwaway SQLite file with --posts posts, then reads one page at
+increasing depths through crud.get_posts, once with `skip` (OFFSET) and once
+with the cursor a client would hold at that point. Reports the median of
+--repeat reads in milliseconds. OFFSET has to step over every skipped row,
+while the cursor seeks straight to the page through the created_at index.
+
+Usage:
+  python fastapi_server/benchmarks/deep_pagination.py [--posts 200000] [--limit 50] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models
+from fastapi_server.database import Base
+from fastapi_server.pagination import encode_cursor
+
+
+def build(db, posts: int, rng: random.Random):
+    authors = [f"author-{i}" for i in range(100)]
+    db.execute(models.User.__table__.insert(), [
+        {"id": uid, "username": uid, "email": f"{uid}@example.com", "role": "user", "is_active": True}
+        for uid in authors
+    ])
+    start = datetime(2026, 1, 1)
+    for offset in range(0, posts, 10000):
+        db.execute(models.Post.__table__.insert(), [
+            {
+                "user_id": rng.choice(authors),
+                "caption": f"post {i}",
+                # Whole seconds, so many posts share a timestamp and ties fall back to id.
+                "created_at": start + timedelta(seconds=rng.randint(0, posts // 4)),
+                "likes_count": 0,
+                "comments_count": 0,
+            }
+            for i in range(offset, min(offset + 10000, posts))
+        ])
+    db.commit()
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OFFSET and keyset pagination at increasing depth.")
+    parser.add_argument("--posts", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'pages_bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autoflush=False, bind=engine)()
+        started = time.perf_counter()
+        build(db, args.posts, random.Random(args.seed))
+        print(f"{args.posts} posts built in {time.perf_counter() - started:.1f}s, page size {args.limit}")
+
+        depths = [d for d in (0, 1000, 10000, 50000, 100000, args.posts - args.limit) if d <= args.posts - args.limit]
+        print(f"{'depth':>8} {'offset ms':>10} {'cursor ms':>10} {'speedup':>8}")
+        for depth in depths:
+            cursor = None
+            if depth:
+                # The cursor a client holds after scrolling `depth` rows: the key of the last row seen.
+                row = (
+                    db.query(models.Post.created_at, models.Post.id)
+                    .order_by(models.Post.created_at.desc(), models.Post.id.desc())
+                    .offset(depth - 1)
+                    .first()
+                )
+                cursor = encode_cursor(list(row))
+                offset_ids = [p["id"] for p in crud.get_posts(db, skip=depth, limit=args.limit)[0]]
+                cursor_ids = [p["id"] for p in crud.get_posts(db, limit=args.limit, cursor=cursor)[0]]
+                assert offset_ids == cursor_ids, "offset and cursor pages differ"
+            offset_ms = timed(lambda: crud.get_posts(db, skip=depth, limit=args.limit), args.repeat)
+            cursor_ms = timed(lambda: crud.get_posts(db, limit=args.limit, cursor=cursor), args.repeat)
+            db.expunge_all()
+            print(f"{depth:>8} {offset_ms:>10.2f} {cursor_ms:>10.2f} {offset_ms / cursor_ms:>7.1f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
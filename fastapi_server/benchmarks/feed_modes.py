@@ -0,0 +1,137 @@
+"""
+Feed read latency: scan (crud.get_feed_posts_optimized) vs fan-out-on-write inbox
+(feed_inbox.get_inbox_feed) on a synthetic social graph.
+
+Builds the graph in a throwaway SQLite file: users with a skewed follower
+distribution (a few high-fanout authors), accepted friendships, and posts spread
+over the last 14 days. The inbox is populated with feed_inbox.backfill_feed_inbox,
+whose duration is reported as the write-side cost.
+
+Usage:
+  python fastapi_server/benchmarks/feed_modes.py [--users 1000] [--posts 5000] [--follows 40] [--samples 100]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, feed_inbox, models
+from fastapi_server.database import Base
+
+UNIVERSITIES = ["UNILAG", "UI", "OAU", "UNN", "ABU", "UNIBEN"]
+
+
+def build_graph(db, users: int, posts: int, follows: int, friends: int, rng: random.Random) -> list:
+    user_ids = [f"user-{i}" for i in range(users)]
+    db.execute(models.User.__table__.insert(), [
+        {"id": uid, "username": uid, "email": f"{uid}@example.com", "role": "user", "is_active": True}
+        for uid in user_ids
+    ])
+    db.execute(models.Profile.__table__.insert(), [
+        {"user_id": uid, "university": rng.choice(UNIVERSITIES)} for uid in user_ids
+    ])
+
+    # Zipf-ish popularity: low-index users collect most follows.
+    weights = [1.0 / (i + 1) for i in range(users)]
+    follow_rows = set()
+    for uid in user_ids:
+        for target in rng.choices(user_ids, weights=weights, k=follows):
+            if target != uid:
+                follow_rows.add((uid, target))
+    db.execute(models.Follow.__table__.insert(), [
+        {"follower_id": a, "following_id": b} for a, b in follow_rows
+    ])
+
+    friend_rows = set()
+    for uid in user_ids:
+        for other in rng.sample(user_ids, friends):
+            if other != uid and (other, uid) not in friend_rows:
+                friend_rows.add((uid, other))
+    db.execute(models.FriendRequest.__table__.insert(), [
+        {"sender_id": a, "receiver_id": b, "status": "accepted"} for a, b in friend_rows
+    ])
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.execute(models.Post.__table__.insert(), [
+        {
+            "user_id": rng.choice(user_ids),
+            "caption": f"post {i}",
+            "created_at": now - timedelta(seconds=rng.randint(0, 14 * 24 * 3600)),
+            "likes_count": rng.randint(0, 50),
+            "comments_count": rng.randint(0, 10),
+        }
+        for i in range(posts)
+    ])
+    db.commit()
+    return user_ids
+
+
+def measure(fn, db, user_ids, limit):
+    timings = []
+    for uid in user_ids:
+        started = time.perf_counter()
+        fn(db, uid, 0, limit)
+        timings.append((time.perf_counter() - started) * 1000.0)
+        db.expunge_all()
+    timings.sort()
+    return {
+        "p50": timings[len(timings) // 2],
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "mean": statistics.fmean(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare scan and inbox feed reads on a synthetic graph.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--follows", type=int, default=40, help="Follows per user (skewed towards popular users).")
+    parser.add_argument("--friends", type=int, default=10, help="Friendships started per user.")
+    parser.add_argument("--samples", type=int, default=100, help="Users whose feed is read per mode.")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--max-followers", type=int, default=500, help="High-fanout threshold (FEED_FANOUT_MAX_FOLLOWERS).")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    feed_inbox.FANOUT_MAX_FOLLOWERS = args.max_followers
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'feed_bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autoflush=False, bind=engine)()
+
+        started = time.perf_counter()
+        user_ids = build_graph(db, args.users, args.posts, args.follows, args.friends, rng)
+        print(f"Graph: {args.users} users, {args.posts} posts, built in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        feed_inbox.backfill_feed_inbox(db)
+        fanout_s = time.perf_counter() - started
+        inbox_rows = db.query(models.FeedItem).count()
+        high_fanout = len(feed_inbox.high_fanout_authors(db))
+        print(f"Fan-out: {inbox_rows} inbox rows in {fanout_s:.1f}s ({inbox_rows / max(args.posts, 1):.1f} per post), "
+              f"{high_fanout} high-fanout author(s) served on read")
+
+        sample = rng.sample(user_ids, min(args.samples, len(user_ids)))
+        print(f"{'mode':<6} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+        for name, fn in (("scan", crud.get_feed_posts_optimized), ("inbox", feed_inbox.get_inbox_feed)):
+            r = measure(fn, db, sample, args.limit)
+            print(f"{name:<6} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['mean']:>9.2f}")
+
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Feed scoring microbenchmark: the original per-post Python loop vs
+feed_scoring.rank_candidates (NumPy, and its pure-Python fallback).
+
+Candidates are synthetic (no database). Each size is ranked in full and for a
+50-post page, the case where argpartition only sorts the selected slice.
+
+Usage:
+  python fastapi_server/benchmarks/feed_scoring.py [--sizes 400,5000,50000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi_server import feed_scoring
+from fastapi_server.feed_window import Candidate
+
+UNIVERSITIES = ["UNILAG", "UI", "OAU", "UNN", "ABU", "UNIBEN"]
+
+
+def legacy_loop(candidates, user_id, user_university, friend_ids, following_ids, limit, now):
+    """The scoring loop get_feed_posts_optimized used before feed_scoring.py."""
+    ranked_posts = []
+    for c in candidates:
+        if c.user_id == user_id:
+            social_weight = 120
+        elif c.user_id in friend_ids:
+            social_weight = 100
+        elif c.user_id in following_ids:
+            social_weight = 80
+        else:
+            social_weight = 10
+        local_weight = 50 if (user_university and c.university == user_university) else 0
+        engagement_boost = min(c.likes_count * 2, 200)
+        total_weight = social_weight + local_weight + engagement_boost
+        hours = (now - c.created_at).total_seconds() / 3600.0
+        ranked_posts.append((c, total_weight / ((hours + 2) ** 1.2)))
+    ranked_posts.sort(key=lambda x: (-x[1], x[0].created_at))
+    return [c for c, _ in ranked_posts[:limit]]
+
+
+def make_candidates(size, rng, now):
+    authors = [f"user-{i}" for i in range(max(size // 10, 50))]
+    return [
+        Candidate(
+            i,
+            rng.choice(authors),
+            None,
+            now - timedelta(seconds=rng.randint(0, 14 * 24 * 3600)),
+            rng.choice(UNIVERSITIES),
+            rng.randint(0, 150),
+            rng.randint(0, 20),
+        )
+        for i in range(size)
+    ]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare feed scoring implementations.")
+    parser.add_argument("--sizes", default="400,5000,50000", help="Comma-separated candidate counts.")
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    if feed_scoring.np is None:
+        print("numpy is not installed; the 'numpy' column falls back to the Python ranking.")
+
+    print(f"{'candidates':>10} {'rank':<5} {'loop ms':>9} {'numpy ms':>9} {'python ms':>10} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        candidates = make_candidates(size, rng, now)
+        authors = sorted({c.user_id for c in candidates})
+        friends = set(rng.sample(authors, min(20, len(authors))))
+        following = set(rng.sample(authors, min(60, len(authors))))
+        viewer = authors[0]
+        for label, limit in (("all", size), ("page", args.page)):
+            expected = legacy_loop(candidates, viewer, "UNILAG", friends, following, limit, now)
+            for use_numpy in (True, False):
+                got = feed_scoring.rank_candidates(
+                    candidates, viewer, "UNILAG", friends, following, limit=limit, now=now, use_numpy=use_numpy
+                )
+                assert [c.id for c in got] == [c.id for c in expected], "rankings differ"
+
+            loop_ms = timed(lambda: legacy_loop(candidates, viewer, "UNILAG", friends, following, limit, now), args.repeat)
+            numpy_ms = timed(lambda: feed_scoring.rank_candidates(
+                candidates, viewer, "UNILAG", friends, following, limit=limit, now=now
+            ), args.repeat)
+            python_ms = timed(lambda: feed_scoring.rank_candidates(
+                candidates, viewer, "UNILAG", friends, following, limit=limit, now=now, use_numpy=False
+            ), args.repeat)
+            print(f"{size:>10} {label:<5} {loop_ms:>9.2f} {numpy_ms:>9.2f} {python_ms:>10.2f} {loop_ms / numpy_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Feed read latency (crud.get_feed_posts_optimized) as post volume grows.
+
+Candidates come from per-source quotas (feed_sources.py), so read cost should
+stay roughly flat while the posts table grows. For each volume this builds the
+synthetic graph from feed_modes.py in a fresh SQLite file and times feed reads
+with the shared candidate window enabled and disabled (all sources from SQL).
+
+Usage:
+  python fastapi_server/benchmarks/feed_sources.py [--volumes 5000,20000,80000] [--users 1000] [--samples 100]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, feed_window
+from fastapi_server.benchmarks.feed_modes import build_graph, measure
+from fastapi_server.database import Base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure feed read latency at increasing post volumes.")
+    parser.add_argument("--volumes", default="5000,20000,80000", help="Comma-separated post counts.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--follows", type=int, default=40)
+    parser.add_argument("--friends", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'posts':>8} {'window':<7} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for volume in (int(v) for v in args.volumes.split(",")):
+        rng = random.Random(args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'feed_sources.db')}")
+            Base.metadata.create_all(bind=engine)
+            db = sessionmaker(autoflush=False, bind=engine)()
+            user_ids = build_graph(db, args.users, volume, args.follows, args.friends, rng)
+            sample = rng.sample(user_ids, min(args.samples, len(user_ids)))
+
+            for enabled in (True, False):
+                feed_window.WINDOW_ENABLED = enabled
+                feed_window.candidate_window.clear()
+                crud.get_feed_posts_optimized(db, sample[0], 0, args.limit)  # warm the window
+                r = measure(crud.get_feed_posts_optimized, db, sample, args.limit)
+                print(f"{volume:>8} {'on' if enabled else 'off':<7} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['mean']:>9.2f}")
+
+            db.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    main()
+    print(f"done in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,196 @@
+"""
+Lock contention on a viral post: direct likes vs like_buffer write combining.
+
+--threads concurrent clients each like the same post once per user, with a
+double tap every --duplicate-every likes. Each like runs through
+LikeBuffer.like on its own session, the way one request would. Combining is
+switched off for the direct run and on for the combined run. Reported per mode:
+
+  likes/s        throughput across all clients
+  p50/p95 ms     per-like latency
+  row updates    UPDATE posts statements issued, i.e. transactions that took
+                 the post's row lock
+  update wait    total seconds spent inside those UPDATE statements, which on
+                 PostgreSQL is mostly time queued on the row lock (SQLite waits
+                 on its database lock at commit, so there it shows in p95)
+  max waiting    PostgreSQL only: the most ungranted locks seen in pg_locks by
+                 a sampler thread
+
+Uses a throwaway SQLite file by default. Pass --url to run against a scratch
+PostgreSQL database; the benchmark creates tables there and deletes its rows
+afterwards.
+
+Usage:
+  python fastapi_server/benchmarks/like_contention.py [--url postgresql://...] [--threads 32] [--users 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, delete, event, text
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import like_buffer, models
+from fastapi_server.database import Base, normalize_database_url
+from fastapi_server.like_buffer import LikeBuffer
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+class UpdateTimer:
+    """Counts and times UPDATE posts statements on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE POSTS"):
+            conn.info["update_started"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("update_started", None)
+        if started is not None:
+            with self._lock:
+                self.count += 1
+                self.seconds += time.perf_counter() - started
+
+    def reset(self):
+        with self._lock:
+            self.count, self.seconds = 0, 0.0
+
+
+def sample_lock_waits(engine, stop: threading.Event, result: dict):
+    with engine.connect() as conn:
+        while not stop.is_set():
+            waiting = conn.execute(text("SELECT count(*) FROM pg_locks WHERE NOT granted")).scalar()
+            result["max_waiting"] = max(result.get("max_waiting", 0), waiting)
+            conn.rollback()
+            stop.wait(0.01)
+
+
+def seed(engine, users: int, prefix: str):
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        user_ids = [f"{prefix}-{i}" for i in range(users)]
+        db.execute(models.User.__table__.insert(), [
+            {"id": uid, "username": uid, "email": f"{uid}@example.com", "role": "user", "is_active": True}
+            for uid in user_ids
+        ])
+        post = models.Post(user_id=user_ids[0], caption=f"{prefix} viral", likes_count=0, comments_count=0)
+        db.add(post)
+        db.commit()
+        return user_ids, post.id
+
+
+def cleanup(engine, user_ids, post_id):
+    with sessionmaker(bind=engine)() as db:
+        db.execute(delete(models.Notification).where(models.Notification.post_id == post_id))
+        db.execute(delete(models.post_likes).where(models.post_likes.c.post_id == post_id))
+        db.execute(delete(models.Post).where(models.Post.id == post_id))
+        db.execute(delete(models.User).where(models.User.id.in_(user_ids)))
+        db.commit()
+
+
+def run_mode(engine, timer, name, combine, threads, users, duplicate_every):
+    like_buffer.COMBINING_ENABLED = combine
+    Session = sessionmaker(autoflush=False, bind=engine)
+    buffer = LikeBuffer(session_factory=Session)
+    user_ids, post_id = seed(engine, users, f"bench-{name}")
+    timings = []
+    lock = threading.Lock()
+
+    def client(batch):
+        local = []
+        db = Session()
+        try:
+            for i, uid in enumerate(batch, 1):
+                for _ in range(2 if duplicate_every and i % duplicate_every == 0 else 1):
+                    started = time.perf_counter()
+                    buffer.like(db, post_id, uid)
+                    local.append((time.perf_counter() - started) * 1000.0)
+        finally:
+            db.close()
+        with lock:
+            timings.extend(local)
+
+    stop = threading.Event()
+    lock_waits = {}
+    sampler = None
+    if engine.dialect.name == "postgresql":
+        sampler = threading.Thread(target=sample_lock_waits, args=(engine, stop, lock_waits), daemon=True)
+        sampler.start()
+    timer.reset()
+    workers = [threading.Thread(target=client, args=(user_ids[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    buffer.flush()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if sampler is not None:
+        sampler.join()
+
+    with Session() as db:
+        stored = db.get(models.Post, post_id).likes_count
+    cleanup(engine, user_ids, post_id)
+    return {
+        "likes": len(timings),
+        "likes_per_s": len(timings) / elapsed,
+        "p50": _percentile(timings, 0.50),
+        "p95": _percentile(timings, 0.95),
+        "row_updates": timer.count,
+        "update_wait": timer.seconds,
+        "max_waiting": lock_waits.get("max_waiting", "-"),
+        "correct": stored == users,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure row-lock contention of direct and combined likes on one post.")
+    parser.add_argument("--url", default=None, help="Scratch database URL (default: a temporary SQLite file).")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent clients.")
+    parser.add_argument("--users", type=int, default=2000, help="Distinct users liking the post.")
+    parser.add_argument("--duplicate-every", type=int, default=10, help="Double-tap every Nth like.")
+    parser.add_argument("--flush-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    like_buffer.FLUSH_MS = args.flush_ms
+    like_buffer.HOT_PER_SECOND = 1
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            engine = create_engine(normalize_database_url(args.url), pool_size=args.threads + 2)
+        else:
+            engine = create_engine(
+                f"sqlite:///{os.path.join(tmp, 'like_contention.db')}",
+                connect_args={"check_same_thread": False, "timeout": 60},
+            )
+        Base.metadata.create_all(bind=engine)
+        timer = UpdateTimer(engine)
+        print(f"Database: {engine.dialect.name}, {args.threads} clients, {args.users} users, flush every {args.flush_ms:g} ms")
+        print(f"{'mode':<10} {'likes':>6} {'likes/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'row updates':>12} {'update wait s':>14} {'max waiting':>12} {'count ok':>9}")
+        for name, combine in (("direct", False), ("combined", True)):
+            r = run_mode(engine, timer, name, combine, args.threads, args.users, args.duplicate_every)
+            print(
+                f"{name:<10} {r['likes']:>6} {r['likes_per_s']:>8.0f} {r['p50']:>7.2f} {r['p95']:>7.2f} "
+                f"{r['row_updates']:>12} {r['update_wait']:>14.2f} {r['max_waiting']:>12} {str(r['correct']):>9}"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Likes per second per worker: the old multi-query like path vs
+crud.like_post_returning_count.
+
+  multi-query   author lookup, existence check, insert, counter bump,
+                notification check + insert, commit, then a separate
+                likes_count read (what POST /posts/{id}/like used to do)
+  single        crud.like_post_returning_count: one statement plus commit on
+                PostgreSQL, a short portable sequence elsewhere
+
+Each mode likes every post once per user from a single session, the same way
+one worker handles requests, with a duplicate like every --duplicate-every
+calls. Uses a throwaway SQLite file by default. Pass --url to run against a
+scratch PostgreSQL database; the benchmark creates tables there and
+deletes its rows afterwards.
+
+Usage:
+  python fastapi_server/benchmarks/like_throughput.py [--url postgresql://...] [--users 200] [--posts 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models
+from fastapi_server.database import Base, normalize_database_url
+
+
+def like_multi_query(db, post_id: int, user_id: str):
+    """The pre-CTE like path, kept here as the baseline."""
+    try:
+        author_id = db.query(models.Post.user_id).filter(models.Post.id == post_id).scalar()
+        if not author_id:
+            return None
+        existing = db.execute(
+            select(models.post_likes.c.user_id).where(
+                models.post_likes.c.post_id == post_id,
+                models.post_likes.c.user_id == user_id,
+            )
+        ).first()
+        added = False
+        if not existing:
+            db.execute(models.post_likes.insert().values(post_id=post_id, user_id=user_id))
+            crud._bump_post_counter(db, post_id, models.Post.likes_count, 1)
+            if author_id != user_id:
+                notified = (
+                    db.query(models.Notification.id)
+                    .filter(
+                        models.Notification.user_id == author_id,
+                        models.Notification.sender_id == user_id,
+                        models.Notification.type == "like",
+                        models.Notification.post_id == post_id,
+                        models.Notification.group_id.is_(None),
+                    )
+                    .first()
+                )
+                if not notified:
+                    db.add(models.Notification(
+                        user_id=author_id, sender_id=user_id, type="like", post_id=post_id, is_read=False
+                    ))
+            db.commit()
+            added = True
+        return added, crud.get_post_likes_count(db, post_id)
+    except Exception:
+        db.rollback()
+        raise
+
+
+MODES = [
+    ("multi-query", like_multi_query),
+    ("single", crud.like_post_returning_count),
+]
+
+
+def seed(db, users: int, posts: int, prefix: str):
+    user_ids = [f"{prefix}-user-{i}" for i in range(users)]
+    db.execute(models.User.__table__.insert(), [
+        {"id": uid, "username": uid, "email": f"{uid}@example.com", "role": "user", "is_active": True}
+        for uid in user_ids
+    ])
+    db.execute(models.Post.__table__.insert(), [
+        {"user_id": user_ids[i % users], "caption": f"{prefix} post {i}", "likes_count": 0, "comments_count": 0}
+        for i in range(posts)
+    ])
+    db.commit()
+    post_ids = [pid for (pid,) in db.query(models.Post.id).filter(models.Post.user_id.in_(user_ids))]
+    return user_ids, post_ids
+
+
+def cleanup(db, user_ids, post_ids):
+    db.execute(delete(models.Notification).where(models.Notification.sender_id.in_(user_ids)))
+    db.execute(delete(models.post_likes).where(models.post_likes.c.post_id.in_(post_ids)))
+    db.execute(delete(models.Post).where(models.Post.id.in_(post_ids)))
+    db.execute(delete(models.User).where(models.User.id.in_(user_ids)))
+    db.commit()
+
+
+def run_mode(engine, name, like, users, posts, duplicate_every):
+    db = sessionmaker(autoflush=False, bind=engine)()
+    user_ids, post_ids = seed(db, users, posts, f"bench-{name}")
+    calls = 0
+    try:
+        started = time.perf_counter()
+        for uid in user_ids:
+            for post_id in post_ids:
+                like(db, post_id, uid)
+                calls += 1
+                if duplicate_every and calls % duplicate_every == 0:
+                    like(db, post_id, uid)
+                    calls += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        cleanup(db, user_ids, post_ids)
+        db.close()
+    return calls, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare like throughput of the multi-query and single-statement paths.")
+    parser.add_argument("--url", default=None, help="Scratch database URL (default: a temporary SQLite file).")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--duplicate-every", type=int, default=10, help="Repeat every Nth like to exercise the no-op path.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = normalize_database_url(args.url) if args.url else f"sqlite:///{os.path.join(tmp, 'likes_bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        print(f"Database: {engine.dialect.name}, {args.users} users x {args.posts} posts")
+        print(f"{'mode':<12} {'likes':>8} {'seconds':>9} {'likes/s':>9}")
+        for name, like in MODES:
+            calls, elapsed = run_mode(engine, name, like, args.users, args.posts, args.duplicate_every)
+            print(f"{name:<12} {calls:>8} {elapsed:>9.2f} {calls / elapsed:>9.0f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
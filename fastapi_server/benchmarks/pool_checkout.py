@@ -0,0 +1,102 @@
+"""
+Checkout latency of the client-side pooling strategies database.py can pick.
+
+Runs `SELECT 1` through a checkout/return cycle many times per strategy and
+reports p50/p95/p99 latency in milliseconds:
+
+  session       QueuePool + pool_pre_ping (the pre-pooler-mode default)
+  tx-small      transaction mode, small QueuePool, no pre-ping
+  tx-null       transaction mode, NullPool (fresh client connection per checkout)
+
+Usage:
+  python fastapi_server/benchmarks/pool_checkout.py [--url postgresql://...] [--iterations 200] [--concurrency 4]
+
+Defaults to DATABASE_URL. Point it at the Supabase 6543 endpoint to measure the
+real pooler; the numbers against a local PostgreSQL only show the client-side cost.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import text
+
+from fastapi_server.database import create_database_engine, normalize_database_url
+
+STRATEGIES = [
+    ("session", "session", None),
+    ("tx-small", "transaction", "small"),
+    ("tx-null", "transaction", "null"),
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def run_strategy(db_url, mode, client_pool, iterations, concurrency):
+    engine = create_database_engine(db_url, mode=mode, client_pool=client_pool)
+    timings = []
+    lock = threading.Lock()
+
+    def worker(count):
+        local = []
+        for _ in range(count):
+            started = time.perf_counter()
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            local.append((time.perf_counter() - started) * 1000.0)
+        with lock:
+            timings.extend(local)
+
+    # Warm-up so pooled strategies are measured with their connections already open.
+    worker(concurrency)
+    timings.clear()
+
+    per_thread = max(1, iterations // concurrency)
+    threads = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    return {
+        "n": len(timings),
+        "p50": _percentile(timings, 0.50),
+        "p95": _percentile(timings, 0.95),
+        "p99": _percentile(timings, 0.99),
+        "mean": statistics.fmean(timings),
+        "throughput": len(timings) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark connection checkout latency per pooling strategy.")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL", ""), help="PostgreSQL URL (defaults to DATABASE_URL)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    db_url = normalize_database_url(args.url)
+    if db_url is None:
+        print("Error: a PostgreSQL URL is required (set DATABASE_URL or pass --url).")
+        sys.exit(1)
+
+    print(f"Target: {db_url.host}:{db_url.port}  iterations={args.iterations}  concurrency={args.concurrency}")
+    print(f"{'strategy':<10} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'ops/s':>9}")
+    for name, mode, client_pool in STRATEGIES:
+        r = run_strategy(db_url, mode, client_pool, args.iterations, args.concurrency)
+        print(f"{name:<10} {r['n']:>5} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['p99']:>9.2f} {r['mean']:>9.2f} {r['throughput']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
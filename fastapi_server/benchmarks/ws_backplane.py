@@ -0,0 +1,180 @@
+"""
+WebSocket fan-out across workers through the backplane.
+
+Simulates --workers workers, each with its own ConnectionManager and a share
+of --users connected users (fake sockets that record arrival times). Every
+worker sends its share of --messages direct messages to random users. Every
+message is published, and roughly (workers - 1) / workers of them are
+delivered by another worker. Reported:
+
+  delivered     messages that reached the recipient's socket
+  msgs/s        delivered messages per second, from the first send to the
+                last delivery
+  p50/p95 ms    send-to-delivery latency
+  lost          messages that never arrived (publishes while a LISTEN
+                connection was down, or NOTIFY errors)
+
+By default the workers share one process and a LoopbackHub, which measures the
+manager and envelope overhead alone. Pass --url to run each worker as its own
+process with a PostgresBackplane on a throwaway channel. Use a session-mode
+connection (Supabase's pooler on 5432, not 6543) or a direct one.
+
+Usage:
+  python fastapi_server/benchmarks/ws_backplane.py [--url postgresql://...] [--workers 4] [--users 400] [--messages 5000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi_server.backplane import LocalBackplane, LoopbackHub, PostgresBackplane, backplane_dsn
+from fastapi_server.routers.messages import ConnectionManager
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+class TimingSocket:
+    def __init__(self, arrivals: list):
+        self.arrivals = arrivals
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        now = time.time()
+        self.arrivals.append((now - message["sent_at"], now))
+
+
+def schedule(workers: int, users: int, messages: int, seed: int = 7):
+    """(sender worker, recipient user) per message; recipients of worker w are users w, w + workers, ..."""
+    rng = random.Random(seed)
+    return [(i % workers, f"user-{rng.randrange(users)}") for i in range(messages)]
+
+
+def owner(user_id: str, workers: int) -> int:
+    return int(user_id.rsplit("-", 1)[1]) % workers
+
+
+async def connect_users(manager, index: int, workers: int, users: int, arrivals: list):
+    for u in range(index, users, workers):
+        await manager.connect(f"user-{u}", TimingSocket(arrivals))
+
+
+async def send_share(manager, index: int, plan, payload_bytes: int):
+    body = "x" * payload_bytes
+    for n, (sender, recipient) in enumerate(plan):
+        if sender != index:
+            continue
+        message = {"type": "new_message", "sent_at": time.time(), "message": {"id": n, "content": body}}
+        await manager.broadcast_to_conversation(message, [recipient])
+        await asyncio.sleep(0)  # one request per message: let the socket writers run
+
+
+async def run_loopback(workers: int, users: int, messages: int, payload_bytes: int):
+    hub = LoopbackHub()
+    arrivals = []
+    managers = [ConnectionManager(bus=LocalBackplane(hub)) for _ in range(workers)]
+    for i, manager in enumerate(managers):
+        await manager.backplane.start(manager.deliver)
+        await connect_users(manager, i, workers, users, arrivals)
+    plan = schedule(workers, users, messages)
+    started = time.time()
+    await asyncio.gather(*[send_share(m, i, plan, payload_bytes) for i, m in enumerate(managers)])
+    while any(m.registry.stats()["queued"] for m in managers):
+        await asyncio.sleep(0)
+    return started, arrivals
+
+
+async def _postgres_worker(index, workers, users, messages, payload_bytes, dsn, ssl, channel, barrier, timeout):
+    bus = PostgresBackplane(dsn, channel=channel, ssl=ssl)
+    manager = ConnectionManager(bus=bus)
+    arrivals = []
+    await bus.start(manager.deliver)
+    await connect_users(manager, index, workers, users, arrivals)
+    while bus._conn is None:
+        await asyncio.sleep(0.05)
+    plan = schedule(workers, users, messages)
+    expected = sum(1 for _, recipient in plan if owner(recipient, workers) == index)
+    await asyncio.to_thread(barrier.wait)
+    started = time.time()
+    await send_share(manager, index, plan, payload_bytes)
+    deadline = time.time() + timeout
+    while len(arrivals) < expected and time.time() < deadline:
+        await asyncio.sleep(0.01)
+    stats = bus.stats()
+    await bus.stop()
+    return started, arrivals, stats
+
+
+def postgres_worker(index, args, dsn, ssl, channel, barrier, results):
+    started, arrivals, stats = asyncio.run(_postgres_worker(
+        index, args.workers, args.users, args.messages, args.payload_bytes, dsn, ssl, channel, barrier, args.timeout
+    ))
+    results.put((started, arrivals, stats))
+
+
+def run_postgres(args):
+    dsn, ssl = backplane_dsn(args.url)
+    if not dsn:
+        sys.exit("--url must be a PostgreSQL URL")
+    channel = f"ws_bench_{uuid.uuid4().hex[:8]}"
+    barrier = multiprocessing.Barrier(args.workers)
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=postgres_worker, args=(i, args, dsn, ssl, channel, barrier, results))
+        for i in range(args.workers)
+    ]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    started = min(s for s, _, _ in collected)
+    arrivals = [a for _, worker_arrivals, _ in collected for a in worker_arrivals]
+    errors = sum(stats["publish_errors"] for _, _, stats in collected)
+    return started, arrivals, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cross-worker WebSocket delivery through the backplane.")
+    parser.add_argument("--url", default=None, help="PostgreSQL URL for LISTEN/NOTIFY (default: in-process loopback).")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=400, help="Connected users, spread across the workers.")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--payload-bytes", type=int, default=200, help="Message content size.")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for stragglers (--url only).")
+    args = parser.parse_args()
+
+    if args.url:
+        started, arrivals, errors = run_postgres(args)
+        backend = "postgres LISTEN/NOTIFY"
+    else:
+        started, arrivals = asyncio.run(run_loopback(args.workers, args.users, args.messages, args.payload_bytes))
+        errors = 0
+        backend = "in-process loopback"
+
+    print(f"Backplane: {backend}, {args.workers} workers, {args.users} users, {args.messages} messages of {args.payload_bytes} bytes")
+    print(f"{'delivered':>10} {'msgs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'lost':>6} {'publish errors':>15}")
+    if not arrivals:
+        print(f"{0:>10} {'-':>9} {'-':>8} {'-':>8} {args.messages:>6} {errors:>15}")
+        return
+    latencies = [latency * 1000.0 for latency, _ in arrivals]
+    elapsed = max(at for _, at in arrivals) - started
+    print(
+        f"{len(arrivals):>10} {len(arrivals) / max(elapsed, 1e-9):>9.0f} {_percentile(latencies, 0.50):>8.2f} "
+        f"{_percentile(latencies, 0.95):>8.2f} {args.messages - len(arrivals):>6} {errors:>15}"
+    )
+
+
+if __name__ == "__main__":
+    main()
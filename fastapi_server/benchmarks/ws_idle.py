@@ -0,0 +1,79 @@
+"""
+Cost of idle WebSocket connections in one worker.
+
+Registers --sockets fake connections with a ConnectionRegistry, none of which
+ever send anything, then reports:
+
+  traced KB/socket     Python memory allocated per connection, measured with
+                       tracemalloc (registry entry, queue, writer task)
+  estimate B/socket    the registry's own `bytes_per_socket` figure, as shown
+                       in /admin/metrics
+  heartbeat ms         one heartbeat round over every socket (ping them all)
+  reap ms              one round once all of them have gone silent after
+                       sending a frame (close them all)
+
+The ASGI server's per-connection buffers come on top of these figures.
+
+Usage:
+  python fastapi_server/benchmarks/ws_idle.py [--sockets 5000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi_server.ws_connections import ConnectionRegistry
+
+
+class IdleSocket:
+    __slots__ = ()
+
+    async def send_json(self, message):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+async def run(sockets: int):
+    registry = ConnectionRegistry(ping_interval=0, idle_timeout=60)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    conns = [registry.add(f"user-{i}", IdleSocket()) for i in range(sockets)]
+    await asyncio.sleep(0)  # let every writer task start and park on its queue
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    estimate = registry.stats()["bytes_per_socket"]
+
+    started = time.perf_counter()
+    registry.heartbeat()
+    heartbeat_ms = (time.perf_counter() - started) * 1000.0
+    await asyncio.sleep(0)
+
+    for conn in conns:
+        registry.touch(conn)  # only sockets that have spoken are reaped
+    started = time.perf_counter()
+    reaped = registry.heartbeat(now=max(c.last_seen for c in conns) + 61)
+    reap_ms = (time.perf_counter() - started) * 1000.0
+    await asyncio.sleep(0)
+    return traced / sockets / 1024.0, estimate, heartbeat_ms, reap_ms, reaped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory and heartbeat cost of idle WebSocket connections.")
+    parser.add_argument("--sockets", type=int, default=5000)
+    args = parser.parse_args()
+
+    traced_kb, estimate, heartbeat_ms, reap_ms, reaped = asyncio.run(run(args.sockets))
+    print(f"Idle sockets: {args.sockets}")
+    print(f"{'traced KB/socket':>17} {'estimate B/socket':>18} {'heartbeat ms':>13} {'reap ms':>8} {'reaped':>7}")
+    print(f"{traced_kb:>17.2f} {estimate:>18} {heartbeat_ms:>13.2f} {reap_ms:>8.2f} {reaped:>7}")
+
+
+if __name__ == "__main__":
+    main()
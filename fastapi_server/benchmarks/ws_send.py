@@ -0,0 +1,122 @@
+"""
+Database work per chat message: the REST send path vs a WebSocket send frame.
+
+  rest     what POST /conversations/{id}/messages/ runs after the token check:
+           is_user_in_conversation, create_message (insert, commit, refresh,
+           sender and profile load), then _sync_get_full_message to build the
+           broadcast
+  socket   what a {"type": "send"} frame runs on an authenticated socket: the
+           participant ids come from the session cache, so only
+           crud.insert_message (one INSERT ... RETURNING and commit)
+
+Both modes open a session per message, as the request handlers do. The REST
+figures leave out the per-request token check (a Supabase round trip in remote
+mode), which the socket does once per connection. Uses a throwaway SQLite file
+by default. Pass --url to run against a scratch PostgreSQL database; the
+benchmark creates tables there and deletes its rows afterwards.
+
+Usage:
+  python fastapi_server/benchmarks/ws_send.py [--url postgresql://...] [--messages 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to the path so we can import fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models, schemas
+from fastapi_server.database import Base, normalize_database_url
+from fastapi_server.routers.messages import _sync_get_full_message
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def send_rest(Session, conversation_id, sender_id, content):
+    with Session() as db:
+        if not crud.is_user_in_conversation(db, sender_id, conversation_id):
+            raise RuntimeError("not a participant")
+        msg = schemas.MessageCreate(content=content, conversation_id=conversation_id)
+        created = crud.create_message(db, msg, sender_id)
+        full = _sync_get_full_message(db, created["id"])
+        return [p["id"] for p in full["conversation"]["participants"]]
+
+
+def send_socket(Session, conversation_id, sender_id, content, participants):
+    with Session() as db:
+        crud.insert_message(db, schemas.MessageBase(content=content), sender_id, conversation_id)
+        return participants
+
+
+def seed(engine, prefix):
+    Session = sessionmaker(autoflush=False, bind=engine)
+    with Session() as db:
+        user_ids = [f"{prefix}-a", f"{prefix}-b"]
+        for uid in user_ids:
+            db.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+            db.add(models.Profile(user_id=uid))
+        db.commit()
+        conversation_id = crud.get_or_create_direct_conversation(db, *user_ids)
+        db.commit()
+        return user_ids, conversation_id
+
+
+def cleanup(engine, user_ids, conversation_id):
+    with sessionmaker(bind=engine)() as db:
+        db.execute(delete(models.Message).where(models.Message.conversation_id == conversation_id))
+        db.execute(delete(models.conversation_participants).where(models.conversation_participants.c.conversation_id == conversation_id))
+        db.execute(delete(models.Conversation).where(models.Conversation.id == conversation_id))
+        db.execute(delete(models.Profile).where(models.Profile.user_id.in_(user_ids)))
+        db.execute(delete(models.User).where(models.User.id.in_(user_ids)))
+        db.commit()
+
+
+def run_mode(engine, name, messages):
+    Session = sessionmaker(autoflush=False, bind=engine)
+    user_ids, conversation_id = seed(engine, f"bench-{name}")
+    with Session() as db:
+        participants = crud.get_conversation_participant_ids(db, conversation_id)  # the socket's one lookup
+    timings = []
+    try:
+        started = time.perf_counter()
+        for i in range(messages):
+            t = time.perf_counter()
+            if name == "rest":
+                send_rest(Session, conversation_id, user_ids[0], f"message {i}")
+            else:
+                send_socket(Session, conversation_id, user_ids[0], f"message {i}", participants)
+            timings.append((time.perf_counter() - t) * 1000.0)
+        elapsed = time.perf_counter() - started
+    finally:
+        cleanup(engine, user_ids, conversation_id)
+    return messages / elapsed, _percentile(timings, 0.50), _percentile(timings, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare database work per message for REST and WebSocket sends.")
+    parser.add_argument("--url", default=None, help="Scratch database URL (default: a temporary SQLite file).")
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = normalize_database_url(args.url) if args.url else f"sqlite:///{os.path.join(tmp, 'ws_send.db')}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        print(f"Database: {engine.dialect.name}, {args.messages} messages per mode")
+        print(f"{'mode':<8} {'msgs/s':>8} {'p50 ms':>7} {'p95 ms':>7}")
+        for name in ("rest", "socket"):
+            rate, p50, p95 = run_mode(engine, name, args.messages)
+            print(f"{name:<8} {rate:>8.0f} {p50:>7.2f} {p95:>7.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
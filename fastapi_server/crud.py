@@ -3,8 +3,10 @@ from datetime import datetime, timezone, timedelta
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session, joinedload, selectinload, aliased
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import or_, and_, case, extract, func, text, select, exists, delete, update
-from . import models, schemas
+from sqlalchemy import or_, and_, case, extract, func, text, select, exists, delete, insert, update
+from . import feed_inbox, feed_scoring, feed_sources, feed_window, models, schemas, seen_filter, social_graph, view_buffer
+from .cache import principal_cache
+from .pagination import paginate
 
 # --- Transactional Wrapper Utilities ---
 
@@ -113,6 +115,9 @@ def create_post_transactional(db: Session, post_data: schemas.PostCreate, user_i
     try:
         db_post = models.Post(**post_data.model_dump(), user_id=user_id)
         db.add(db_post)
+        if feed_inbox.FEED_MODE == "inbox":
+            db.flush()
+            feed_inbox.fan_out_post(db, db_post.id, user_id, db_post.group_id)
         db.commit()
         return {
             "id": db_post.id,
@@ -130,6 +135,8 @@ def delete_post_secure_transactional(db: Session, post_id: int, user_id: str):
     try:
         result = db.execute(delete(models.Post).where(models.Post.id == post_id, models.Post.user_id == user_id))
         db.commit()
+        if result.rowcount > 0:
+            feed_window.candidate_window.discard(post_id)
         return result.rowcount > 0
     except Exception:
         db.rollback()
@@ -139,6 +146,8 @@ def delete_post_administrative_transactional(db: Session, post_id: int):
     try:
         result = db.execute(delete(models.Post).where(models.Post.id == post_id))
         db.commit()
+        if result.rowcount > 0:
+            feed_window.candidate_window.discard(post_id)
         return result.rowcount > 0
     except Exception:
         db.rollback()
@@ -159,61 +168,104 @@ def update_post_secure_transactional(db: Session, post_id: int, user_id: str, po
         raise
 
 def get_post_likes_count(db: Session, post_id: int) -> int:
-    return (
-        db.query(func.count(models.post_likes.c.user_id))
-        .filter(models.post_likes.c.post_id == post_id)
-        .scalar()
-        or 0
+    return db.query(models.Post.likes_count).filter(models.Post.id == post_id).scalar() or 0
+
+def _bump_post_counter(db: Session, post_id: int, column, delta: int) -> None:
+    """Atomically adjusts a denormalized counter on `posts` inside the caller's transaction."""
+    stmt = update(models.Post).where(models.Post.id == post_id)
+    if delta < 0:
+        stmt = stmt.where(column >= -delta)
+    db.execute(stmt.values({column: column + delta}).execution_options(synchronize_session=False))
+
+# One round trip on PostgreSQL: insert the like (idempotent), bump the counter only
+# if a row was inserted, add the author's notification and return the new count.
+# uq_notification_dedup includes the nullable group_id and NULLs never conflict in
+# PostgreSQL, so NOT EXISTS does the dedup and ON CONFLICT only covers races on
+# the other unique indexes.
+LIKE_POST_SQL = text("""
+    WITH post AS (
+        SELECT id, user_id, likes_count FROM posts WHERE id = :post_id
+    ), liked AS (
+        INSERT INTO post_likes (post_id, user_id)
+        SELECT id, :user_id FROM post
+        ON CONFLICT DO NOTHING
+        RETURNING post_id
+    ), bumped AS (
+        UPDATE posts SET likes_count = likes_count + 1
+        WHERE id IN (SELECT post_id FROM liked)
+        RETURNING likes_count
+    ), notified AS (
+        INSERT INTO notifications (user_id, sender_id, type, post_id, is_read, created_at)
+        SELECT post.user_id, :user_id, 'like', post.id, false, now()
+        FROM post JOIN liked ON liked.post_id = post.id
+        WHERE post.user_id IS DISTINCT FROM :user_id
+          AND NOT EXISTS (
+              SELECT 1 FROM notifications n
+              WHERE n.user_id = post.user_id AND n.sender_id = :user_id AND n.type = 'like'
+                AND n.post_id = post.id AND n.group_id IS NULL
+          )
+        ON CONFLICT DO NOTHING
     )
+    SELECT
+        EXISTS (SELECT 1 FROM post) AS post_exists,
+        EXISTS (SELECT 1 FROM liked) AS added,
+        COALESCE((SELECT likes_count FROM bumped), (SELECT likes_count FROM post)) AS likes_count
+""")
+
+def _like_post_portable(db: Session, post_id: int, user_id: str) -> Optional[tuple]:
+    """Statement-per-step variant for SQLite (no data-modifying CTEs)."""
+    added = db.execute(
+        text(
+            "INSERT INTO post_likes (post_id, user_id) SELECT id, :user_id FROM posts WHERE id = :post_id "
+            "ON CONFLICT DO NOTHING"
+        ),
+        {"post_id": post_id, "user_id": user_id},
+    ).rowcount > 0
+    if not added:
+        likes_count = db.query(models.Post.likes_count).filter(models.Post.id == post_id).first()
+        return None if likes_count is None else (False, likes_count[0] or 0)
+    likes_count, author_id = db.execute(
+        text("UPDATE posts SET likes_count = likes_count + 1 WHERE id = :post_id RETURNING likes_count, user_id"),
+        {"post_id": post_id},
+    ).one()
+    if author_id and author_id != user_id:
+        db.execute(
+            text(
+                "INSERT INTO notifications (user_id, sender_id, type, post_id, is_read, created_at) "
+                "SELECT :author_id, :user_id, 'like', :post_id, 0, CURRENT_TIMESTAMP "
+                "WHERE NOT EXISTS (SELECT 1 FROM notifications WHERE user_id = :author_id AND sender_id = :user_id "
+                "AND type = 'like' AND post_id = :post_id AND group_id IS NULL) "
+                "ON CONFLICT DO NOTHING"
+            ),
+            {"author_id": author_id, "user_id": user_id, "post_id": post_id},
+        )
+    return True, likes_count
 
-def add_post_like_ultra_performance(db: Session, post_id: int, user_id: str) -> bool:
+def like_post_returning_count(db: Session, post_id: int, user_id: str) -> Optional[tuple]:
+    """Idempotent like; returns (added, likes_count), or None when the post does not exist."""
     try:
-        post_author_id = db.query(models.Post.user_id).filter(models.Post.id == post_id).scalar()
-        if not post_author_id:
-            return False
-
-        existing_like = db.execute(
-            select(models.post_likes.c.user_id).where(
-                models.post_likes.c.post_id == post_id,
-                models.post_likes.c.user_id == user_id,
-            )
-        ).first()
-
-        if not existing_like:
-            db.execute(models.post_likes.insert().values(post_id=post_id, user_id=user_id))
-            if post_author_id and post_author_id != user_id:
-                notification_exists = (
-                    db.query(models.Notification.id)
-                    .filter(
-                        models.Notification.user_id == post_author_id,
-                        models.Notification.sender_id == user_id,
-                        models.Notification.type == "like",
-                        models.Notification.post_id == post_id,
-                        models.Notification.group_id.is_(None),
-                    )
-                    .first()
-                )
-                if not notification_exists:
-                    db.add(
-                        models.Notification(
-                            user_id=post_author_id,
-                            sender_id=user_id,
-                            type="like",
-                            post_id=post_id,
-                            is_read=False,
-                        )
-                    )
-            db.commit()
-            return True
+        if db.get_bind().dialect.name == "postgresql":
+            post_exists, added, likes_count = db.execute(
+                LIKE_POST_SQL, {"post_id": post_id, "user_id": user_id}
+            ).one()
+            result = (added, likes_count or 0) if post_exists else None
+        else:
+            result = _like_post_portable(db, post_id, user_id)
         db.commit()
-        return False
+        return result
     except Exception:
         db.rollback()
         raise
 
+def add_post_like_ultra_performance(db: Session, post_id: int, user_id: str) -> bool:
+    result = like_post_returning_count(db, post_id, user_id)
+    return bool(result and result[0])
+
 def remove_post_like_transactional(db: Session, post_id: int, user_id: str):
     try:
         result = db.execute(delete(models.post_likes).where(and_(models.post_likes.c.post_id == post_id, models.post_likes.c.user_id == user_id)))
+        if result.rowcount > 0:
+            _bump_post_counter(db, post_id, models.Post.likes_count, -1)
         db.commit()
         return result.rowcount > 0
     except Exception:
@@ -222,27 +274,32 @@ def remove_post_like_transactional(db: Session, post_id: int, user_id: str):
 
 # --- Feed Algorithm ---
 
-def get_feed_posts_optimized(db: Session, user_id: str, skip: int = 0, limit: int = 50, seed: float = None):
-    since_24h, since_14d = datetime.now(timezone.utc) - timedelta(days=1), datetime.now(timezone.utc) - timedelta(days=14)
+def rank_feed_post_ids(db: Session, user_id: str, limit: int = None) -> List[int]:
+    """Ranks the user's feed candidates and returns the ids of the best `limit` (default all), best first."""
+    now = datetime.now(timezone.utc)
+    since_14d = now - timedelta(days=14)
+    # Only seen_posts rows newer than this worker's copy of the user's seen filter are read
+    seen_since, full_seen_sync = seen_filter.seen_filters.sync_since(user_id, now)
 
     # 1. Unified Batch Query: Retrieve all user relationships, university profile, and seen posts in EXACTLY 1 WAN roundtrip!
-    union_query = text("""
-        SELECT 'uni' AS category, university AS value FROM profiles WHERE user_id = :user_id AND university IS NOT NULL
-        UNION ALL
-        SELECT 'fol' AS category, following_id AS value FROM follows WHERE follower_id = :user_id
-        UNION ALL
-        SELECT 'frs' AS category, sender_id AS value FROM friend_requests WHERE receiver_id = :user_id AND status = 'accepted'
-        UNION ALL
-        SELECT 'frr' AS category, receiver_id AS value FROM friend_requests WHERE sender_id = :user_id AND status = 'accepted'
-        UNION ALL
-        SELECT 'seen' AS category, post_id::text AS value FROM seen_posts WHERE user_id = :user_id AND seen_at >= :since_24h
-    """)
-    
-    relations = db.execute(union_query, {"user_id": user_id, "since_24h": since_24h}).all()
-    
+    # With the in-memory social graph enabled, follows and friends come from it instead.
+    branches = [
+        "SELECT 'uni' AS category, university AS value FROM profiles WHERE user_id = :user_id AND university IS NOT NULL",
+        "SELECT 'seen' AS category, CAST(post_id AS TEXT) AS value FROM seen_posts WHERE user_id = :user_id AND seen_at >= :seen_since",
+    ]
+    if not social_graph.GRAPH_ENABLED:
+        branches += [
+            "SELECT 'fol' AS category, following_id AS value FROM follows WHERE follower_id = :user_id",
+            "SELECT 'frs' AS category, sender_id AS value FROM friend_requests WHERE receiver_id = :user_id AND status = 'accepted'",
+            "SELECT 'frr' AS category, receiver_id AS value FROM friend_requests WHERE sender_id = :user_id AND status = 'accepted'",
+        ]
+    union_query = text("\nUNION ALL\n".join(branches))
+
+    relations = db.execute(union_query, {"user_id": user_id, "seen_since": seen_since}).all()
+
     user_university = None
-    following_ids = set()
-    friend_ids = set()
+    following_ids = set(social_graph.social_graph.following(db, user_id)) if social_graph.GRAPH_ENABLED else set()
+    friend_ids = set(social_graph.social_graph.friends(db, user_id)) if social_graph.GRAPH_ENABLED else set()
     seen_post_ids = set()
     
     for category, value in relations:
@@ -255,68 +312,35 @@ def get_feed_posts_optimized(db: Session, user_id: str, skip: int = 0, limit: in
         elif category == 'seen':
             try: seen_post_ids.add(int(value))
             except ValueError: pass
-
-    # Scalar subqueries for likes and comments (completely index-only scan based, zero Cartesian product)
-    likes_subquery = (
-        db.query(func.count(models.post_likes.c.user_id))
-        .filter(models.post_likes.c.post_id == models.Post.id)
-        .scalar_subquery()
-    )
-    comments_subquery = (
-        db.query(func.count(models.Comment.id))
-        .filter(models.Comment.post_id == models.Post.id)
-        .scalar_subquery()
+    seen = seen_filter.seen_filters.sync(user_id, seen_post_ids, now, full_seen_sync)
+
+    # 2. Candidates: per-source quotas (friends, follows, same university, groups,
+    # trending) fetched on their own indexes / the shared window (feed_sources.py).
+    # Only ids, authors, universities and counters are loaded. The most recently seen
+    # posts are excluded in SQL so they don't take up the quotas.
+    sources = feed_sources.fetch_sources(
+        db, user_id, user_university, friend_ids, following_ids, seen.recent_ids(), since_14d, seen
     )
 
-    # Candidate posts query - utilizing simple B-Tree index scan
-    query = (
-        db.query(models.Post, likes_subquery.label("likes_count"), comments_subquery.label("comments_count"))
-        .options(joinedload(models.Post.user).joinedload(models.User.profile))
-        .filter(models.Post.created_at >= since_14d)
-    )
-
-    if seen_post_ids:
-        query = query.filter(~models.Post.id.in_(seen_post_ids))
-
-    # Fetch top candidate posts sorted chronologically using index prefix scanning
-    candidates = query.order_by(models.Post.created_at.desc()).limit(400).all()
-
-    # Calculate weights and decay scores inside CPU-efficient Python thread space
-    ranked_posts = []
-    now = datetime.now(timezone.utc)
-    for p, l_count, c_count in candidates:
-        if p.user_id == user_id:
-            social_weight = 120
-        elif p.user_id in friend_ids:
-            social_weight = 100
-        elif p.user_id in following_ids:
-            social_weight = 80
-        else:
-            social_weight = 10
-
-        post_uni = p.user.profile.university if p.user and p.user.profile else None
-        local_weight = 50 if (user_university and post_uni == user_university) else 0
-
-        l_val = l_count or 0
-        c_val = c_count or 0
-        engagement_boost = min(l_val * 2, 200)
+    # Sources are heap-merged, and seen posts are dropped against the user's Bloom filter (seen_filter.py).
+    candidates = [c for c in feed_sources.merge_sources(sources) if c.id not in seen]
 
-        total_weight = social_weight + local_weight + engagement_boost
-
-        p_created = p.created_at
-        if p_created.tzinfo is None:
-            p_created = p_created.replace(tzinfo=timezone.utc)
-
-        hours = (now - p_created).total_seconds() / 3600.0
-        decay_score = total_weight / ((hours + 2) ** 1.2)
-
-        ranked_posts.append((p, l_val, c_val, decay_score))
-
-    # Sort candidates in Python: primary on decay_score desc, secondary on created_at desc
-    ranked_posts.sort(key=lambda x: (-x[3], x[0].created_at))
-
-    # Paginate candidates in-memory
-    sliced = ranked_posts[skip : skip + limit]
+    # 3. Per-user personalization: social, locality, engagement and decay scored in one
+    # vectorized pass (feed_scoring.py); the weights depend on the user's ranking variant
+    _, weights = feed_scoring.ranking_variant(user_id)
+    ranked = feed_scoring.rank_candidates(
+        candidates, user_id, user_university, friend_ids, following_ids, weights=weights, limit=limit
+    )
+    return [c.id for c in ranked]
+
+def load_feed_page(db: Session, page_ids: List[int]):
+    """Loads the posts for a page of ranked ids (fresh captions/counters, drops deleted posts)."""
+    if not page_ids:
+        return []
+    posts = {
+        p.id: p
+        for p in db.query(models.Post).options(joinedload(models.Post.user)).filter(models.Post.id.in_(page_ids)).all()
+    }
 
     return [{
         "id": p.id,
@@ -326,19 +350,36 @@ def get_feed_posts_optimized(db: Session, user_id: str, skip: int = 0, limit: in
         "created_at": p.created_at,
         "user_id": p.user_id,
         "user": {"id": p.user.id, "username": p.user.username} if p.user else None,
-        "likes_count": l,
-        "comments_count": c
-    } for p, l, c, _ in sliced]
+        "likes_count": p.likes_count or 0,
+        "comments_count": p.comments_count or 0
+    } for p in (posts.get(pid) for pid in page_ids) if p is not None]
+
+def get_feed_posts_optimized(db: Session, user_id: str, skip: int = 0, limit: int = 50, seed: float = None):
+    # Paginate the ranking in-memory, then load just the page
+    return load_feed_page(db, rank_feed_post_ids(db, user_id, skip + limit)[skip : skip + limit])
 
 def mark_post_as_seen_transactional(db: Session, user_id: str, post_id: int):
     try:
         db.merge(models.SeenPost(user_id=user_id, post_id=post_id, seen_at=func.now()))
         db.commit()
+        seen_filter.seen_filters.add(user_id, post_id)
         return True
     except Exception:
         db.rollback()
         raise
 
+def mark_posts_as_seen_transactional(db: Session, user_id: str, post_ids: List[int]):
+    try:
+        now = datetime.now(timezone.utc)
+        written = view_buffer.upsert_seen_posts(db, {(user_id, post_id): now for post_id in post_ids})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for post_id in post_ids:
+        seen_filter.seen_filters.add(user_id, post_id)
+    return written
+
 # --- Notification & Interaction ---
 
 def mark_notifications_read_transactional(db: Session, user_id: str):
@@ -354,6 +395,7 @@ def create_comment_transactional(db: Session, comment_data: schemas.CommentCreat
         db_comment = models.Comment(**comment_data.model_dump(), user_id=user_id, post_id=post_id)
         db.add(db_comment)
         db.flush()
+        _bump_post_counter(db, post_id, models.Post.comments_count, 1)
         post_author_id = db.query(models.Post.user_id).filter(models.Post.id == post_id).scalar()
         if post_author_id and post_author_id != user_id:
             notification_exists = (
@@ -418,6 +460,7 @@ def follow_user_transactional(db: Session, follower_id: str, following_id: str):
                 )
             )
         db.commit()
+        social_graph.social_graph.follow(follower_id, following_id)
         return True
     except Exception:
         db.rollback()
@@ -426,7 +469,10 @@ def follow_user_transactional(db: Session, follower_id: str, following_id: str):
 def unfollow_user_transactional(db: Session, follower_id: str, following_id: str):
     try:
         db.execute(delete(models.Follow).where(and_(models.Follow.follower_id == follower_id, models.Follow.following_id == following_id)))
+        if feed_inbox.FEED_MODE == "inbox":
+            feed_inbox.remove_author_from_inbox(db, follower_id, following_id)
         db.commit()
+        social_graph.social_graph.unfollow(follower_id, following_id)
         return True
     except Exception:
         db.rollback()
@@ -518,6 +564,49 @@ def create_message_transactional(db: Session, msg: schemas.MessageCreate, sender
         db.rollback()
         raise
 
+def get_conversation_participant_ids(db: Session, conversation_id: int) -> List[str]:
+    return [uid for (uid,) in db.query(models.conversation_participants.c.user_id).filter(models.conversation_participants.c.conversation_id == conversation_id)]
+
+def insert_message(db: Session, msg: schemas.MessageBase, sender_id: str, conversation_id: int) -> dict:
+    """create_message for a known conversation without reloading the sender: one INSERT ... RETURNING."""
+    try:
+        row = db.execute(
+            insert(models.Message)
+            .values(conversation_id=conversation_id, sender_id=sender_id, content=msg.content, image_url=msg.image_url, video_url=msg.video_url, is_read=False)
+            .returning(models.Message.id, models.Message.created_at)
+        ).one()
+        db.commit()
+        return {
+            "id": row.id,
+            "conversation_id": conversation_id,
+            "sender_id": sender_id,
+            "content": msg.content,
+            "image_url": msg.image_url,
+            "video_url": msg.video_url,
+            "created_at": row.created_at,
+            "is_read": False,
+        }
+    except Exception:
+        db.rollback()
+        raise
+
+def mark_conversation_read(db: Session, conversation_id: int, user_id: str, up_to_id: Optional[int] = None) -> int:
+    """Marks messages from the other participants read, up to `up_to_id` when given. Returns how many changed."""
+    try:
+        q = db.query(models.Message).filter(
+            models.Message.conversation_id == conversation_id,
+            or_(models.Message.sender_id != user_id, models.Message.sender_id.is_(None)),
+            models.Message.is_read == False,
+        )
+        if up_to_id is not None:
+            q = q.filter(models.Message.id <= up_to_id)
+        updated = q.update({models.Message.is_read: True}, synchronize_session=False)
+        db.commit()
+        return updated
+    except Exception:
+        db.rollback()
+        raise
+
 # --- Device & Location ---
 
 def register_device_transactional(db: Session, user_id: str, device: schemas.UserDeviceCreate):
@@ -568,12 +657,12 @@ def update_location_transactional(db: Session, user_id: str, loc: schemas.Locati
 
 # --- Getters (Thread-safe read-only) ---
 
-def get_posts(db: Session, skip: int = 0, limit: int = 100):
-    res = db.query(models.Post).options(joinedload(models.Post.user)).order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
-    return [{ "id": p.id, "caption": p.caption, "image": p.image, "video": p.video, "created_at": p.created_at, "user": {"id": p.user.id, "username": p.user.username} } for p in res]
+def get_posts(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    res, next_cursor = paginate(db.query(models.Post).options(joinedload(models.Post.user)), (models.Post.created_at, models.Post.id), cursor, skip, limit)
+    return [{ "id": p.id, "caption": p.caption, "image": p.image, "video": p.video, "created_at": p.created_at, "user_id": p.user_id, "user": {"id": p.user.id, "username": p.user.username}, "likes_count": p.likes_count or 0, "comments_count": p.comments_count or 0 } for p in res], next_cursor
 
-def get_messages(db: Session, conversation_id: int, skip: int = 0, limit: int = 50):
-    res = db.query(models.Message).options(joinedload(models.Message.sender).joinedload(models.User.profile)).filter(models.Message.conversation_id == conversation_id).order_by(models.Message.created_at.desc()).offset(skip).limit(limit).all()
+def get_messages(db: Session, conversation_id: int, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    res, next_cursor = paginate(db.query(models.Message).options(joinedload(models.Message.sender).joinedload(models.User.profile)).filter(models.Message.conversation_id == conversation_id), (models.Message.created_at, models.Message.id), cursor, skip, limit)
     return [{
         "id": m.id,
         "conversation_id": m.conversation_id,
@@ -602,7 +691,7 @@ def get_messages(db: Session, conversation_id: int, skip: int = 0, limit: int =
                 "hometown": m.sender.profile.hometown
             } if m.sender.profile else None
         } if m.sender else None
-    } for m in res]
+    } for m in res], next_cursor
 
 def get_conversations(db: Session, user_id: str):
     res = db.query(models.Conversation).options(selectinload(models.Conversation.participants).joinedload(models.User.profile)).filter(models.Conversation.participants.any(id=user_id)).order_by(models.Conversation.created_at.desc()).all()
@@ -632,8 +721,8 @@ def get_conversations(db: Session, user_id: str):
         "messages": []
     } for c in res]
 
-def get_notifications(db: Session, user_id: str, skip: int = 0, limit: int = 50):
-    res = db.query(models.Notification).options(joinedload(models.Notification.sender).joinedload(models.User.profile)).filter(models.Notification.user_id == user_id).order_by(models.Notification.created_at.desc()).offset(skip).limit(limit).all()
+def get_notifications(db: Session, user_id: str, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    res, next_cursor = paginate(db.query(models.Notification).options(joinedload(models.Notification.sender).joinedload(models.User.profile)).filter(models.Notification.user_id == user_id), (models.Notification.created_at, models.Notification.id), cursor, skip, limit)
     return [{
         "id": n.id,
         "user_id": n.user_id,
@@ -661,7 +750,7 @@ def get_notifications(db: Session, user_id: str, skip: int = 0, limit: int = 50)
                 "hometown": n.sender.profile.hometown
             } if n.sender.profile else None
         } if n.sender else None
-    } for n in res]
+    } for n in res], next_cursor
 
 def get_unread_notification_count(db: Session, user_id: str):
     return db.query(func.count(models.Notification.id)).filter(models.Notification.user_id == user_id, models.Notification.is_read == False).scalar()
@@ -692,13 +781,12 @@ def get_platform_stats(db: Session):
         "top_universities": [{"name": u[0], "count": u[1]} for u in top_unis if u[0]]
     }
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100):
-    return (
-        db.query(models.User)
-        .options(selectinload(models.User.profile))
-        .offset(skip)
-        .limit(limit)
-        .all()
+def get_all_users(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    # users has no created_at; page by the primary key
+    return paginate(
+        db.query(models.User).options(selectinload(models.User.profile)),
+        (models.User.id,),
+        cursor, skip, limit, descending=False,
     )
 
 def update_user_role(db: Session, user_id: str, role: str):
@@ -707,6 +795,7 @@ def update_user_role(db: Session, user_id: str, role: str):
         db_user.role = role
         db.commit()
         db.refresh(db_user)
+        principal_cache.invalidate(user_id)
     return db_user
 
 def toggle_user_active(db: Session, user_id: str):
@@ -715,20 +804,19 @@ def toggle_user_active(db: Session, user_id: str):
         db_user.is_active = not db_user.is_active
         db.commit()
         db.refresh(db_user)
+        principal_cache.invalidate(user_id)
     return db_user
 
-def get_reports(db: Session, skip: int = 0, limit: int = 50):
-    return (
+def get_reports(db: Session, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    return paginate(
         db.query(models.Report)
         .options(
             joinedload(models.Report.user),
             joinedload(models.Report.post),
             joinedload(models.Report.comment),
-        )
-        .order_by(models.Report.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+        ),
+        (models.Report.created_at, models.Report.id),
+        cursor, skip, limit,
     )
 
 def resolve_report(db: Session, report_id: int, status: str):
@@ -754,15 +842,76 @@ def mark_notification_read(db: Session, notification_id: int, user_id: str):
         db.commit()
     return notif
 
-def get_comments(db: Session, post_id: int):
-    return (
+def get_comments(db: Session, post_id: int, viewer_id: Optional[str] = None, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    """
+    One page of a post's comments, oldest first, as (comments, next_cursor).
+    likes_count comes from SQL with each row; liked_by_me is one lookup for the page.
+    """
+    comments, next_cursor = paginate(
         db.query(models.Comment)
-        .options(joinedload(models.Comment.user), selectinload(models.Comment.likes))
-        .filter(models.Comment.post_id == post_id)
-        .order_by(models.Comment.created_at.asc())
-        .all()
+        .options(joinedload(models.Comment.user).joinedload(models.User.profile))
+        .filter(models.Comment.post_id == post_id),
+        (models.Comment.created_at, models.Comment.id),
+        cursor, skip, limit, descending=False,
+    )
+    liked = get_liked_comment_ids(db, viewer_id, [c.id for c in comments]) if viewer_id else set()
+    return [{
+        "id": c.id,
+        "content": c.content,
+        "user_id": c.user_id,
+        "post_id": c.post_id,
+        "created_at": c.created_at,
+        "user": c.user,
+        "likes_count": c.likes_count or 0,
+        "liked_by_me": c.id in liked,
+    } for c in comments], next_cursor
+
+def get_liked_comment_ids(db: Session, user_id: str, comment_ids: List[int]) -> set:
+    """Which of `comment_ids` the user has liked."""
+    if not comment_ids:
+        return set()
+    return {
+        r[0] for r in db.query(models.comment_likes.c.comment_id).filter(
+            models.comment_likes.c.user_id == user_id,
+            models.comment_likes.c.comment_id.in_(comment_ids),
+        )
+    }
+
+def get_comment_likers(db: Session, comment_id: int, limit: int = 50, cursor: Optional[str] = None):
+    """One page of the users who liked a comment, by user id, as (users, next_cursor)."""
+    return paginate(
+        db.query(models.User)
+        .options(selectinload(models.User.profile))
+        .join(models.comment_likes, models.comment_likes.c.user_id == models.User.id)
+        .filter(models.comment_likes.c.comment_id == comment_id),
+        (models.User.id,),
+        cursor, 0, limit, descending=False,
     )
 
+def get_following_ids(db: Session, user_id: str) -> set:
+    if social_graph.GRAPH_ENABLED:
+        return set(social_graph.social_graph.following(db, user_id))
+    return {r[0] for r in db.query(models.Follow.following_id).filter(models.Follow.follower_id == user_id)}
+
+def get_follower_ids(db: Session, user_id: str) -> set:
+    if social_graph.GRAPH_ENABLED:
+        return set(social_graph.social_graph.followers(db, user_id))
+    return {r[0] for r in db.query(models.Follow.follower_id).filter(models.Follow.following_id == user_id)}
+
+def get_friend_ids(db: Session, user_id: str) -> set:
+    if social_graph.GRAPH_ENABLED:
+        return set(social_graph.social_graph.friends(db, user_id))
+    friend_ids = set()
+    for sender_id, receiver_id in db.query(models.FriendRequest.sender_id, models.FriendRequest.receiver_id).filter(
+        or_(
+            models.FriendRequest.sender_id == user_id,
+            models.FriendRequest.receiver_id == user_id,
+        ),
+        models.FriendRequest.status == "accepted",
+    ):
+        friend_ids.add(receiver_id if sender_id == user_id else sender_id)
+    return friend_ids
+
 def get_suggested_users(db: Session, user_id: str, limit: int = 10):
     """
     Suggests users to follow based on:
@@ -774,36 +923,16 @@ def get_suggested_users(db: Session, user_id: str, limit: int = 10):
     user_profile = db.query(models.Profile).filter(models.Profile.user_id == user_id).first()
     user_university = user_profile.university if user_profile else None
 
-    # Exclude already followed users
-    following_ids = db.query(models.Follow.following_id).filter(
-        models.Follow.follower_id == user_id
-    ).subquery()
-
-    # Exclude friends
-    friend_ids = (
-        db.query(models.FriendRequest.sender_id)
-        .filter(
-            models.FriendRequest.receiver_id == user_id,
-            models.FriendRequest.status == "accepted",
-        )
-        .union(
-            db.query(models.FriendRequest.receiver_id).filter(
-                models.FriendRequest.sender_id == user_id,
-                models.FriendRequest.status == "accepted",
-            )
-        )
-    ).subquery()
+    # Exclude already followed users and friends
+    excluded_ids = get_following_ids(db, user_id) | get_friend_ids(db, user_id)
+    excluded_ids.add(user_id)
 
     # Suggestion Query
     query = (
         db.query(models.User)
         .options(joinedload(models.User.profile))
         .join(models.Profile, models.User.id == models.Profile.user_id)
-        .filter(
-            models.User.id != user_id,
-            ~models.User.id.in_(following_ids),
-            ~models.User.id.in_(friend_ids)
-        )
+        .filter(~models.User.id.in_(excluded_ids))
     )
 
     if user_university:
@@ -818,8 +947,7 @@ def get_suggested_users(db: Session, user_id: str, limit: int = 10):
     return query.limit(limit).all()
 
 def get_following(db: Session, user_id: str):
-    follows = db.query(models.Follow).filter(models.Follow.follower_id == user_id).all()
-    following_ids = [f.following_id for f in follows]
+    following_ids = get_following_ids(db, user_id)
     return (
         db.query(models.User)
         .options(selectinload(models.User.profile))
@@ -828,10 +956,7 @@ def get_following(db: Session, user_id: str):
     )
 
 def get_followers(db: Session, user_id: str):
-    follows = (
-        db.query(models.Follow).filter(models.Follow.following_id == user_id).all()
-    )
-    follower_ids = [f.follower_id for f in follows]
+    follower_ids = get_follower_ids(db, user_id)
     return (
         db.query(models.User)
         .options(selectinload(models.User.profile))
@@ -868,28 +993,19 @@ def search_users(db: Session, query: str, limit: int = 20):
         .all()
     )
 
-def get_user_posts(db: Session, user_id: str, skip: int = 0, limit: int = 50):
-    """Get posts by a specific user — eliminates frontend filtering."""
-    return (
+def get_user_posts(db: Session, user_id: str, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    """Get posts by a specific user — eliminates frontend filtering. Returns (posts, next_cursor)."""
+    return paginate(
         db.query(models.Post)
-        .options(joinedload(models.Post.user), selectinload(models.Post.likes))
-        .filter(models.Post.user_id == user_id)
-        .order_by(models.Post.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+        .options(joinedload(models.Post.user))
+        .filter(models.Post.user_id == user_id),
+        (models.Post.created_at, models.Post.id),
+        cursor, skip, limit,
     )
 
 def get_feed_stories(db: Session, user_id: str):
-    # Get following IDs
-    following_ids = [
-        f.following_id
-        for f in db.query(models.Follow)
-        .filter(models.Follow.follower_id == user_id)
-        .all()
-    ]
-    # Include self
-    story_user_ids = following_ids + [user_id]
+    # Get following IDs, including self
+    story_user_ids = get_following_ids(db, user_id) | {user_id}
 
     now = datetime.now(timezone.utc)
     stories = (
@@ -1037,15 +1153,13 @@ def get_group_members(db: Session, group_id: int):
         .all()
     )
 
-def get_group_posts(db: Session, group_id: int, skip: int = 0, limit: int = 50):
-    return (
+def get_group_posts(db: Session, group_id: int, skip: int = 0, limit: int = 50, cursor: Optional[str] = None):
+    return paginate(
         db.query(models.Post)
-        .options(joinedload(models.Post.user), selectinload(models.Post.likes))
-        .filter(models.Post.group_id == group_id)
-        .order_by(models.Post.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+        .options(joinedload(models.Post.user))
+        .filter(models.Post.group_id == group_id),
+        (models.Post.created_at, models.Post.id),
+        cursor, skip, limit,
     )
 
 def join_group(db: Session, group_id: int, user_id: str):
@@ -1130,32 +1244,18 @@ def create_friend_request(db: Session, sender_id: str, receiver_id: str):
 def update_friend_request_status(
     db: Session, request: models.FriendRequest, status: str
 ):
+    was_accepted = request.status == "accepted"
     request.status = status
     db.commit()
     db.refresh(request)
+    if status == "accepted":
+        social_graph.social_graph.befriend(request.sender_id, request.receiver_id)
+    elif was_accepted:
+        social_graph.social_graph.unfriend(request.sender_id, request.receiver_id)
     return request
 
 def get_friends(db: Session, user_id: str):
-    # Find accepted requests where user is sender or receiver
-    requests = (
-        db.query(models.FriendRequest)
-        .filter(
-            or_(
-                models.FriendRequest.sender_id == user_id,
-                models.FriendRequest.receiver_id == user_id,
-            ),
-            models.FriendRequest.status == "accepted",
-        )
-        .all()
-    )
-
-    friend_ids = []
-    for req in requests:
-        if req.sender_id == user_id:
-            friend_ids.append(req.receiver_id)
-        else:
-            friend_ids.append(req.sender_id)
-
+    friend_ids = get_friend_ids(db, user_id)
     return (
         db.query(models.User)
         .options(selectinload(models.User.profile))
@@ -1182,8 +1282,13 @@ def delete_comment(db: Session, comment_id: int):
         db.query(models.Comment).filter(models.Comment.id == comment_id).first()
     )
     if db_comment:
-        db.delete(db_comment)
-        db.commit()
+        try:
+            db.delete(db_comment)
+            _bump_post_counter(db, db_comment.post_id, models.Post.comments_count, -1)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
     return db_comment
 
 def like_comment(db: Session, comment_id: int, user_id: str):
@@ -1266,6 +1371,9 @@ def create_group_post(
     post_data["group_id"] = group_id
     db_post = models.Post(**post_data, user_id=user_id)
     db.add(db_post)
+    if feed_inbox.FEED_MODE == "inbox":
+        db.flush()
+        feed_inbox.fan_out_post(db, db_post.id, user_id, group_id)
     db.commit()
     db.refresh(db_post)
     return db_post
@@ -1324,6 +1432,56 @@ def create_report(db: Session, report: schemas.ReportCreate, user_id: str):
     return db_report
 
 
+# --- Counter Maintenance ---
+
+def reconcile_post_counters(db: Session, batch_size: int = 1000) -> int:
+    """
+    Recomputes posts.likes_count / comments_count from post_likes and comments and
+    rewrites the rows that drifted. Works through id ranges so each UPDATE (and its
+    row locks) stays short. Returns the number of repaired posts.
+    """
+    actual_likes = (
+        select(func.count(models.post_likes.c.user_id))
+        .where(models.post_likes.c.post_id == models.Post.id)
+        .scalar_subquery()
+    )
+    actual_comments = (
+        select(func.count(models.Comment.id))
+        .where(models.Comment.post_id == models.Post.id)
+        .scalar_subquery()
+    )
+
+    repaired = 0
+    last_id = 0
+    while True:
+        upper_id = db.execute(
+            select(func.max(models.Post.id)).where(
+                models.Post.id.in_(
+                    select(models.Post.id).where(models.Post.id > last_id).order_by(models.Post.id).limit(batch_size)
+                )
+            )
+        ).scalar()
+        if upper_id is None:
+            return repaired
+        try:
+            result = db.execute(
+                update(models.Post)
+                .where(
+                    models.Post.id > last_id,
+                    models.Post.id <= upper_id,
+                    or_(models.Post.likes_count != actual_likes, models.Post.comments_count != actual_comments),
+                )
+                .values(likes_count=actual_likes, comments_count=actual_comments)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        repaired += result.rowcount or 0
+        last_id = upper_id
+
+
 # --- ALIASES FOR COMPATIBILITY WITH OLD ROUTER CALLS ---
 create_user = create_user_transactional
 update_profile_secure = update_profile_secure_transactional
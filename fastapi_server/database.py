@@ -4,58 +4,220 @@ from sqlalchemy import create_engine
 from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 import os
 from pathlib import Path
+from uuid import uuid4
 from dotenv import load_dotenv
 
+from .pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, register_engine
+
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 
-_raw_url = os.getenv("DATABASE_URL", "").strip()
+SQLITE_FALLBACK_URL = "sqlite:///./sql_app.db"
 
-# Supabase (and some Heroku-style providers) give postgres:// but SQLAlchemy
-# requires postgresql://
-if _raw_url.startswith("postgres://"):
-    _raw_url = _raw_url.replace("postgres://", "postgresql://", 1)
 
-# If the URL is empty or still a placeholder, fall back to local SQLite
-_is_postgres = _raw_url.startswith("postgresql://")
+def normalize_database_url(raw_url: str):
+    """Returns a SQLAlchemy URL for a PostgreSQL DSN, or None when the value is empty/invalid."""
+    raw_url = (raw_url or "").strip()
 
-if _is_postgres:
-    _db_url = make_url(_raw_url)
-    _is_supabase = "supabase.com" in (_db_url.host or "")
-    if _is_supabase and _db_url.port != 6543:
-        _db_url = _db_url.set(port=6543)
+    # Supabase (and some Heroku-style providers) give postgres:// but SQLAlchemy
+    # requires postgresql://
+    if raw_url.startswith("postgres://"):
+        raw_url = raw_url.replace("postgres://", "postgresql://", 1)
 
-    SQLALCHEMY_DATABASE_URL = _db_url.render_as_string(hide_password=False)
+    # If the URL is empty or still a placeholder, the caller falls back to local SQLite
+    if not raw_url.startswith("postgresql://"):
+        return None
+
+    db_url = make_url(raw_url)
+    if _is_supabase_url(db_url) and db_url.port != 6543:
+        db_url = db_url.set(port=6543)
+    return db_url
+
+
+def _is_supabase_url(db_url) -> bool:
+    return "supabase.com" in (db_url.host or "")
+
+
+# --- Pooler mode ---
+# Supabase's 6543 endpoint is PgBouncer/Supavisor in *transaction* mode: every
+# transaction may land on a different server connection. The server side already
+# pools, so the client keeps either no pool at all (DB_POOLER_CLIENT_POOL=null) or
+# a small one without pre-ping (the default), and avoids anything that outlives a
+# transaction: server-side prepared statements and session-level settings.
+#
+# DB_POOLER_MODE: auto (transaction when the port is 6543), transaction, or session
+# (a direct connection / session-mode pooler, which keeps the regular pool).
+
+POOLER_MODE = os.getenv("DB_POOLER_MODE", "auto").lower()
+POOLER_CLIENT_POOL = os.getenv("DB_POOLER_CLIENT_POOL", "small").lower()
+TRANSACTION_POOLER_PORT = 6543
+
+
+def uses_transaction_pooler(db_url, mode: str = None) -> bool:
+    mode = (mode or POOLER_MODE).lower()
+    if mode == "transaction":
+        return True
+    if mode == "session":
+        return False
+    return db_url is not None and db_url.port == TRANSACTION_POOLER_PORT
+
+
+def _pool_options(db_url, poolclass, mode: str = None, client_pool: str = None) -> dict:
+    if not uses_transaction_pooler(db_url, mode):
+        return {
+            "poolclass": poolclass,
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "2")),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            "pool_pre_ping": True,
+        }
+
+    if (client_pool or POOLER_CLIENT_POOL) == "null":
+        # Every checkout opens a fresh client connection to the pooler.
+        return {"poolclass": NullPool}
+
+    # A handful of idle client connections to the pooler, no ping round trip per
+    # checkout. The pooler drops idle clients eventually, so recycle well before that;
+    # a connection that died anyway surfaces as a disconnect and is invalidated.
+    return {
+        "poolclass": poolclass,
+        "pool_size": int(os.getenv("DB_POOLER_POOL_SIZE", "2")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "2")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOLER_POOL_RECYCLE", "300")),
+        "pool_pre_ping": False,
+    }
+
+
+def create_database_engine(db_url, mode: str = None, client_pool: str = None):
+    """Sync (psycopg2) engine for a normalized PostgreSQL URL, pooled according to the pooler mode."""
+    transaction_pooling = uses_transaction_pooler(db_url, mode)
     _connect_args = {
-        "options": "-c search_path=public",
         "keepalives": 1,
         "keepalives_idle": 30,
         "keepalives_interval": 10,
         "keepalives_count": 5,
     }
-    if _is_supabase and "sslmode" not in _db_url.query:
+    # Startup options are session state; transaction poolers either reject them or
+    # apply them to whichever server connection happens to be used. search_path
+    # already defaults to public there.
+    if not transaction_pooling:
+        _connect_args["options"] = "-c search_path=public"
+    if _is_supabase_url(db_url) and "sslmode" not in db_url.query:
         _connect_args["sslmode"] = "require"
 
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+    # psycopg2 interpolates parameters client-side, so there are no server-side
+    # prepared statements to disable on the sync path.
+    return create_engine(
+        db_url.render_as_string(hide_password=False),
         connect_args=_connect_args,
-        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
-        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "2")),
-        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
-        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
-        pool_pre_ping=True,
+        **_pool_options(db_url, InstrumentedQueuePool, mode, client_pool),
     )
-    print("[db] Connected to PostgreSQL database.")
+
+
+def create_async_database_engine(db_url, sqlite_url: str = SQLITE_FALLBACK_URL, mode: str = None, client_pool: str = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if db_url is None:
+        return create_async_engine(
+            sqlite_url.replace("sqlite://", "sqlite+aiosqlite://", 1),
+            poolclass=InstrumentedAsyncQueuePool,
+        )
+
+    # asyncpg takes SSL as a connect arg rather than libpq's sslmode query parameter.
+    _async_url = db_url.set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+    _async_connect_args = {}
+    if uses_transaction_pooler(db_url, mode):
+        # Server-side prepared statements can't be reused across checkouts under
+        # transaction pooling: turn off both asyncpg's and SQLAlchemy's statement
+        # caches and give any unavoidable prepare a unique name.
+        _async_url = _async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+        _async_connect_args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        })
+    if _is_supabase_url(db_url) or db_url.query.get("sslmode") == "require":
+        _async_connect_args["ssl"] = "require"
+
+    return create_async_engine(
+        _async_url.render_as_string(hide_password=False),
+        connect_args=_async_connect_args,
+        **_pool_options(db_url, InstrumentedAsyncQueuePool, mode, client_pool),
+    )
+
+
+# --- Primary (read/write) engine ---
+
+_db_url = normalize_database_url(os.getenv("DATABASE_URL", ""))
+_is_postgres = _db_url is not None
+
+if _is_postgres:
+    SQLALCHEMY_DATABASE_URL = _db_url.render_as_string(hide_password=False)
+    engine = create_database_engine(_db_url)
+    if uses_transaction_pooler(_db_url):
+        print(f"[db] Connected to PostgreSQL through a transaction pooler (client pool: {POOLER_CLIENT_POOL}).")
+    else:
+        print("[db] Connected to PostgreSQL database.")
 else:
-    SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+    SQLALCHEMY_DATABASE_URL = SQLITE_FALLBACK_URL
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
         connect_args={"check_same_thread": False},
+        poolclass=InstrumentedQueuePool,
     )
     print("[db] WARNING: DATABASE_URL not set or invalid — using local SQLite fallback.")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+register_engine("primary", engine)
+
+# --- Optional read replica ---
+# Read-only endpoints use ReadSessionLocal (via dependencies.get_read_db). Without
+# DATABASE_READ_URL it is simply bound to the primary engine.
+
+_read_db_url = normalize_database_url(os.getenv("DATABASE_READ_URL", ""))
+READ_REPLICA_ENABLED = _is_postgres and _read_db_url is not None
+
+if READ_REPLICA_ENABLED:
+    read_engine = create_database_engine(_read_db_url)
+    register_engine("replica", read_engine)
+    print("[db] Read replica configured for read-only endpoints.")
+else:
+    read_engine = engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Optional native-async engine (asyncpg for PostgreSQL, aiosqlite for the SQLite fallback).
+# Routers use it through dependencies.get_async_db when DB_ASYNC is enabled and the driver
+# is installed; otherwise they keep running sync crud calls in worker threads.
+ASYNC_DB_ENABLED = os.getenv("DB_ASYNC", "false").lower() in {"1", "true", "yes"}
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+
+if ASYNC_DB_ENABLED:
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async_engine = create_async_database_engine(_db_url)
+        register_engine("primary_async", async_engine.sync_engine)
+        async_read_engine = async_engine
+        if READ_REPLICA_ENABLED:
+            async_read_engine = create_async_database_engine(_read_db_url)
+            register_engine("replica_async", async_read_engine.sync_engine)
+
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine, autoflush=False, expire_on_commit=False
+        )
+        AsyncReadSessionLocal = async_sessionmaker(
+            async_read_engine, autoflush=False, expire_on_commit=False
+        )
+        print("[db] Async engine enabled.")
+    except ImportError as e:
+        print(f"[db] WARNING: DB_ASYNC is set but the async driver is not installed ({e}) — using sync sessions.")
 
 Base = declarative_base()
@@ -1,13 +1,19 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.security.utils import get_authorization_scheme_param
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import os
 import asyncio
 import logging
 import traceback
+from jose import jwt
 from supabase import create_client, Client
-from . import crud, models
-from .database import SessionLocal
+from . import async_crud, crud, models
+from .cache import Principal, TTLCache, principal_cache
+from .database import AsyncReadSessionLocal, AsyncSessionLocal, ReadSessionLocal, SessionLocal
+from .security import AUTH_VERIFY_MODE, JWTError, token_verifier
 
 logger = logging.getLogger(__name__)
 
@@ -29,38 +35,115 @@ def get_db():
     finally:
         db.close()
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+async def get_async_db():
+    """Yields an AsyncSession when DB_ASYNC is enabled, otherwise None (callers use get_db)."""
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as adb:
+        yield adb
+
+# --- Read-replica routing ---
+# Read-only endpoints depend on get_read_db / get_async_read_db. A user who has just
+# made a write (any authenticated non-GET request) is pinned to the primary for
+# DB_READ_STICKY_SECONDS so they read their own writes despite replication lag.
+# Writers are remembered per worker process: with several workers, a read that lands
+# on a worker that didn't handle the write is served by the replica.
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+_recent_writers = TTLCache(
+    maxsize=int(os.getenv("DB_READ_STICKY_SIZE", "10000")),
+    ttl=float(os.getenv("DB_READ_STICKY_SECONDS", "5")),
+)
+
+def _reads_from_primary(request: Request) -> bool:
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if not token:
+        return False
+    # Only picks a database; the token is still verified by get_current_user where required.
+    try:
+        user_id = jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return False
+    return user_id is not None and _recent_writers.get(user_id) is not None
+
+def get_read_db(request: Request):
+    db = (SessionLocal if _reads_from_primary(request) else ReadSessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    """Async counterpart of get_read_db; yields None when DB_ASYNC is disabled."""
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    factory = AsyncSessionLocal if _reads_from_primary(request) else AsyncReadSessionLocal
+    async with factory() as adb:
+        yield adb
+
+async def _verify_token_locally(token: str):
+    """Returns the token's user id, or None when it can't be verified in-process."""
+    if token_verifier.needs_refresh():
+        await asyncio.to_thread(token_verifier.refresh_jwks)
+
+    claims = token_verifier.verify(token)
+    if claims is None and token_verifier.missing_signing_key(token):
+        # Unknown key id — the signing key may have rotated since the last refresh.
+        await asyncio.to_thread(token_verifier.refresh_jwks)
+        claims = token_verifier.verify(token)
+    return claims["sub"] if claims else None
+
+async def authenticate_token(token: str, db: Session, adb: Optional[AsyncSession] = None) -> Principal:
+    """The active principal for a Supabase access token; raises HTTPException otherwise."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        user_response = await asyncio.to_thread(supabase.auth.get_user, token)
+    supabase_user_id = None
+    if AUTH_VERIFY_MODE == "local":
+        try:
+            supabase_user_id = await _verify_token_locally(token)
+        except JWTError as e:
+            logger.info(f"[auth] Local token verification rejected token: {str(e)}")
+            raise credentials_exception
 
-        if not user_response.user:
+    if supabase_user_id is None:
+        # Fallback: no local signing key available (or remote mode) — ask Supabase.
+        try:
+            user_response = await asyncio.to_thread(supabase.auth.get_user, token)
+
+            if not user_response.user:
+                raise credentials_exception
+                
+            supabase_user_id = user_response.user.id
+        except Exception as e:
+            logger.error(f"[auth] Supabase verification failed: {str(e)}")
             raise credentials_exception
-            
-        supabase_user_id = user_response.user.id
-    except Exception as e:
-        logger.error(f"[auth] Supabase verification failed: {str(e)}")
-        raise credentials_exception
 
     try:
-        user = await asyncio.to_thread(crud.get_user, db, user_id=supabase_user_id)
-        
-        if user is None:
-            raise credentials_exception
+        principal = principal_cache.get(supabase_user_id)
+        if principal is None:
+            if adb is not None:
+                user = await async_crud.get_user(adb, user_id=supabase_user_id)
+            else:
+                user = await asyncio.to_thread(crud.get_user, db, user_id=supabase_user_id)
             
-        if getattr(user, 'is_active', True) is False:
+            if user is None:
+                raise credentials_exception
+
+            principal = Principal.from_user(user)
+            principal_cache.set(supabase_user_id, principal)
+
+        if principal.is_active is False:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Your account has been suspended."
             )
             
-        return user
+        return principal
     except HTTPException:
         raise
     except Exception as e:
@@ -70,8 +153,19 @@ async def get_current_user(
             detail="Database lookup failed during authentication"
         )
 
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+):
+    principal = await authenticate_token(token, db, adb)
+    if request.method not in _SAFE_METHODS:
+        _recent_writers.set(principal.id, True)
+    return principal
+
 async def get_current_moderator(
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if current_user.role not in ["moderator", "admin"]:
         raise HTTPException(
@@ -81,7 +175,7 @@ async def get_current_moderator(
     return current_user
 
 async def get_current_admin(
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if current_user.role != "admin":
         raise HTTPException(
@@ -0,0 +1,264 @@
+# feed_inbox.py
+"""
+Fan-out-on-write home feed.
+
+When a post is created its id is pushed into the `feed_items` inbox of the
+author, their followers and their friends (group posts in private/secret groups
+go to the group's members only) with a single INSERT ... SELECT. Reading the
+feed is then an index range scan on feed_items(user_id, created_at) — O(page
+size) instead of re-deriving relationships and scoring the global candidate
+window.
+
+Authors with more than FEED_FANOUT_MAX_FOLLOWERS followers are not fanned out
+to their followers (only to friends and themselves); their posts are merged in
+at read time for the followers instead (fan-out-on-read).
+
+FEED_MODE=inbox makes /posts/feed read from the inbox; the default (scan) keeps
+crud.get_feed_posts_optimized. Existing posts are loaded with
+`backfill_feed_inbox.py`. Rows older than FEED_INBOX_DAYS are never read; in
+inbox mode each worker deletes them every FEED_INBOX_PRUNE_SECONDS (main.py).
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, exists, func, insert, literal, or_, select, union
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+from .cache import TTLCache
+
+FEED_MODE = os.getenv("FEED_MODE", "scan").lower()
+FANOUT_MAX_FOLLOWERS = int(os.getenv("FEED_FANOUT_MAX_FOLLOWERS", "5000"))
+INBOX_DAYS = int(os.getenv("FEED_INBOX_DAYS", "14"))
+PRUNE_SECONDS = float(os.getenv("FEED_INBOX_PRUNE_SECONDS", "3600"))
+SEEN_HOURS = 24
+
+_high_fanout_cache = TTLCache(maxsize=1, ttl=float(os.getenv("FEED_HIGH_FANOUT_CACHE_TTL", "300")))
+
+
+ON_CONFLICT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+def insert_ignore(db: Session, table, columns, source, keys):
+    """
+    INSERT INTO table (columns) SELECT ... that skips rows whose `keys` columns
+    already exist. PostgreSQL and SQLite use ON CONFLICT DO NOTHING; other
+    dialects get a NOT EXISTS filter on the SELECT instead, which doesn't guard
+    against a concurrent insert of the same key. `source` must name its columns
+    as in `columns`.
+    """
+    dialect = ON_CONFLICT_DIALECTS.get(db.get_bind().dialect.name)
+    if dialect is not None:
+        return dialect.insert(table).on_conflict_do_nothing().from_select(columns, source)
+    rows = source.subquery()
+    fresh = select(*(rows.c[c] for c in columns)).where(
+        ~exists().where(and_(*(table.c[k] == rows.c[k] for k in keys)))
+    )
+    return insert(table).from_select(columns, fresh)
+
+
+def _friend_ids(user_id):
+    fr = models.FriendRequest
+    return union(
+        select(fr.sender_id.label("user_id")).where(fr.receiver_id == user_id, fr.status == "accepted"),
+        select(fr.receiver_id.label("user_id")).where(fr.sender_id == user_id, fr.status == "accepted"),
+    )
+
+
+def _recipients(db: Session, author_id: str, group_id: int = None):
+    if group_id is not None:
+        privacy = db.query(models.Group.privacy).filter(models.Group.id == group_id).scalar()
+        if privacy in ("private", "secret"):
+            return select(models.GroupMember.user_id.label("user_id")).where(models.GroupMember.group_id == group_id)
+
+    sources = [
+        select(literal(author_id).label("user_id")),
+        *_friend_ids(author_id).selects,
+    ]
+    follower_count = (
+        db.query(func.count(models.Follow.id)).filter(models.Follow.following_id == author_id).scalar() or 0
+    )
+    if follower_count <= FANOUT_MAX_FOLLOWERS:
+        sources.append(select(models.Follow.follower_id.label("user_id")).where(models.Follow.following_id == author_id))
+    if group_id is not None:
+        sources.append(select(models.GroupMember.user_id.label("user_id")).where(models.GroupMember.group_id == group_id))
+    return union(*sources)
+
+
+def fan_out_post(db: Session, post_id: int, author_id: str, group_id: int = None) -> None:
+    """Pushes a new post into its recipients' inboxes. Runs inside the caller's transaction."""
+    recipients = _recipients(db, author_id, group_id).subquery()
+    source = (
+        select(
+            recipients.c.user_id,
+            models.Post.id.label("post_id"),
+            models.Post.user_id.label("author_id"),
+            models.Post.created_at,
+        )
+        .select_from(recipients)
+        .join(models.Post, models.Post.id == post_id)
+    )
+    db.execute(
+        insert_ignore(
+            db, models.FeedItem.__table__, ["user_id", "post_id", "author_id", "created_at"], source, ["user_id", "post_id"]
+        )
+    )
+
+
+def remove_author_from_inbox(db: Session, user_id: str, author_id: str) -> None:
+    """
+    Drops an unfollowed author's posts from the user's inbox (inside the caller's
+    transaction). Friends keep getting each other's posts, so nothing is removed
+    while the two are still friends.
+    """
+    fr = models.FriendRequest
+    still_friends = db.query(
+        exists().where(
+            fr.status == "accepted",
+            or_(
+                and_(fr.sender_id == user_id, fr.receiver_id == author_id),
+                and_(fr.sender_id == author_id, fr.receiver_id == user_id),
+            ),
+        )
+    ).scalar()
+    if still_friends:
+        return
+    db.execute(
+        delete(models.FeedItem).where(models.FeedItem.user_id == user_id, models.FeedItem.author_id == author_id)
+    )
+
+
+def high_fanout_authors(db: Session) -> frozenset:
+    """Authors whose posts are delivered on read; cached per worker for FEED_HIGH_FANOUT_CACHE_TTL."""
+    authors = _high_fanout_cache.get("authors")
+    if authors is None:
+        rows = (
+            db.query(models.Follow.following_id)
+            .group_by(models.Follow.following_id)
+            .having(func.count(models.Follow.id) > FANOUT_MAX_FOLLOWERS)
+            .all()
+        )
+        authors = frozenset(r[0] for r in rows)
+        _high_fanout_cache.set("authors", authors)
+    return authors
+
+
+def get_inbox_feed(db: Session, user_id: str, skip: int = 0, limit: int = 50, seed: float = None):
+    """Newest-first page of the user's inbox plus posts of followed high-fanout authors."""
+    horizon = datetime.now(timezone.utc) - timedelta(days=INBOX_DAYS)
+    since_seen = datetime.now(timezone.utc) - timedelta(hours=SEEN_HOURS)
+
+    def unseen(post_id_column):
+        return ~exists().where(
+            and_(
+                models.SeenPost.user_id == user_id,
+                models.SeenPost.post_id == post_id_column,
+                models.SeenPost.seen_at >= since_seen,
+            )
+        )
+
+    # Each source is cut to skip + limit rows on its own index before merging, so the
+    # work stays proportional to the page rather than to the inbox size.
+    window = skip + limit
+    entries = (
+        select(models.FeedItem.post_id, models.FeedItem.created_at)
+        .where(
+            models.FeedItem.user_id == user_id,
+            models.FeedItem.created_at >= horizon,
+            unseen(models.FeedItem.post_id),
+        )
+        .order_by(models.FeedItem.created_at.desc())
+        .limit(window)
+    )
+
+    high_fanout = high_fanout_authors(db)
+    followed = []
+    if high_fanout:
+        followed = [
+            r[0]
+            for r in db.query(models.Follow.following_id)
+            .filter(models.Follow.follower_id == user_id, models.Follow.following_id.in_(high_fanout))
+            .all()
+        ]
+    if followed:
+        on_read = (
+            select(models.Post.id.label("post_id"), models.Post.created_at)
+            .where(models.Post.user_id.in_(followed), models.Post.created_at >= horizon, unseen(models.Post.id))
+            .order_by(models.Post.created_at.desc())
+            .limit(window)
+        )
+        merged = union(entries.subquery().select(), on_read.subquery().select()).subquery()
+        page = select(merged.c.post_id).order_by(merged.c.created_at.desc(), merged.c.post_id.desc())
+    else:
+        page = entries.with_only_columns(models.FeedItem.post_id).order_by(None).order_by(
+            models.FeedItem.created_at.desc(), models.FeedItem.post_id.desc()
+        )
+    page_ids = [r[0] for r in db.execute(page.offset(skip).limit(limit)).all()]
+    if not page_ids:
+        return []
+
+    posts = {
+        p.id: p
+        for p in db.query(models.Post).options(joinedload(models.Post.user)).filter(models.Post.id.in_(page_ids)).all()
+    }
+    return [
+        {
+            "id": p.id,
+            "caption": p.caption,
+            "image": p.image,
+            "video": p.video,
+            "created_at": p.created_at,
+            "user_id": p.user_id,
+            "user": {"id": p.user.id, "username": p.user.username} if p.user else None,
+            "likes_count": p.likes_count or 0,
+            "comments_count": p.comments_count or 0,
+        }
+        for p in (posts.get(pid) for pid in page_ids)
+        if p is not None
+    ]
+
+
+def backfill_feed_inbox(db: Session, days: int = INBOX_DAYS, batch_size: int = 500) -> int:
+    """
+    Fans out every post from the last `days` days (idempotent: existing inbox rows
+    are skipped) and prunes rows older than the horizon. Returns the number of
+    posts processed.
+    """
+    horizon = datetime.now(timezone.utc) - timedelta(days=days)
+    processed = 0
+    last_id = 0
+    while True:
+        batch = (
+            db.query(models.Post.id, models.Post.user_id, models.Post.group_id)
+            .filter(models.Post.id > last_id, models.Post.created_at >= horizon)
+            .order_by(models.Post.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        try:
+            for post_id, author_id, group_id in batch:
+                fan_out_post(db, post_id, author_id, group_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        processed += len(batch)
+        last_id = batch[-1][0]
+
+    prune_feed_inbox(db, days)
+    return processed
+
+
+def prune_feed_inbox(db: Session, days: int = INBOX_DAYS) -> int:
+    """Deletes inbox rows older than `days` days and commits. Returns the number of rows deleted."""
+    horizon = datetime.now(timezone.utc) - timedelta(days=days)
+    try:
+        result = db.execute(delete(models.FeedItem).where(models.FeedItem.created_at < horizon))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result.rowcount
@@ -0,0 +1,113 @@
+# feed_session.py
+"""
+Snapshot-stable feed pagination.
+
+`/posts/feed` used to re-rank the whole feed for every page, so page 2 paid the
+full pipeline again and, with counters and new posts moving in between, could
+repeat or skip posts. A feed session ranks once and keeps the ordered post ids
+(at most feed_window.CANDIDATE_LIMIT of them) in a per-process TTL cache; later
+pages are slices of that snapshot, and only the page itself is read from the
+database.
+
+Sessions are addressed two ways:
+
+  cursor   opaque "<session>.<position>" string returned in the X-Next-Cursor
+           response header; pass it back as `?cursor=` for the next page.
+  seed     clients that still paginate with `skip` can pass the same `seed`
+           on every page of a scroll; the snapshot is keyed by (user, seed).
+
+A request with neither starts a new session (a pull-to-refresh should see new
+posts) and drops the user's previous cursor-addressed one, so each user holds at
+most one of those per worker. A cursor that expired (FEED_SESSION_TTL), was
+replaced or evicted, was served by another worker, or belongs to another user
+starts a fresh session from the top.
+"""
+import os
+import secrets
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .cache import TTLCache
+
+SESSION_TTL = float(os.getenv("FEED_SESSION_TTL", "900"))
+SESSION_CACHE_SIZE = int(os.getenv("FEED_SESSION_CACHE_SIZE", "20000"))
+
+
+class FeedSnapshot(NamedTuple):
+    user_id: str
+    post_ids: Tuple[int, ...]
+
+
+feed_sessions = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL)
+# user id -> that user's current cursor-addressed session id.
+_latest_sessions = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL)
+
+
+def _encode_cursor(session_id: str, position: int) -> str:
+    return f"{session_id}.{position}"
+
+
+def _decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    session_id, _, position = cursor.rpartition(".")
+    if not session_id or not position.isdigit():
+        return None
+    return session_id, int(position)
+
+
+def find_snapshot(
+    user_id: str, cursor: Optional[str] = None, skip: int = 0, seed: float = None
+) -> Tuple[str, Optional[FeedSnapshot], int]:
+    """
+    (session_id, snapshot, position) for a request. snapshot is None when the
+    feed has to be ranked and stored under session_id with `store_snapshot`.
+    """
+    decoded = _decode_cursor(cursor) if cursor else None
+    if decoded:
+        session_id, position = decoded
+        snapshot = feed_sessions.get(session_id)
+        if snapshot is not None and snapshot.user_id == user_id:
+            return session_id, snapshot, position
+    if seed is not None:
+        session_id = f"seed:{user_id}:{seed!r}"
+        snapshot = feed_sessions.get(session_id)
+        if snapshot is not None and snapshot.user_id == user_id:
+            return session_id, snapshot, skip
+        return session_id, None, skip
+    previous = _latest_sessions.get(user_id)
+    if previous is not None:
+        feed_sessions.invalidate(previous)
+    session_id = secrets.token_urlsafe(12)
+    _latest_sessions.set(user_id, session_id)
+    return session_id, None, skip
+
+
+def store_snapshot(session_id: str, user_id: str, post_ids) -> FeedSnapshot:
+    snapshot = FeedSnapshot(user_id, tuple(post_ids))
+    feed_sessions.set(session_id, snapshot)
+    return snapshot
+
+
+def load_page(
+    db: Session, snapshot: FeedSnapshot, session_id: str, position: int, limit: int
+) -> Tuple[List[dict], Optional[str]]:
+    end = position + limit
+    posts = crud.load_feed_page(db, list(snapshot.post_ids[position:end]))
+    next_cursor = _encode_cursor(session_id, end) if end < len(snapshot.post_ids) else None
+    return posts, next_cursor
+
+
+def get_feed_page(
+    db: Session,
+    user_id: str,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    seed: float = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Returns (posts, next_cursor); next_cursor is None once the snapshot is exhausted."""
+    session_id, snapshot, position = find_snapshot(user_id, cursor, skip, seed)
+    if snapshot is None:
+        snapshot = store_snapshot(session_id, user_id, crud.rank_feed_post_ids(db, user_id))
+    return load_page(db, snapshot, session_id, position, limit)
@@ -0,0 +1,200 @@
+# feed_sources.py
+"""
+Multi-source feed candidate retrieval.
+
+Instead of the newest N posts platform-wide, candidates come from independent
+sources, each with its own quota:
+
+  friends     posts by accepted friends (and own)    posts(user_id, created_at)
+  follows     posts by followed users                posts(user_id, created_at)
+  university  posts by authors at the same campus    profiles(university, user_id)
+  groups      posts in groups the user belongs to    group_members(user_id), posts(group_id, created_at)
+  trending    most-liked posts of the last FEED_TRENDING_HOURS
+
+The personal sources (friends, follows, groups) are fetched in one UNION ALL
+round trip where every branch is an ORDER BY ... LIMIT quota on its own index,
+so their cost depends on the quota rather than on post volume. The shared
+sources (university, trending) are served from the per-process candidate window
+when it is enabled, and otherwise join the same UNION ALL.
+
+Each source list is ordered newest-first and the lists are merged with a heap,
+dropping duplicates. If together they exceed feed_window.CANDIDATE_LIMIT, the
+sources are drawn round-robin so every source keeps a share of the candidates.
+"""
+import heapq
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Container, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import Session
+
+from . import feed_window, models
+from .feed_window import Candidate
+
+SOURCE_QUOTAS = {
+    "friends": int(os.getenv("FEED_QUOTA_FRIENDS", "120")),
+    "follows": int(os.getenv("FEED_QUOTA_FOLLOWS", "120")),
+    "university": int(os.getenv("FEED_QUOTA_UNIVERSITY", "80")),
+    "groups": int(os.getenv("FEED_QUOTA_GROUPS", "40")),
+    "trending": int(os.getenv("FEED_QUOTA_TRENDING", "40")),
+}
+TRENDING_HOURS = int(os.getenv("FEED_TRENDING_HOURS", "48"))
+
+_CANDIDATE_COLUMNS = (
+    models.Post.id,
+    models.Post.user_id,
+    models.Post.group_id,
+    models.Post.created_at,
+    models.Profile.university,
+    models.Post.likes_count,
+    models.Post.comments_count,
+)
+
+
+def _branch(name: str, horizon: datetime, seen: Set[int], quota: int, *criteria, order_by=None):
+    query = (
+        select(*_CANDIDATE_COLUMNS)
+        .outerjoin(models.Profile, models.Profile.user_id == models.Post.user_id)
+        .where(models.Post.created_at >= horizon, *criteria)
+    )
+    if seen:
+        query = query.where(~models.Post.id.in_(seen))
+    ordered = query.order_by(*(order_by or (models.Post.created_at.desc(),))).limit(quota).subquery()
+    return select(literal(name).label("source"), *ordered.c)
+
+
+def _unseen(candidates: Iterable[Candidate], seen: Container[int], quota: int) -> List[Candidate]:
+    picked = []
+    for c in candidates:
+        if c.id in seen:
+            continue
+        picked.append(c)
+        if len(picked) >= quota:
+            break
+    return picked
+
+
+def fetch_sources(
+    db: Session,
+    user_id: str,
+    user_university: Optional[str],
+    friend_ids: Set[str],
+    following_ids: Set[str],
+    seen_post_ids: Set[int],
+    horizon: datetime,
+    seen: Optional[Container[int]] = None,
+) -> Dict[str, List[Candidate]]:
+    """
+    Candidates per source, each list newest-first and at most its quota long.
+    `seen_post_ids` are excluded in SQL. `seen` (e.g. the user's SeenFilter) is
+    also checked against the in-memory window sources; it defaults to
+    `seen_post_ids`.
+    """
+    window_seen = seen_post_ids if seen is None else seen
+    trending_since = max(horizon, datetime.now(timezone.utc) - timedelta(hours=TRENDING_HOURS))
+    use_window = feed_window.WINDOW_ENABLED
+    sources: Dict[str, List[Candidate]] = {name: [] for name in SOURCE_QUOTAS}
+
+    branches = []
+    if SOURCE_QUOTAS["friends"]:
+        branches.append(_branch(
+            "friends", horizon, seen_post_ids, SOURCE_QUOTAS["friends"],
+            models.Post.user_id.in_(friend_ids | {user_id}),
+        ))
+    # Friends' posts already come from their own source.
+    follow_only = following_ids - friend_ids
+    if follow_only and SOURCE_QUOTAS["follows"]:
+        branches.append(_branch(
+            "follows", horizon, seen_post_ids, SOURCE_QUOTAS["follows"],
+            models.Post.user_id.in_(follow_only),
+        ))
+    if SOURCE_QUOTAS["groups"]:
+        branches.append(_branch(
+            "groups", horizon, seen_post_ids, SOURCE_QUOTAS["groups"],
+            models.Post.group_id.in_(
+                select(models.GroupMember.group_id).where(models.GroupMember.user_id == user_id)
+            ),
+        ))
+    if not use_window:
+        if user_university and SOURCE_QUOTAS["university"]:
+            branches.append(_branch(
+                "university", horizon, seen_post_ids, SOURCE_QUOTAS["university"],
+                models.Profile.university == user_university,
+            ))
+        if SOURCE_QUOTAS["trending"]:
+            branches.append(_branch(
+                "trending", trending_since, seen_post_ids, SOURCE_QUOTAS["trending"],
+                order_by=(models.Post.likes_count.desc(), models.Post.created_at.desc()),
+            ))
+
+    if branches:
+        for row in db.execute(union_all(*branches) if len(branches) > 1 else branches[0]).all():
+            sources[row[0]].append(Candidate.from_row(row[1:]))
+
+    if use_window:
+        window = feed_window.candidate_window
+        window.refresh(db)
+        if user_university:
+            sources["university"] = _unseen(
+                window.by_university(user_university), window_seen, SOURCE_QUOTAS["university"]
+            )
+        sources["trending"] = _unseen(
+            window.trending(trending_since), window_seen, SOURCE_QUOTAS["trending"]
+        )
+
+    for name, items in sources.items():
+        items.sort(key=lambda c: (c.created_at, c.id), reverse=True)
+    return sources
+
+
+def merge_sources(sources: Dict[str, List[Candidate]], limit: int = None) -> List[Candidate]:
+    """
+    Merges the newest-first source lists into one newest-first list without duplicates.
+
+    When the sources hold more than `limit` candidates, they are taken round-robin
+    so a busy source (trending, a large university) cannot crowd out older posts
+    from a friend.
+    """
+    limit = feed_window.CANDIDATE_LIMIT if limit is None else limit
+    key = lambda c: (c.created_at, c.id)
+    if sum(len(items) for items in sources.values()) > limit:
+        picked = []
+        taken = set()
+        iterators = [iter(items) for items in sources.values() if items]
+        while iterators and len(picked) < limit:
+            for it in list(iterators):
+                c = next(it, None)
+                while c is not None and c.id in taken:
+                    c = next(it, None)
+                if c is None:
+                    iterators.remove(it)
+                    continue
+                taken.add(c.id)
+                picked.append(c)
+                if len(picked) >= limit:
+                    break
+        picked.sort(key=key, reverse=True)
+        return picked
+
+    merged = []
+    taken = set()
+    for c in heapq.merge(*sources.values(), key=key, reverse=True):
+        if c.id not in taken:
+            taken.add(c.id)
+            merged.append(c)
+    return merged
+
+
+def gather_candidates(
+    db: Session,
+    user_id: str,
+    user_university: Optional[str],
+    friend_ids: Set[str],
+    following_ids: Set[str],
+    seen_post_ids: Set[int],
+    horizon: datetime,
+) -> List[Candidate]:
+    return merge_sources(
+        fetch_sources(db, user_id, user_university, friend_ids, following_ids, seen_post_ids, horizon)
+    )
@@ -0,0 +1,238 @@
+# feed_window.py
+"""
+Shared, incrementally refreshed feed candidate window.
+
+Every feed request used to re-scan the newest posts platform-wide with the
+author's User and Profile joined in. `CandidateWindow` keeps those candidates
+per worker process instead: the first request loads the last FEED_WINDOW_DAYS
+of posts (id, author, created_at, author university, counters) and later
+refreshes only append posts with `id > max_id`. Posts older than the horizon
+are evicted on refresh, deleted posts are dropped immediately in this worker
+(`discard`) and by the periodic counter sweep in the others.
+
+feed_sources.py draws the shared candidate sources (same university, trending)
+from it. The window is only used to pick and score candidates; the returned
+page is re-read from the database by id, so captions, counters and deletions in
+the response are always current.
+"""
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+WINDOW_ENABLED = os.getenv("FEED_WINDOW_ENABLED", "true").lower() in {"1", "true", "yes"}
+WINDOW_DAYS = int(os.getenv("FEED_WINDOW_DAYS", "14"))
+CANDIDATE_LIMIT = int(os.getenv("FEED_CANDIDATE_LIMIT", "400"))
+WINDOW_MAX_SIZE = int(os.getenv("FEED_WINDOW_MAX_SIZE", "20000"))
+REFRESH_SECONDS = float(os.getenv("FEED_WINDOW_REFRESH_SECONDS", "5"))
+COUNTS_REFRESH_SECONDS = float(os.getenv("FEED_WINDOW_COUNTS_REFRESH_SECONDS", "60"))
+# Ids are assigned before commit, so a slow transaction can commit an id below max_id;
+# incremental refreshes re-read this many ids behind max_id to pick those up.
+ID_OVERLAP = int(os.getenv("FEED_WINDOW_ID_OVERLAP", "100"))
+
+
+class Candidate(NamedTuple):
+    id: int
+    user_id: str
+    group_id: Optional[int]
+    created_at: datetime
+    university: Optional[str]
+    likes_count: int
+    comments_count: int
+
+    @classmethod
+    def from_row(cls, row) -> "Candidate":
+        created_at = row[3]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return cls(row[0], row[1], row[2], created_at, row[4], row[5] or 0, row[6] or 0)
+
+
+def candidate_query(db: Session, horizon: datetime):
+    """Columns of a Candidate for posts created since `horizon` (author university via profiles)."""
+    return (
+        db.query(
+            models.Post.id,
+            models.Post.user_id,
+            models.Post.group_id,
+            models.Post.created_at,
+            models.Profile.university,
+            models.Post.likes_count,
+            models.Post.comments_count,
+        )
+        .outerjoin(models.Profile, models.Profile.user_id == models.Post.user_id)
+        .filter(models.Post.created_at >= horizon)
+    )
+
+
+class CandidateWindow:
+    def __init__(self, days: int = WINDOW_DAYS, max_size: int = WINDOW_MAX_SIZE):
+        self.days = days
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # Ordered by id ascending (ids follow insertion order, so also roughly by created_at).
+        self._items: List[Candidate] = []
+        self._ids = set()
+        self.max_id = 0
+        self.loaded = False
+        self.last_refresh = 0.0
+        self.last_counts_refresh = 0.0
+        self.refreshes = 0
+        self.full_loads = 0
+        self.evicted = 0
+        # Per-snapshot derived views (by university, trending), rebuilt after each change.
+        self._derived = {}
+
+    # --- Loading ---
+
+    def _evict_locked(self, horizon: datetime) -> None:
+        cut = 0
+        while cut < len(self._items) and self._items[cut].created_at < horizon:
+            cut += 1
+        if len(self._items) - cut > self.max_size:
+            cut = len(self._items) - self.max_size
+        if cut:
+            for c in self._items[:cut]:
+                self._ids.discard(c.id)
+            del self._items[:cut]
+            self.evicted += cut
+
+    def refresh(self, db: Session, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and self.loaded and now - self.last_refresh < REFRESH_SECONDS:
+            return
+        # One refresher at a time; concurrent requests keep serving the current snapshot.
+        if not self._lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            horizon = datetime.now(timezone.utc) - timedelta(days=self.days)
+            if not self.loaded:
+                rows = (
+                    candidate_query(db, horizon)
+                    .order_by(models.Post.id.desc())
+                    .limit(self.max_size)
+                    .all()
+                )
+                items = [Candidate.from_row(r) for r in reversed(rows)]
+                self._items = items
+                self._ids = {c.id for c in items}
+                self.max_id = items[-1].id if items else 0
+                self.loaded = True
+                self.full_loads += 1
+                self.last_counts_refresh = now
+            else:
+                rows = (
+                    candidate_query(db, horizon)
+                    .filter(models.Post.id > self.max_id - ID_OVERLAP)
+                    .order_by(models.Post.id)
+                    .all()
+                )
+                fresh = [Candidate.from_row(r) for r in rows if r[0] not in self._ids]
+                if fresh:
+                    items = self._items + fresh
+                    if fresh[0].id < self.max_id:
+                        items.sort(key=lambda c: c.id)
+                    self._items = items
+                    self._ids.update(c.id for c in fresh)
+                    self.max_id = max(self.max_id, fresh[-1].id)
+                if now - self.last_counts_refresh >= COUNTS_REFRESH_SECONDS:
+                    self._refresh_counts_locked(db)
+                    self.last_counts_refresh = now
+            self._evict_locked(horizon)
+            self._derived = {}
+            self.last_refresh = now
+            self.refreshes += 1
+        finally:
+            self._lock.release()
+
+    def _refresh_counts_locked(self, db: Session) -> None:
+        """Re-reads counters for the whole window; ids that no longer exist were deleted elsewhere."""
+        if not self._items:
+            return
+        counts = {
+            pid: (likes or 0, comments or 0)
+            for pid, likes, comments in db.query(
+                models.Post.id, models.Post.likes_count, models.Post.comments_count
+            ).filter(models.Post.id >= self._items[0].id, models.Post.id <= self.max_id)
+        }
+        items = []
+        for c in self._items:
+            fresh = counts.get(c.id)
+            if fresh is None:
+                self.evicted += 1
+                continue
+            items.append(c if fresh == (c.likes_count, c.comments_count) else c._replace(likes_count=fresh[0], comments_count=fresh[1]))
+        self._items = items
+        self._ids = {c.id for c in items}
+
+    def discard(self, post_id: int) -> None:
+        with self._lock:
+            if post_id in self._ids:
+                self._ids.discard(post_id)
+                self._items = [c for c in self._items if c.id != post_id]
+                self.evicted += 1
+                self._derived = {}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items = []
+            self._ids = set()
+            self.max_id = 0
+            self.loaded = False
+            self._derived = {}
+
+    # --- Reading ---
+
+    def newest(self, db: Session) -> List[Candidate]:
+        """Refreshes if due and returns the window newest-first (a snapshot; safe to iterate)."""
+        self.refresh(db)
+        return self._items[::-1]
+
+    def _derive(self, key, build):
+        derived = self._derived
+        if key not in derived:
+            derived[key] = build(self._items)
+        return derived[key]
+
+    def by_university(self, university: str) -> List[Candidate]:
+        """Window posts by authors at `university`, newest-first."""
+        def build(items):
+            index = {}
+            for c in reversed(items):
+                if c.university:
+                    index.setdefault(c.university, []).append(c)
+            return index
+        return self._derive("by_university", build).get(university, [])
+
+    def trending(self, since: datetime, size: int = 500) -> List[Candidate]:
+        """
+        The `size` most-liked window posts created after `since`. The window is
+        ranked by likes once per snapshot; `since` is applied on each call, since
+        callers pass a moving cutoff.
+        """
+        ranked = self._derive(
+            "by_likes", lambda items: sorted(items, key=lambda c: (c.likes_count, c.created_at), reverse=True)
+        )
+        return list(itertools.islice((c for c in ranked if c.created_at >= since), size))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": WINDOW_ENABLED,
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "days": self.days,
+            "max_id": self.max_id,
+            "refresh_lag_seconds": round(time.monotonic() - self.last_refresh, 3) if self.loaded else None,
+            "refreshes": self.refreshes,
+            "full_loads": self.full_loads,
+            "evicted": self.evicted,
+        }
+
+
+candidate_window = CandidateWindow()
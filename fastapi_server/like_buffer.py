@@ -0,0 +1,361 @@
+# like_buffer.py
+"""
+Write combining for likes on hot posts.
+
+When a post goes viral, hundreds of concurrent likes each run their own
+transaction. Every one of them takes the row lock on the post to bump
+likes_count, and they all queue behind each other. With LIKE_COMBINING_ENABLED,
+a post becomes "hot" in a worker once it gets LIKE_HOT_PER_SECOND likes within
+one second there. From then on its likes are buffered in memory:
+
+- The first hot like seeds a `HotPost` with the post's likes_count from the
+  database. A like from a user whose like is already buffered (a double tap)
+  gets `added=False` from memory. Any other user's row is looked up by primary
+  key, which takes no locks: if it exists the like is a duplicate, otherwise it
+  is buffered and the count incremented in place. Likers are not cached, so a
+  like removed through another worker can be given again here, and memory per
+  post is bounded by its pending likes.
+- A background thread flushes every LIKE_FLUSH_MS, in one transaction for all
+  hot posts:
+    1. INSERT INTO post_likes ... VALUES (...), (...) ON CONFLICT DO NOTHING
+       RETURNING post_id, user_id
+    2. one UPDATE posts SET likes_count = likes_count + n per post, where n is
+       the number of rows that were actually inserted
+    3. like notifications for the inserted rows that do not have one yet
+  After the commit each post's count is reseeded from the database, so likes
+  taken by other workers show up in this one.
+
+Unliking a hot post cancels a pending like in memory. Otherwise it deletes the
+row as before. A hot post is dropped after LIKE_HOT_IDLE_SECONDS without likes
+and reseeded from the database if it heats up again. Likes still buffered when a
+worker dies are lost. The shutdown hook in main.py flushes on a clean stop.
+
+Posts below the threshold, every post when combining is off, and every post on
+a database other than PostgreSQL or SQLite (no ON CONFLICT ... RETURNING) go
+through crud.like_post_returning_count unchanged.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+logger = logging.getLogger(__name__)
+
+COMBINING_ENABLED = os.getenv("LIKE_COMBINING_ENABLED", "false").lower() in {"1", "true", "yes"}
+FLUSH_MS = float(os.getenv("LIKE_FLUSH_MS", "50"))
+HOT_PER_SECOND = int(os.getenv("LIKE_HOT_PER_SECOND", "5"))
+HOT_IDLE_SECONDS = float(os.getenv("LIKE_HOT_IDLE_SECONDS", "300"))
+MAX_PENDING = int(os.getenv("LIKE_BUFFER_MAX_PENDING", "50000"))
+# Rows per INSERT statement; keeps bind parameters well under driver limits.
+CHUNK_SIZE = 1000
+
+
+class HotPost:
+    __slots__ = ("post_id", "count", "pending", "touched")
+
+    def __init__(self, post_id: int, count: int):
+        self.post_id = post_id
+        self.count = count
+        self.pending: Dict[str, datetime] = {}
+        self.touched = time.monotonic()
+
+
+COMBINING_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _insert_for(db: Session):
+    """The dialect's INSERT with ON CONFLICT support, or None when likes can't be combined there."""
+    return COMBINING_DIALECTS.get(db.get_bind().dialect.name)
+
+
+def write_likes(db: Session, likes: Dict[int, Dict[str, datetime]]) -> Tuple[Dict[int, int], int]:
+    """
+    Inserts the buffered `likes` (post_id -> {user_id: liked_at}) and bumps the
+    counters by the rows actually inserted. Returns (post_id -> likes_count after
+    the write for the posts that still exist, rows inserted). Does not commit.
+    """
+    if not likes:
+        return {}, 0
+    authors = dict(db.execute(
+        select(models.Post.id, models.Post.user_id).where(models.Post.id.in_(list(likes)))
+    ).all())
+    rows = [
+        {"post_id": post_id, "user_id": user_id}
+        for post_id, users in likes.items() if post_id in authors
+        for user_id in users
+    ]
+    inserted: List[Tuple[int, str]] = []
+    insert = _insert_for(db)
+    table = models.post_likes
+    for start in range(0, len(rows), CHUNK_SIZE):
+        stmt = insert(table).values(rows[start:start + CHUNK_SIZE]).on_conflict_do_nothing()
+        inserted.extend(db.execute(stmt.returning(table.c.post_id, table.c.user_id)).all())
+
+    added: Dict[int, int] = {}
+    for post_id, _ in inserted:
+        added[post_id] = added.get(post_id, 0) + 1
+    for post_id, n in added.items():
+        crud._bump_post_counter(db, post_id, models.Post.likes_count, n)
+
+    to_notify = [(post_id, user_id) for post_id, user_id in inserted if authors[post_id] and authors[post_id] != user_id]
+    if to_notify:
+        notified = set(db.execute(
+            select(models.Notification.post_id, models.Notification.sender_id).where(
+                models.Notification.type == "like",
+                models.Notification.group_id.is_(None),
+                models.Notification.post_id.in_({p for p, _ in to_notify}),
+                models.Notification.sender_id.in_({u for _, u in to_notify}),
+            )
+        ).all())
+        new = [
+            {
+                "user_id": authors[post_id],
+                "sender_id": user_id,
+                "type": "like",
+                "post_id": post_id,
+                "is_read": False,
+                "created_at": likes[post_id][user_id],
+            }
+            for post_id, user_id in to_notify if (post_id, user_id) not in notified
+        ]
+        for start in range(0, len(new), CHUNK_SIZE):
+            db.execute(insert(models.Notification.__table__).values(new[start:start + CHUNK_SIZE]).on_conflict_do_nothing())
+
+    counts = dict(db.execute(
+        select(models.Post.id, models.Post.likes_count).where(models.Post.id.in_(list(authors)))
+    ).all())
+    return counts, len(inserted)
+
+
+class LikeBuffer:
+    def __init__(self, session_factory=None):
+        # Defaults to database.SessionLocal (imported lazily so tests can swap engines first).
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._hot: Dict[int, HotPost] = {}
+        # Likes taken out of pending by the flush in progress.
+        self._flushing: Dict[int, Dict[str, datetime]] = {}
+        self._rates: Dict[int, Tuple[float, int]] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.buffered = 0
+        self.duplicates = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.direct = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    def _is_hot(self, post_id: int) -> bool:
+        """Records a like for the rate check; True once the post crosses LIKE_HOT_PER_SECOND."""
+        now = time.monotonic()
+        with self._lock:
+            if post_id in self._hot:
+                return True
+            window_start, count = self._rates.get(post_id, (now, 0))
+            if now - window_start >= 1.0:
+                window_start, count = now, 0
+            count += 1
+            self._rates[post_id] = (window_start, count)
+            return count >= HOT_PER_SECOND
+
+    def _hot_post(self, db: Session, post_id: int) -> Optional[HotPost]:
+        with self._lock:
+            hot = self._hot.get(post_id)
+        if hot is not None:
+            return hot
+        count = db.execute(select(models.Post.likes_count).where(models.Post.id == post_id)).first()
+        if count is None:
+            return None
+        with self._lock:
+            hot = self._hot.setdefault(post_id, HotPost(post_id, count[0] or 0))
+            self._rates.pop(post_id, None)
+        return hot
+
+    def like(self, db: Session, post_id: int, user_id: str) -> Optional[Tuple[bool, int]]:
+        """(added, likes_count) like crud.like_post_returning_count; None when the post does not exist."""
+        if not (COMBINING_ENABLED and _insert_for(db) is not None and self._is_hot(post_id)):
+            self.direct += 1
+            return crud.like_post_returning_count(db, post_id, user_id)
+        hot = self._hot_post(db, post_id)
+        if hot is None:
+            return None
+        with self._lock:
+            hot.touched = time.monotonic()
+            if self._buffered_locked(hot, user_id):
+                self.duplicates += 1
+                return False, hot.count
+        liked = db.execute(
+            select(models.post_likes.c.user_id).where(
+                models.post_likes.c.post_id == post_id, models.post_likes.c.user_id == user_id
+            )
+        ).first()
+        with self._lock:
+            if liked is not None or self._buffered_locked(hot, user_id):
+                self.duplicates += 1
+                return False, hot.count
+            if self.pending_count() >= MAX_PENDING:
+                self.dropped += 1
+                buffered = False
+            else:
+                hot.pending[user_id] = datetime.now(timezone.utc)
+                hot.count += 1
+                self.buffered += 1
+                buffered = True
+                result = True, hot.count
+        if not buffered:
+            # Buffer full (the database is falling behind): write through instead.
+            return crud.like_post_returning_count(db, post_id, user_id)
+        self._ensure_flusher()
+        return result
+
+    def _buffered_locked(self, hot: HotPost, user_id: str) -> bool:
+        return user_id in hot.pending or user_id in self._flushing.get(hot.post_id, ())
+
+    def _cancel_pending_locked(self, hot: HotPost, user_id: str) -> bool:
+        if hot.pending.pop(user_id, None) is None:
+            return False
+        hot.count -= 1
+        self.cancelled += 1
+        return True
+
+    def unlike(self, db: Session, post_id: int, user_id: str) -> bool:
+        """Removes the like, cancelling it in memory if it has not been flushed yet."""
+        with self._lock:
+            hot = self._hot.get(post_id)
+            if hot is not None and self._cancel_pending_locked(hot, user_id):
+                return True
+        if hot is None:
+            return crud.remove_post_like_transactional(db, post_id, user_id)
+        # A flush may be writing this like right now; let it land before deleting.
+        with self._flush_lock:
+            with self._lock:
+                # A flush that failed meanwhile has put the like back in pending.
+                if self._cancel_pending_locked(hot, user_id):
+                    return True
+            removed = crud.remove_post_like_transactional(db, post_id, user_id)
+            if removed:
+                with self._lock:
+                    hot.count = max(hot.count - 1, 0)
+        return removed
+
+    def pending_count(self) -> int:
+        return sum(len(hot.pending) for hot in self._hot.values())
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="like-buffer-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(FLUSH_MS / 1000.0)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"[like-buffer] Flush failed: {e}")
+
+    def flush(self, db: Session = None) -> int:
+        """Writes every pending like in one transaction; returns rows inserted."""
+        with self._flush_lock:
+            with self._lock:
+                likes = {}
+                for post_id, hot in self._hot.items():
+                    if hot.pending:
+                        likes[post_id], hot.pending = hot.pending, {}
+                self._flushing = likes
+            if not likes:
+                self._evict_idle()
+                return 0
+            started = time.perf_counter()
+            own_session = db is None
+            if own_session:
+                factory = self.session_factory
+                if factory is None:
+                    from .database import SessionLocal as factory
+                db = factory()
+            try:
+                counts, written = write_likes(db, likes)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.errors += 1
+                self._requeue(likes)
+                raise
+            finally:
+                if own_session:
+                    db.close()
+            with self._lock:
+                self._flushing = {}
+                for post_id in likes:
+                    hot = self._hot.get(post_id)
+                    if hot is None:
+                        continue
+                    if post_id not in counts:
+                        del self._hot[post_id]  # deleted while its likes were buffered
+                    else:
+                        hot.count = counts[post_id] + len(hot.pending)
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000.0, 2)
+            self._evict_idle()
+            return written
+
+    def _requeue(self, likes: Dict[int, Dict[str, datetime]]) -> None:
+        # Unlikes of these users wait on the flush lock, so none of them has been undone.
+        with self._lock:
+            self._flushing = {}
+            for post_id, users in likes.items():
+                hot = self._hot.get(post_id)
+                if hot is None:
+                    continue
+                for user_id, liked_at in users.items():
+                    hot.pending.setdefault(user_id, liked_at)
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for post_id in [p for p, hot in self._hot.items() if not hot.pending and now - hot.touched >= HOT_IDLE_SECONDS]:
+                del self._hot[post_id]
+            for post_id in [p for p, (start, _) in self._rates.items() if now - start >= 1.0]:
+                del self._rates[post_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hot = {}
+            self._rates = {}
+
+    def stats(self) -> dict:
+        return {
+            "enabled": COMBINING_ENABLED,
+            "hot_posts": len(self._hot),
+            "pending": self.pending_count(),
+            "buffered": self.buffered,
+            "duplicates": self.duplicates,
+            "cancelled": self.cancelled,
+            "direct": self.direct,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "last_flush_ms": self.last_flush_ms,
+            "flush_ms": FLUSH_MS,
+            "hot_per_second": HOT_PER_SECOND,
+        }
+
+
+like_buffer = LikeBuffer()
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 import traceback
 from datetime import datetime
@@ -16,8 +17,13 @@ load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 
 from typing import Optional
 from urllib.parse import quote
-from . import migrate, schemas
+from . import feed_inbox, like_buffer, migrate, schemas, social_graph, view_buffer
+from .backplane import backplane
+from .database import SessionLocal
 from .dependencies import get_db
+from .pagination import InvalidCursor
+from .query_metrics import QUERY_METRICS_ENABLED, QueryMetricsMiddleware
+from .security import AUTH_VERIFY_MODE, token_verifier
 from .routers import auth, users, posts, groups, messages, admin, media, stories, notifications, search, comments
 
 # Logging configuration
@@ -29,10 +35,65 @@ app = FastAPI(title="GoUnion API")
 # Startup Migrations
 @app.on_event("startup")
 async def startup_event():
+    global _inbox_pruner
     if os.getenv("RUN_STARTUP_MIGRATIONS", "true").lower() in {"1", "true", "yes"}:
         migrate.apply_migration()
     else:
         logger.info("[migration] Skipping startup migrations.")
+    if AUTH_VERIFY_MODE == "local":
+        await asyncio.to_thread(token_verifier.refresh_jwks, True)
+    if social_graph.GRAPH_ENABLED:
+        try:
+            await asyncio.to_thread(_load_social_graph)
+        except Exception as e:
+            # Not fatal: the graph loads on first use instead.
+            logger.warning(f"[social-graph] Startup load failed: {e}")
+    if feed_inbox.FEED_MODE == "inbox" and feed_inbox.PRUNE_SECONDS > 0:
+        _inbox_pruner = asyncio.create_task(_prune_feed_inbox_periodically())
+    # Connects in the background; WebSocket messages stay worker-local until it does.
+    await backplane.start(messages.manager.deliver)
+
+_inbox_pruner: Optional[asyncio.Task] = None
+
+async def _prune_feed_inbox_periodically():
+    while True:
+        await asyncio.sleep(feed_inbox.PRUNE_SECONDS)
+        try:
+            pruned = await asyncio.to_thread(_prune_feed_inbox)
+            if pruned:
+                logger.info(f"[feed-inbox] Pruned {pruned} expired inbox row(s).")
+        except Exception as e:
+            logger.warning(f"[feed-inbox] Prune failed: {e}")
+
+def _prune_feed_inbox() -> int:
+    db = SessionLocal()
+    try:
+        return feed_inbox.prune_feed_inbox(db)
+    finally:
+        db.close()
+
+def _load_social_graph():
+    db = SessionLocal()
+    try:
+        social_graph.social_graph.load(db)
+        logger.info(f"[social-graph] Loaded: {social_graph.social_graph.stats()}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write views and likes still held by the write-behind buffers before the worker exits.
+    try:
+        await asyncio.to_thread(view_buffer.view_buffer.flush)
+    except Exception as e:
+        logger.warning(f"[view-buffer] Final flush failed: {e}")
+    try:
+        await asyncio.to_thread(like_buffer.like_buffer.flush)
+    except Exception as e:
+        logger.warning(f"[like-buffer] Final flush failed: {e}")
+    if _inbox_pruner is not None:
+        _inbox_pruner.cancel()
+    await backplane.stop()
 
 # CORS Configuration
 _raw_origins = os.getenv(
@@ -65,6 +126,10 @@ for origin in [*REQUIRED_FRONTEND_ORIGINS, *REQUIRED_MOBILE_ORIGINS]:
     if normalized_origin not in ALLOWED_ORIGINS:
         ALLOWED_ORIGINS.append(normalized_origin)
 
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # Global Exception Handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -80,6 +145,10 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+# Per-request SQL statement count / DB time headers and N+1 warnings
+if QUERY_METRICS_ENABLED:
+    app.add_middleware(QueryMetricsMiddleware)
+
 # Include Routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -183,4 +252,5 @@ app = CORSMiddleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy.orm import relationship, column_property
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy import (
     Boolean,
     Column,
@@ -11,9 +11,10 @@ from sqlalchemy import (
     Date,
     Float,
     JSON,
-    select,
     func,
-    UniqueConstraint
+    Index,
+    UniqueConstraint,
+    select
 )
 
 from .database import Base
@@ -41,7 +42,9 @@ comment_likes = Table(
     Base.metadata,
     Column("user_id", String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
     Column("comment_id", Integer, ForeignKey("comments.id", ondelete="CASCADE"), primary_key=True),
-    UniqueConstraint("user_id", "comment_id", name="uq_comment_user_likes")
+    UniqueConstraint("user_id", "comment_id", name="uq_comment_user_likes"),
+    # Like counts and liker pages by comment; the primary key leads with user_id
+    Index("ix_comment_likes_comment_user", "comment_id", "user_id"),
 )
 
 conversation_participants = Table(
@@ -82,7 +85,7 @@ class Profile(Base):
     __tablename__ = "profiles"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey("users.id"))
+    user_id = Column(String, ForeignKey("users.id"), index=True)
     bio = Column(String, nullable=True)
     profile_picture = Column(String, nullable=True)  # URL to image
     university = Column(String, nullable=True)
@@ -98,6 +101,10 @@ class Profile(Base):
 
     user = relationship("User", back_populates="profile")
 
+    __table_args__ = (
+        Index("ix_profiles_university_user", "university", "user_id"),
+    )
+
 
 class Post(Base):
     __tablename__ = "posts"
@@ -116,17 +123,20 @@ class Post(Base):
         "Comment", back_populates="post", cascade="all, delete-orphan"
     )
 
-    likes_count = column_property(
-        select(func.count(post_likes.c.user_id))
-        .where(post_likes.c.post_id == id)
-        .scalar_subquery()
-    )
-
-
+    # Denormalized counters, maintained by the like/comment crud functions and
+    # repaired by crud.reconcile_post_counters.
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     likes = relationship("User", secondary=post_likes, backref="liked_posts")
     dislikes = relationship("User", secondary=post_dislikes, backref="disliked_posts")
 
+    # Feed candidate sources: posts by a set of authors / in a set of groups, newest first.
+    __table_args__ = (
+        Index("ix_posts_user_created", "user_id", "created_at"),
+        Index("ix_posts_group_created", "group_id", "created_at"),
+    )
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -141,18 +151,22 @@ class Comment(Base):
     post = relationship("Post", back_populates="comments")
     likes = relationship("User", secondary=comment_likes, backref="liked_comments")
 
-    @property
-    def likes_count(self):
-        return len(self.likes or [])
+    # Counted in SQL with the row; loading `likes` would pull every liker's User.
+    likes_count = column_property(
+        select(func.count(comment_likes.c.user_id))
+        .where(comment_likes.c.comment_id == id)
+        .correlate_except(comment_likes)
+        .scalar_subquery()
+    )
 
 
 class FriendRequest(Base):
     __tablename__ = "friend_requests"
 
     id = Column(Integer, primary_key=True, index=True)
-    sender_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"))
-    receiver_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"))
-    status = Column(String, default="pending")  # pending, accepted, rejected
+    sender_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    receiver_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    status = Column(String, default="pending", index=True)  # pending, accepted, rejected
     created_at = Column(DateTime, default=func.now(), index=True)
 
     sender = relationship("User", foreign_keys=[sender_id])
@@ -167,8 +181,8 @@ class Follow(Base):
     __tablename__ = "follows"
 
     id = Column(Integer, primary_key=True, index=True)
-    follower_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"))
-    following_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"))
+    follower_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    following_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime, default=func.now(), index=True)
 
     __table_args__ = (
@@ -195,6 +209,8 @@ class Notification(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "sender_id", "type", "post_id", "group_id", name="uq_notification_dedup"),
+        # Keyset pagination of a user's notifications (pagination.py)
+        Index("ix_notifications_user_created_id", "user_id", "created_at", "id"),
     )
 
 
@@ -255,6 +271,7 @@ class GroupMember(Base):
 
     __table_args__ = (
         UniqueConstraint("group_id", "user_id", name="uq_group_member"),
+        Index("ix_group_members_user_id", "user_id"),
     )
 
 
@@ -361,6 +378,11 @@ class Message(Base):
     conversation = relationship("Conversation", back_populates="messages")
     sender = relationship("User")
 
+    # Keyset pagination of a conversation (pagination.py)
+    __table_args__ = (
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+    )
+
 
 class Story(Base):
     __tablename__ = "stories"
@@ -426,3 +448,22 @@ class SeenPost(Base):
     user = relationship("User")
     post = relationship("Post")
 
+    __table_args__ = (
+        # Incremental seen-filter syncs read a user's rows newer than their last sync
+        Index("ix_seen_posts_user_seen_at", "user_id", "seen_at"),
+    )
+
+
+
+class FeedItem(Base):
+    """Materialized home-feed inbox row: `post_id` was fanned out to `user_id` on write."""
+    __tablename__ = "feed_items"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_feed_items_user_created", "user_id", "created_at"),
+    )
@@ -0,0 +1,120 @@
+# pagination.py
+"""
+Keyset pagination for list endpoints.
+
+List queries used to page with OFFSET. The database still reads and throws away
+every skipped row, so deep pages get linearly slower, and rows inserted between
+requests shift the window so a page repeats or skips items. `paginate` orders
+by a unique key, (created_at, id) newest first for most tables, and continues
+strictly after the last row of the previous page:
+
+    WHERE created_at <= :created_at AND (created_at, id) < (:created_at, :id)
+    ORDER BY created_at DESC, id DESC LIMIT :limit + 1
+
+The plain `created_at <=` bound lets a single-column created_at index narrow
+the scan on databases that do not use row comparisons as index conditions. The
+extra row tells us whether another page exists.
+
+The client sees an opaque cursor: base64url-encoded JSON of the last row's key.
+Routers return it in the X-Next-Cursor response header and accept it back as
+`?cursor=`. Without a cursor, `skip` still works as a legacy OFFSET. Those pages
+also get an X-Next-Cursor, so clients can switch over mid-scroll.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, and_, func, literal, tuple_
+from sqlalchemy.orm import Query
+
+
+# SQLite keeps DateTime as text. CURRENT_TIMESTAMP defaults have no fractional
+# part, while bound datetimes always do. So the exact cursor comparison
+# normalizes both sides, and the index-friendly lead bound is widened to whole
+# seconds.
+_SQLITE_DATETIME = "%Y-%m-%d %H:%M:%f"
+_SQLITE_SECOND = "%Y-%m-%d %H:%M:%S"
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by `encode_cursor` for this ordering."""
+
+
+def _to_json(value: Any):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> Tuple:
+    """The key values in `cursor`, converted back to the Python types of `columns`."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor("Cursor does not match this listing")
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError) as e:
+                raise InvalidCursor("Malformed cursor") from e
+        decoded.append(value)
+    return tuple(decoded)
+
+
+def _comparable(column, expr, sqlite: bool):
+    if sqlite and isinstance(column.type, DateTime):
+        return func.strftime(_SQLITE_DATETIME, expr)
+    return expr
+
+
+def _lead_bound(column, value, descending: bool, sqlite: bool):
+    """A range on the first key column alone, which an index on it can serve."""
+    if sqlite and isinstance(column.type, DateTime):
+        value = literal(value, type_=column.type)
+        if descending:
+            return column < func.strftime(_SQLITE_SECOND, value, "+1 seconds")
+        return column >= func.strftime(_SQLITE_SECOND, value)
+    return column <= value if descending else column >= value
+
+
+def paginate(
+    query: Query,
+    columns: Sequence,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    descending: bool = True,
+) -> Tuple[List, Optional[str]]:
+    """
+    (rows, next_cursor) for one page of `query` ordered by `columns`, whose
+    values must be unique per row (end with the primary key). next_cursor is
+    None on the last page. Raises InvalidCursor for a cursor it cannot read.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        sqlite = query.session.get_bind().dialect.name == "sqlite"
+        keys = tuple_(*[_comparable(c, c, sqlite) for c in columns])
+        bound = tuple_(*[_comparable(c, literal(v, type_=c.type), sqlite) for c, v in zip(columns, values)])
+        after = keys < bound if descending else keys > bound
+        if len(columns) > 1:
+            after = and_(_lead_bound(columns[0], values[0], descending, sqlite), after)
+        query = query.filter(after)
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+    if skip and not cursor:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
@@ -0,0 +1,209 @@
+# pool_metrics.py
+"""
+Connection pool telemetry and optional adaptive sizing.
+
+database.py builds its engines with `InstrumentedQueuePool` (or the async
+variant) and registers them here. Each pool records how long checkouts wait,
+how many connections are checked out / in overflow, and pre-ping failures.
+`pool_stats()` feeds GET /admin/metrics.
+
+With DB_POOL_ADAPTIVE=true the pool also adjusts its overflow allowance between
+DB_POOL_MIN_OVERFLOW and DB_POOL_MAX_OVERFLOW_LIMIT: it grows when the recent
+p95 checkout wait exceeds DB_POOL_TARGET_WAIT_MS and shrinks back when waits
+are negligible and the extra capacity goes unused. Only the overflow allowance
+moves: pool_size (the connections kept open) stays at DB_POOL_SIZE, because
+QueuePool cannot resize its queue in place. Overflow connections are closed on
+checkin rather than kept, so a pool that grows its overflow still opens a fresh
+connection for each checkout past pool_size.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+ADAPTIVE_ENABLED = os.getenv("DB_POOL_ADAPTIVE", "false").lower() in {"1", "true", "yes"}
+ADAPTIVE_MIN_OVERFLOW = int(os.getenv("DB_POOL_MIN_OVERFLOW", os.getenv("DB_MAX_OVERFLOW", "2")))
+ADAPTIVE_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW_LIMIT", "20"))
+ADAPTIVE_TARGET_WAIT_MS = float(os.getenv("DB_POOL_TARGET_WAIT_MS", "50"))
+ADAPTIVE_INTERVAL_SECONDS = float(os.getenv("DB_POOL_ADAPT_INTERVAL", "10"))
+
+_WAIT_WINDOW = 512
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total_ms = 0.0
+        self.checkout_wait_max_ms = 0.0
+        self.checkout_errors = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pre_ping_failures = 0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.resizes = 0
+        self._recent_waits_ms = deque(maxlen=_WAIT_WINDOW)
+
+    def record_wait(self, wait_ms: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total_ms += wait_ms
+            if wait_ms > self.checkout_wait_max_ms:
+                self.checkout_wait_max_ms = wait_ms
+            self._recent_waits_ms.append(wait_ms)
+
+    def record_usage(self, checked_out: int, overflow: int) -> None:
+        if checked_out > self.peak_checked_out:
+            self.peak_checked_out = checked_out
+        if overflow > self.peak_overflow:
+            self.peak_overflow = overflow
+
+    def recent_wait_percentiles(self) -> Dict[str, float]:
+        with self._lock:
+            waits = sorted(self._recent_waits_ms)
+        return {
+            "p50": round(_percentile(waits, 0.50), 3),
+            "p95": round(_percentile(waits, 0.95), 3),
+            "p99": round(_percentile(waits, 0.99), 3),
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkout_wait_avg_ms": round(self.checkout_wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            "checkout_wait_max_ms": round(self.checkout_wait_max_ms, 3),
+            "checkout_wait_recent_ms": self.recent_wait_percentiles(),
+            "checkout_errors": self.checkout_errors,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "pre_ping_failures": self.pre_ping_failures,
+            "peak_checked_out": self.peak_checked_out,
+            "peak_overflow": self.peak_overflow,
+            "resizes": self.resizes,
+        }
+
+
+class _InstrumentedPoolMixin:
+    """Times `_do_get` (the blocking part of a checkout) and optionally adapts max_overflow."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        self.adaptive = ADAPTIVE_ENABLED and self._max_overflow > -1
+        self._last_adapt = time.monotonic()
+        if self.adaptive:
+            self._max_overflow = max(ADAPTIVE_MIN_OVERFLOW, min(self._max_overflow, ADAPTIVE_MAX_OVERFLOW))
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except Exception:
+            self.metrics.checkout_errors += 1
+            raise
+        finally:
+            self.metrics.record_wait((time.perf_counter() - started) * 1000.0)
+        self.metrics.record_usage(self.checkedout(), max(self.overflow(), 0))
+        if self.adaptive:
+            self._maybe_adapt()
+        return record
+
+    def recreate(self):
+        # Keep the adapted overflow and accumulated metrics across pool recreation (e.g. engine.dispose()).
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+    # --- Adaptive sizing ---
+
+    def resize(self, max_overflow: int) -> None:
+        """Sets max_overflow, clamped to the adaptive limits. pool_size is left as configured."""
+        max_overflow = max(ADAPTIVE_MIN_OVERFLOW, min(max_overflow, ADAPTIVE_MAX_OVERFLOW))
+        with self._overflow_lock:
+            if max_overflow != self._max_overflow:
+                self._max_overflow = max_overflow
+                self.metrics.resizes += 1
+
+    def _maybe_adapt(self) -> None:
+        now = time.monotonic()
+        if now - self._last_adapt < ADAPTIVE_INTERVAL_SECONDS:
+            return
+        self._last_adapt = now
+        p95 = self.metrics.recent_wait_percentiles()["p95"]
+        if p95 > ADAPTIVE_TARGET_WAIT_MS:
+            self.resize(self._max_overflow + max(1, self.size() // 2))
+        elif p95 < ADAPTIVE_TARGET_WAIT_MS / 10 and max(self.overflow(), 0) < self._max_overflow // 2:
+            self.resize(self._max_overflow - 1)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# --- Registry ---
+
+_engines: Dict[str, object] = {}
+
+
+def register_engine(name: str, engine) -> None:
+    """Attach event listeners to a (sync) engine and expose its pool under `name`."""
+    _engines[name] = engine
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        if context.is_pre_ping:
+            metrics = getattr(engine.pool, "metrics", None)
+            if metrics is not None:
+                metrics.pre_ping_failures += 1
+
+    @event.listens_for(engine.pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics = getattr(engine.pool, "metrics", None)
+        if metrics is not None:
+            metrics.connects += 1
+
+    @event.listens_for(engine.pool, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics = getattr(engine.pool, "metrics", None)
+        if metrics is not None:
+            metrics.invalidations += 1
+
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        entry = {
+            "pool_class": type(pool).__name__,
+            "status": pool.status(),
+        }
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        metrics = getattr(pool, "metrics", None)
+        if metrics is not None:
+            entry["adaptive"] = getattr(pool, "adaptive", False)
+            entry.update(metrics.snapshot())
+        stats[name] = entry
+    return stats
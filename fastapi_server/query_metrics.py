@@ -0,0 +1,158 @@
+# query_metrics.py
+"""
+Per-request SQL statement counting and N+1 detection.
+
+Engine-level `before/after_cursor_execute` listeners add every statement to the
+`QueryStats` of the current request (a contextvar, so it follows the request into
+`asyncio.to_thread` workers and `AsyncSession.run_sync`). `QueryMetricsMiddleware`
+opens the stats for each HTTP request, adds X-DB-Query-Count / X-DB-Time-Ms to the
+response and logs a warning when the route goes over DB_QUERY_BUDGET statements
+or runs the same statement shape DB_QUERY_REPEAT_THRESHOLD times or more.
+
+Tests can use `count_queries()` directly to pin the number of statements a code
+path issues.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_METRICS_ENABLED = os.getenv("DB_QUERY_METRICS", "true").lower() in {"1", "true", "yes"}
+QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "25"))
+REPEAT_THRESHOLD = int(os.getenv("DB_QUERY_REPEAT_THRESHOLD", "5"))
+
+_current_stats: contextvars.ContextVar[Optional["QueryStats"]] = contextvars.ContextVar("query_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """Collapses literals and IN-lists so statements differing only in parameters compare equal."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return _PLACEHOLDER_LIST.sub("(?)", shape)
+
+
+class QueryStats:
+    def __init__(self, label: str = ""):
+        self._lock = threading.Lock()
+        self.label = label
+        self.count = 0
+        self.db_time_ms = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.db_time_ms += elapsed_ms
+            self.shapes[shape] += 1
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD):
+        """(shape, count) pairs that ran at least `threshold` times — the N+1 signature."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+def current_label() -> str:
+    """Label ("METHOD /path") of the request whose statements are being counted, if any."""
+    stats = _current_stats.get()
+    return stats.label if stats is not None else ""
+
+
+@contextmanager
+def count_queries(label: str = ""):
+    """Collects the statements issued inside the block (nested blocks each get their own stats)."""
+    stats = QueryStats(label)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+# --- Engine hooks ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    stats.record(statement, (time.perf_counter() - starts.pop()) * 1000.0)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start so the
+    # connection's next statement isn't timed from it.
+    conn = context.connection
+    if conn is not None and context.execution_context is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+# --- Middleware ---
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
+
+
+def check_budget(label: str, stats: QueryStats, budget: int = QUERY_BUDGET, repeat_threshold: int = REPEAT_THRESHOLD) -> None:
+    if stats.count > budget:
+        logger.warning(
+            "[query-budget] %s ran %d statements (budget %d, %.1f ms in DB)",
+            label, stats.count, budget, stats.db_time_ms,
+        )
+    for shape, n in stats.repeated(repeat_threshold):
+        logger.warning("[n+1] %s repeated a statement %d times: %s", label, n, shape[:300])
+
+
+class QueryMetricsMiddleware:
+    """ASGI middleware: per-request statement count and DB time as headers, plus budget warnings."""
+
+    def __init__(self, app, budget: int = QUERY_BUDGET, repeat_threshold: int = REPEAT_THRESHOLD):
+        self.app = app
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries(f"{scope.get('method', '')} {scope.get('path', '')}") as stats:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-query-count", str(stats.count).encode()))
+                    headers.append((b"x-db-time-ms", f"{stats.db_time_ms:.1f}".encode()))
+                    message["headers"] = headers
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                check_budget(_route_label(scope), stats, self.budget, self.repeat_threshold)
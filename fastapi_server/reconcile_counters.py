@@ -0,0 +1,29 @@
+import os
+import sys
+import argparse
+from sqlalchemy.orm import Session
+
+# Add the parent directory to the path so we can import the fastapi_server
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi_server.database import SessionLocal
+from fastapi_server import crud
+
+def reconcile_counters(batch_size: int = 1000):
+    db: Session = SessionLocal()
+    try:
+        print("Reconciling posts.likes_count / posts.comments_count...")
+        repaired = crud.reconcile_post_counters(db, batch_size=batch_size)
+        print(f"Done. Repaired {repaired} post(s).")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair drift in the denormalized post like/comment counters.")
+    parser.add_argument("--batch-size", "-b", type=int, default=1000, help="Posts per UPDATE batch.")
+
+    args = parser.parse_args()
+
+    reconcile_counters(batch_size=args.batch_size)
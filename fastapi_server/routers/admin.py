@@ -1,27 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import asyncio
 from .. import crud, schemas, models, dependencies
-from ..dependencies import get_db, get_current_admin, get_current_moderator
+from ..backplane import backplane
+from ..cache import Principal, principal_cache
+from ..feed_session import feed_sessions
+from ..feed_window import candidate_window
+from ..like_buffer import like_buffer
+from .messages import manager
+from ..pool_metrics import pool_stats
+from ..seen_filter import seen_filters
+from ..slow_queries import slow_query_log
+from ..social_graph import social_graph
+from ..view_buffer import view_buffer
+from ..dependencies import get_db, get_read_db, get_current_admin, get_current_moderator
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 @router.get("/stats")
 async def get_admin_stats(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin),
 ):
     return await asyncio.to_thread(crud.get_platform_stats, db)
 
+@router.get("/metrics")
+async def get_admin_metrics(
+    current_user: Principal = Depends(get_current_admin),
+):
+    """Per-worker runtime metrics (cache sizing, connection pools, etc.)."""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "db_pools": pool_stats(),
+        "slow_queries": slow_query_log.stats(),
+        "feed_window": candidate_window.stats(),
+        "feed_sessions": feed_sessions.stats(),
+        "social_graph": social_graph.stats(),
+        "seen_filters": seen_filters.stats(),
+        "view_buffer": view_buffer.stats(),
+        "like_buffer": like_buffer.stats(),
+        "backplane": backplane.stats(),
+        "websockets": manager.registry.stats(),
+    }
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = 50,
+    current_user: Principal = Depends(get_current_admin),
+):
+    """Most recent slow statements recorded by this worker, newest first, with EXPLAIN plans when captured."""
+    return {
+        **slow_query_log.stats(),
+        "entries": slow_query_log.entries(limit=limit),
+    }
+
+@router.delete("/slow-queries", response_model=schemas.StatusMessage)
+async def clear_slow_queries(
+    current_user: Principal = Depends(get_current_admin),
+):
+    slow_query_log.clear()
+    return {"status": "success", "message": "Slow query log cleared"}
+
+@router.post("/reconcile-counters")
+async def reconcile_counters(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin),
+):
+    """Repairs drift between posts.likes_count/comments_count and the underlying rows."""
+    repaired = await asyncio.to_thread(crud.reconcile_post_counters, db)
+    return {"status": "success", "repaired": repaired}
+
+@router.get("/social-graph")
+async def get_social_graph(
+    current_user: Principal = Depends(get_current_admin),
+):
+    """This worker's in-memory social graph: load state and memory footprint."""
+    return {**social_graph.stats(), "memory": social_graph.memory_report()}
+
+@router.post("/social-graph/check")
+async def check_social_graph(
+    reload: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin),
+):
+    """Diffs this worker's social graph against follows/friend_requests; `reload=true` rebuilds it afterwards if they differ."""
+    report = await asyncio.to_thread(social_graph.check_consistency, db)
+    if reload and not report["consistent"]:
+        await asyncio.to_thread(social_graph.load, db)
+        report["reloaded"] = True
+    return report
+
 @router.get("/users", response_model=List[schemas.User])
 async def get_admin_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
 ):
-    users = await asyncio.to_thread(crud.get_all_users, db, skip=skip, limit=limit)
+    users, next_cursor = await asyncio.to_thread(crud.get_all_users, db, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     payload = []
     for u in users:
         payload.append({
@@ -38,7 +119,7 @@ async def update_user_role(
     user_id: str,
     role: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
 ):
     await asyncio.to_thread(crud.update_user_role, db, user_id, role)
     db.commit()
@@ -48,7 +129,7 @@ async def update_user_role(
 async def toggle_user_active(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
 ):
     await asyncio.to_thread(crud.toggle_user_active, db, user_id)
     db.commit()
@@ -56,12 +137,16 @@ async def toggle_user_active(
 
 @router.get("/reports/", response_model=List[schemas.Report])
 async def get_reports(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_moderator),
+    current_user: Principal = Depends(get_current_moderator),
 ):
-    reps = await asyncio.to_thread(crud.get_reports, db, skip=skip, limit=limit)
+    reps, next_cursor = await asyncio.to_thread(crud.get_reports, db, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     payload = []
     for r in reps:
         payload.append({
@@ -83,7 +168,7 @@ async def resolve_report(
     report_id: int,
     status: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_moderator),
+    current_user: Principal = Depends(get_current_moderator),
 ):
     await asyncio.to_thread(crud.resolve_report, db, report_id, status)
     db.commit()
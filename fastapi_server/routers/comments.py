@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
+from typing import List, Optional
 import asyncio
 
 from .. import crud, models, schemas
-from ..dependencies import get_db, get_current_user
+from ..cache import Principal
+from ..dependencies import get_db, get_read_db, get_current_user
 
 
 router = APIRouter(prefix="/comments", tags=["comments"])
@@ -13,7 +15,7 @@ router = APIRouter(prefix="/comments", tags=["comments"])
 async def like_comment(
     comment_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     comment_exists = await asyncio.to_thread(crud.get_comment, db, comment_id)
     if not comment_exists:
@@ -24,11 +26,27 @@ async def like_comment(
     return {"status": "success", "likes_count": likes_count}
 
 
+@router.get("/{comment_id}/likes", response_model=List[schemas.User])
+async def get_comment_likers(
+    comment_id: int,
+    response: Response,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Users who liked the comment, a page at a time (X-Next-Cursor)."""
+    users, next_cursor = await asyncio.to_thread(crud.get_comment_likers, db, comment_id, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return users
+
+
 @router.delete("/{comment_id}", response_model=schemas.StatusMessage)
 async def delete_comment(
     comment_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     comment = await asyncio.to_thread(crud.get_comment, db, comment_id)
     if not comment:
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import asyncio
 from .. import crud, schemas, models
-from ..dependencies import get_db, get_current_user
+from ..cache import Principal
+from ..dependencies import get_db, get_read_db, get_current_user
 
 router = APIRouter(prefix="/groups", tags=["groups"])
 
@@ -11,12 +12,12 @@ router = APIRouter(prefix="/groups", tags=["groups"])
 async def create_group(
     group: schemas.GroupCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     return await asyncio.to_thread(crud.create_group, db, group=group, creator_id=current_user.id)
 
 @router.get("/", response_model=List[schemas.Group])
-async def list_groups(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def list_groups(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     groups = await asyncio.to_thread(crud.get_groups, db, skip=skip, limit=limit)
     payload = []
     for g in groups:
@@ -55,7 +56,7 @@ async def update_group(
     group_id: int,
     cover_image: str = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     group = await asyncio.to_thread(crud.get_group, db, group_id=group_id)
     if not group:
@@ -70,7 +71,7 @@ async def update_group(
 async def get_group_members(
     group_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     group = await asyncio.to_thread(crud.get_group, db, group_id=group_id)
     if not group:
@@ -96,10 +97,12 @@ async def get_group_members(
 @router.get("/{group_id}/posts/", response_model=List[schemas.Post])
 async def list_group_posts(
     group_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     group = await asyncio.to_thread(crud.get_group, db, group_id=group_id)
     if not group:
@@ -109,7 +112,9 @@ async def list_group_posts(
         if not is_member:
             raise HTTPException(status_code=403, detail="Not a member")
     
-    posts = await asyncio.to_thread(crud.get_group_posts, db, group_id=group_id, skip=skip, limit=limit)
+    posts, next_cursor = await asyncio.to_thread(crud.get_group_posts, db, group_id=group_id, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     payload = []
     for p in posts:
         payload.append({
@@ -120,6 +125,8 @@ async def list_group_posts(
             "video": p.video,
             "caption": p.caption,
             "created_at": p.created_at,
+            "likes_count": p.likes_count or 0,
+            "comments_count": p.comments_count or 0,
             "user": p.user
         })
     return payload
@@ -128,7 +135,7 @@ async def list_group_posts(
 async def join_group(
     group_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     group = await asyncio.to_thread(crud.get_group, db, group_id=group_id)
     if not group:
@@ -1,40 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session, joinedload, selectinload
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Set
 import asyncio
-from .. import crud, schemas, models, dependencies
-from ..dependencies import get_db, get_current_user
+import json
+from .. import async_crud, crud, schemas, models, dependencies
+from ..cache import Principal
+from ..backplane import Backplane, backplane
+from ..dependencies import get_db, get_async_db, get_current_user
+from ..ws_chat import ChatSession, handshake, message_payload
+from ..ws_connections import ClientConnection, ConnectionRegistry
 
 router = APIRouter(prefix="/conversations", tags=["messages"])
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
+    """This worker's WebSocket connections; other workers are reached through the backplane."""
 
-    async def connect(self, user_id: str, websocket: WebSocket):
+    def __init__(self, bus: Backplane = None, registry: ConnectionRegistry = None):
+        self.registry = registry or ConnectionRegistry()
+        self.backplane = bus or backplane
+        # The loop only keeps weak references to tasks; hold broadcasts until they finish.
+        self._broadcasts: Set[asyncio.Task] = set()
+
+    async def connect(self, user_id: str, websocket: WebSocket) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        return self.register(user_id, websocket)
+
+    def register(self, user_id: str, websocket: WebSocket) -> ClientConnection:
+        """Registers an accepted socket; only call this once it is authenticated."""
+        return self.registry.add(user_id, websocket)
+
+    def disconnect(self, connection: ClientConnection):
+        self.registry.remove(connection)
 
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+    async def send_local(self, message: dict, participant_ids: List[str]) -> int:
+        """Queues the message on every socket of the participants connected to this worker."""
+        return self.registry.send(message, participant_ids)
 
     async def broadcast_to_conversation(self, message: dict, participant_ids: List[str]):
-        dead_connections = []
-        for pid in participant_ids:
-            if pid in self.active_connections:
-                try:
-                    await self.active_connections[pid].send_json(message)
-                except Exception:
-                    dead_connections.append(pid)
-        for pid in dead_connections:
-            self.disconnect(pid)
+        await self.send_local(message, participant_ids)
+        # Every participant, since a user may have other devices on other workers.
+        if participant_ids:
+            await self.backplane.publish(_fit({"participants": participant_ids, "payload": message}, self.backplane.max_payload))
+
+    def broadcast_in_background(self, message: dict, participant_ids: List[str]) -> asyncio.Task:
+        """Runs broadcast_to_conversation without making the caller wait for it."""
+        task = asyncio.create_task(self.broadcast_to_conversation(message, participant_ids))
+        self._broadcasts.add(task)
+        task.add_done_callback(self._broadcasts.discard)
+        return task
+
+    async def deliver(self, envelope: dict):
+        """Backplane handler: an envelope published by another worker."""
+        await self.send_local(envelope["payload"], envelope["participants"])
+
+# Room for the origin id the backplane adds to each envelope.
+_ENVELOPE_SLACK = 128
+
+def _fit(envelope: dict, max_bytes: Optional[int]) -> dict:
+    """Trims message content so the envelope fits the backplane; clients refetch truncated messages."""
+    if max_bytes is None:
+        return envelope
+    over = len(json.dumps(envelope, default=str).encode()) + _ENVELOPE_SLACK - max_bytes
+    body = envelope["payload"].get("message") or {}
+    if over <= 0 or not body.get("content"):
+        return envelope
+    content = body["content"].encode()
+    # Escaped characters take more room in JSON than in UTF-8; trim twice the overshoot.
+    content = content[: max(0, len(content) - 2 * over)].decode(errors="ignore")
+    payload = {**envelope["payload"], "message": {**body, "content": content, "truncated": True}}
+    return {**envelope, "payload": payload}
 
 manager = ConnectionManager()
 
 @router.get("/", response_model=List[schemas.Conversation])
 async def list_conversations(
-    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+    db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)
 ):
     return await asyncio.to_thread(crud.get_conversations, db, user_id=current_user.id)
 
@@ -58,7 +99,7 @@ def _sync_fetch_conversation(db: Session, conversation_id: int) -> dict:
 async def get_conversation(
     conversation_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, conversation_id)
     if not authorized:
@@ -72,20 +113,30 @@ async def get_conversation(
 @router.get("/{conversation_id}/messages/", response_model=List[schemas.Message])
 async def get_conversation_messages(
     conversation_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, conversation_id)
-    if not authorized:
-        raise HTTPException(status_code=403, detail="Access denied.")
-    
-    return await asyncio.to_thread(crud.get_messages, db, conversation_id=conversation_id, skip=skip, limit=limit)
+    if adb is not None:
+        if not await async_crud.is_user_in_conversation(adb, current_user.id, conversation_id):
+            raise HTTPException(status_code=403, detail="Access denied.")
+        messages, next_cursor = await async_crud.get_messages(adb, conversation_id=conversation_id, skip=skip, limit=limit, cursor=cursor)
+    else:
+        authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, conversation_id)
+        if not authorized:
+            raise HTTPException(status_code=403, detail="Access denied.")
+        messages, next_cursor = await asyncio.to_thread(crud.get_messages, db, conversation_id=conversation_id, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 def _sync_get_full_message(db: Session, message_id: int):
     m = db.query(models.Message).options(
-            joinedload(models.Message.sender),
+            joinedload(models.Message.sender).joinedload(models.User.profile),
             joinedload(models.Message.conversation).selectinload(models.Conversation.participants)
         ).filter(models.Message.id == message_id).first()
     if not m: return None
@@ -108,33 +159,31 @@ def _sync_get_full_message(db: Session, message_id: int):
 async def send_message(
     message: schemas.MessageCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     if not message.conversation_id and not message.recipient_id:
         raise HTTPException(status_code=400, detail="Target missing.")
 
-    if message.conversation_id:
-        authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, message.conversation_id)
-        if not authorized:
+    if adb is not None:
+        if message.conversation_id and not await async_crud.is_user_in_conversation(adb, current_user.id, message.conversation_id):
             raise HTTPException(status_code=403, detail="Forbidden.")
-
-    db_message = await asyncio.to_thread(crud.create_message, db, message, current_user.id)
-    
-    full_message_data = await asyncio.to_thread(_sync_get_full_message, db, db_message["id"])
+        db_message = await async_crud.create_message(adb, message, current_user.id)
+        full_message_data = await adb.run_sync(_sync_get_full_message, db_message["id"])
+    else:
+        if message.conversation_id:
+            authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, message.conversation_id)
+            if not authorized:
+                raise HTTPException(status_code=403, detail="Forbidden.")
+
+        db_message = await asyncio.to_thread(crud.create_message, db, message, current_user.id)
+        
+        full_message_data = await asyncio.to_thread(_sync_get_full_message, db, db_message["id"])
 
     if full_message_data:
-        payload = {
-            "type": "new_message",
-            "message": {
-                "id": full_message_data["id"],
-                "conversation_id": full_message_data["conversation_id"],
-                "content": full_message_data["content"],
-                "sender_id": full_message_data["sender_id"],
-                "created_at": full_message_data["created_at"].isoformat(),
-            }
-        }
+        payload = {"type": "new_message", "message": message_payload(full_message_data)}
         p_ids = [p["id"] for p in full_message_data["conversation"]["participants"]]
-        asyncio.create_task(manager.broadcast_to_conversation(payload, p_ids))
+        manager.broadcast_in_background(payload, p_ids)
 
     return full_message_data
 
@@ -143,39 +192,48 @@ async def create_message(
     conversation_id: int,
     message: schemas.MessageCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, conversation_id)
-    if not authorized:
-        raise HTTPException(status_code=403, detail="Forbidden.")
-    
-    db_message = await asyncio.to_thread(crud.create_message, db, message, current_user.id, conversation_id)
-    
-    full_message_data = await asyncio.to_thread(_sync_get_full_message, db, db_message["id"])
+    if adb is not None:
+        if not await async_crud.is_user_in_conversation(adb, current_user.id, conversation_id):
+            raise HTTPException(status_code=403, detail="Forbidden.")
+        db_message = await async_crud.create_message(adb, message, current_user.id, conversation_id)
+        full_message_data = await adb.run_sync(_sync_get_full_message, db_message["id"])
+    else:
+        authorized = await asyncio.to_thread(crud.is_user_in_conversation, db, current_user.id, conversation_id)
+        if not authorized:
+            raise HTTPException(status_code=403, detail="Forbidden.")
+        
+        db_message = await asyncio.to_thread(crud.create_message, db, message, current_user.id, conversation_id)
+        
+        full_message_data = await asyncio.to_thread(_sync_get_full_message, db, db_message["id"])
     
     if full_message_data:
-        payload = {
-            "type": "new_message",
-            "message": {
-                "id": full_message_data["id"],
-                "conversation_id": full_message_data["conversation_id"],
-                "content": full_message_data["content"],
-                "sender_id": full_message_data["sender_id"],
-                "created_at": full_message_data["created_at"].isoformat(),
-            }
-        }
+        payload = {"type": "new_message", "message": message_payload(full_message_data)}
         p_ids = [p["id"] for p in full_message_data["conversation"]["participants"]]
-        asyncio.create_task(manager.broadcast_to_conversation(payload, p_ids))
+        manager.broadcast_in_background(payload, p_ids)
 
     return full_message_data
 
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(user_id, websocket)
+    """Pushes chat events to the user's devices and accepts the frames described in ws_chat.py."""
+    await websocket.accept()
+    auth = await handshake(websocket, user_id)
+    if auth is None:
+        return
+    principal, expires_at = auth
+    connection = manager.register(principal.id, websocket)
+    connection.expires_at = expires_at
+    chat = ChatSession(manager, connection, principal)
+    manager.registry.send_to(connection, {"type": "auth_ok", "user_id": principal.id})
     try:
-        while True:
-            await websocket.receive_text()
+        while not connection.closed:
+            frame = await websocket.receive_text()
+            manager.registry.touch(connection)
+            await chat.handle(frame)
     except (WebSocketDisconnect, Exception):
         pass
     finally:
-        manager.disconnect(user_id)
+        manager.disconnect(connection)
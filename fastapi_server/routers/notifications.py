@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import asyncio
-from .. import crud, schemas, models
-from ..dependencies import get_db, get_current_user
+from .. import async_crud, crud, schemas, models
+from ..cache import Principal
+from ..dependencies import get_db, get_async_db, get_current_user
 from ..analytics import track_event
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
@@ -11,22 +13,35 @@ router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @router.get("/", response_model=List[schemas.Notification])
 async def get_notifications(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get all notifications for the current user."""
-    return await asyncio.to_thread(crud.get_notifications, db, user_id=current_user.id, skip=skip, limit=limit)
+    if adb is not None:
+        notifications, next_cursor = await async_crud.get_notifications(adb, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor)
+    else:
+        notifications, next_cursor = await asyncio.to_thread(crud.get_notifications, db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return notifications
 
 
 @router.get("/unread-count", response_model=dict)
 async def get_unread_count(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get the count of unread notifications."""
-    count = await asyncio.to_thread(crud.get_unread_notification_count, db, user_id=current_user.id)
+    if adb is not None:
+        count = await async_crud.get_unread_notification_count(adb, user_id=current_user.id)
+    else:
+        count = await asyncio.to_thread(crud.get_unread_notification_count, db, user_id=current_user.id)
     return {"count": count}
 
 
@@ -34,22 +49,28 @@ async def get_unread_count(
 async def mark_notification_read(
     notification_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Mark a specific notification as read."""
-    notif = await asyncio.to_thread(crud.mark_notification_read, db, notification_id=notification_id, user_id=current_user.id)
+    if adb is not None:
+        notif = await async_crud.mark_notification_read(adb, notification_id=notification_id, user_id=current_user.id)
+    else:
+        notif = await asyncio.to_thread(crud.mark_notification_read, db, notification_id=notification_id, user_id=current_user.id)
     if not notif:
         raise HTTPException(status_code=404, detail="Notification not found")
-    db.commit()
     return {"status": "success", "message": "Notification marked as read"}
 
 
 @router.post("/read-all", response_model=schemas.StatusMessage)
 async def mark_all_read(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Mark all notifications as read."""
-    await asyncio.to_thread(crud.mark_notifications_read, db, user_id=current_user.id)
-    db.commit()
+    if adb is not None:
+        await async_crud.mark_notifications_read(adb, user_id=current_user.id)
+    else:
+        await asyncio.to_thread(crud.mark_notifications_read, db, user_id=current_user.id)
     return {"status": "success", "message": "All notifications marked as read"}
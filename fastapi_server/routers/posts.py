@@ -1,22 +1,33 @@
 # posts.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import asyncio
-from .. import crud, schemas, models, analytics
-from ..dependencies import get_db, get_current_user
+from .. import async_crud, crud, feed_inbox, feed_scoring, feed_session, schemas, models, analytics, like_buffer, view_buffer
+from ..cache import Principal
+from ..dependencies import get_db, get_async_db, get_async_read_db, get_read_db, get_current_user
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.get("/", response_model=List[schemas.PostResponse])
-async def read_posts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return await asyncio.to_thread(crud.get_posts, db, skip, limit)
+async def read_posts(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    posts, next_cursor = await asyncio.to_thread(crud.get_posts, db, skip, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return posts
 
 @router.post("/", response_model=dict)
 async def create_post(
     post: schemas.PostCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     # crud.create_post_transactional handles commit internally
     db_post_dict = await asyncio.to_thread(crud.create_post_transactional, db, post, current_user.id)
@@ -27,7 +38,7 @@ async def create_post(
 async def delete_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     is_staff = current_user.role in ["admin", "moderator"]
     if is_staff:
@@ -45,7 +56,7 @@ async def update_post(
     post_id: int,
     post_update: schemas.PostUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     success = await asyncio.to_thread(crud.update_post_secure_transactional, db, post_id, current_user.id, post_update)
     if not success:
@@ -56,16 +67,18 @@ async def update_post(
 async def like_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    added = await asyncio.to_thread(crud.add_post_like_ultra_performance, db, post_id, current_user.id)
-    likes_count = await asyncio.to_thread(crud.get_post_likes_count, db, post_id)
-    if not added and likes_count == 0:
-        post_exists = await asyncio.to_thread(
-            lambda: db.query(models.Post.id).filter(models.Post.id == post_id).first()
-        )
-        if not post_exists:
-            raise HTTPException(status_code=404, detail="Post not found")
+    if like_buffer.COMBINING_ENABLED:
+        result = await asyncio.to_thread(like_buffer.like_buffer.like, db, post_id, current_user.id)
+    elif adb is not None:
+        result = await async_crud.like_post_returning_count(adb, post_id, current_user.id)
+    else:
+        result = await asyncio.to_thread(crud.like_post_returning_count, db, post_id, current_user.id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    added, likes_count = result
     if added:
         analytics.track_event(current_user.id, "post_liked", {"post_id": post_id})
     return {"status": "success", "likes_count": likes_count}
@@ -74,40 +87,96 @@ async def like_post(
 async def unlike_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    adb: Optional[AsyncSession] = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    removed = await asyncio.to_thread(crud.remove_post_like_transactional, db, post_id, current_user.id)
+    if like_buffer.COMBINING_ENABLED:
+        removed = await asyncio.to_thread(like_buffer.like_buffer.unlike, db, post_id, current_user.id)
+    elif adb is not None:
+        removed = await async_crud.remove_post_like_transactional(adb, post_id, current_user.id)
+    else:
+        removed = await asyncio.to_thread(crud.remove_post_like_transactional, db, post_id, current_user.id)
     return {"status": "success", "message": "Post unliked" if removed else "Like not found"}
 
-@router.get("/{post_id}/comments", response_model=List[dict])
-async def get_post_comments(post_id: int, db: Session = Depends(get_db)):
-    return await asyncio.to_thread(crud.get_comments, db, post_id)
+@router.get("/{post_id}/comments", response_model=List[schemas.Comment])
+async def get_post_comments(
+    post_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    comments, next_cursor = await asyncio.to_thread(
+        crud.get_comments, db, post_id, current_user.id, skip, limit, cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return comments
 
 @router.post("/{post_id}/comments", response_model=dict)
 async def create_comment(
     post_id: int,
     comment: schemas.CommentCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     return await asyncio.to_thread(crud.create_comment_transactional, db, comment, current_user.id, post_id)
 
 @router.get("/feed", response_model=List[schemas.PostResponse])
 async def read_feed(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     seed: float = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    adb: Optional[AsyncSession] = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    return await asyncio.to_thread(crud.get_feed_posts_optimized, db, current_user.id, skip, limit, seed)
+    if feed_inbox.FEED_MODE == "inbox":
+        if adb is not None:
+            return await async_crud.get_inbox_feed(adb, current_user.id, skip, limit, seed)
+        return await asyncio.to_thread(feed_inbox.get_inbox_feed, db, current_user.id, skip, limit, seed)
+    # Ranked once per feed session; later pages slice the snapshot (feed_session.py)
+    if adb is not None:
+        posts, next_cursor = await async_crud.get_feed_page(adb, db, current_user.id, cursor, skip, limit, seed)
+    else:
+        posts, next_cursor = await asyncio.to_thread(
+            feed_session.get_feed_page, db, current_user.id, cursor, skip, limit, seed
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if feed_scoring.EXPERIMENT_WEIGHTS is not None and cursor is None and skip == 0:
+        variant, _ = feed_scoring.ranking_variant(current_user.id)
+        analytics.track_event(current_user.id, "feed_ranked", {"ranking_variant": variant})
+    return posts
 
 @router.post("/{post_id}/view", response_model=schemas.StatusMessage)
 async def mark_post_viewed(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    await asyncio.to_thread(crud.mark_post_as_seen_transactional, db, current_user.id, post_id)
+    if view_buffer.BUFFER_ENABLED:
+        view_buffer.view_buffer.add(current_user.id, [post_id])
+    else:
+        await asyncio.to_thread(crud.mark_post_as_seen_transactional, db, current_user.id, post_id)
     analytics.track_event(current_user.id, "post_viewed", {"post_id": post_id})
     return {"status": "success", "message": "Post marked as seen"}
+
+@router.post("/views", response_model=schemas.StatusMessage)
+async def mark_posts_viewed(
+    batch: schemas.PostViewBatch,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Marks every post scrolled past in one call; written behind in batches (view_buffer.py)."""
+    post_ids = list(dict.fromkeys(batch.post_ids))
+    if view_buffer.BUFFER_ENABLED:
+        view_buffer.view_buffer.add(current_user.id, post_ids)
+    else:
+        await asyncio.to_thread(crud.mark_posts_as_seen_transactional, db, current_user.id, post_ids)
+    analytics.track_event(current_user.id, "posts_viewed", {"post_ids": post_ids, "count": len(post_ids)})
+    return {"status": "success", "message": f"{len(post_ids)} posts marked as seen"}
@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from typing import List
 import asyncio
 from .. import crud, schemas, models
-from ..dependencies import get_db, get_current_user
+from ..cache import Principal
+from ..dependencies import get_read_db, get_current_user
 
 router = APIRouter(prefix="/search", tags=["search"])
 
@@ -35,8 +36,8 @@ def _sync_map_search_results(users: List[models.User]) -> List[dict]:
 async def search_users(
     q: str = "",
     limit: int = 20,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Search for users by username, bio, or university."""
     users = await asyncio.to_thread(crud.search_users, db, query=q, limit=limit)
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 import asyncio
 from .. import crud, schemas, models, analytics
+from ..cache import Principal
 from ..dependencies import get_db, get_current_user
 
 router = APIRouter(prefix="/stories", tags=["stories"])
@@ -10,7 +11,7 @@ router = APIRouter(prefix="/stories", tags=["stories"])
 @router.get("/feed", response_model=List[schemas.Story])
 async def read_stories_feed(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     return await asyncio.to_thread(crud.get_feed_stories, db, user_id=current_user.id)
 
@@ -18,7 +19,7 @@ async def read_stories_feed(
 async def create_story(
     story: schemas.StoryCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     db_story = await asyncio.to_thread(crud.create_story, db=db, story=story, user_id=current_user.id)
     analytics.track_event(current_user.id, "story_created", {"story_id": db_story["id"]})
@@ -28,7 +29,7 @@ async def create_story(
 async def view_story(
     story_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     await asyncio.to_thread(crud.view_story, db, story_id=story_id, user_id=current_user.id)
     db.commit()
@@ -39,7 +40,7 @@ async def view_story(
 async def like_story(
     story_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     is_liked = await asyncio.to_thread(crud.like_story, db, story_id=story_id, user_id=current_user.id)
     db.commit()
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import asyncio
 from .. import crud, schemas, models, dependencies, analytics
-from ..dependencies import get_db, get_current_user, supabase, logger
+from ..cache import Principal
+from ..dependencies import get_db, get_read_db, get_current_user, supabase, logger
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -51,10 +52,6 @@ async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/me/", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
-    return current_user
-
 def _sync_map_users(users: List[models.User]) -> List[dict]:
     return [{
         "id": u.id,
@@ -76,11 +73,26 @@ def _sync_map_users(users: List[models.User]) -> List[dict]:
         } if u.profile else None
     } for u in users]
 
+def _sync_get_me(db: Session, user_id: str):
+    # current_user is a cached principal snapshot, so the profile is loaded here.
+    user = crud.get_user(db, user_id=user_id)
+    return _sync_map_users([user])[0] if user else None
+
+@router.get("/me/", response_model=schemas.User)
+async def read_users_me(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    me = await asyncio.to_thread(_sync_get_me, db, current_user.id)
+    if not me:
+        raise HTTPException(status_code=404, detail="User not found")
+    return me
+
 @router.get("/suggestions", response_model=List[schemas.User])
 async def get_user_suggestions(
     limit: int = 10,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     users = await asyncio.to_thread(crud.get_suggested_users, db, user_id=current_user.id, limit=limit)
     return await asyncio.to_thread(_sync_map_users, users)
@@ -90,7 +102,7 @@ async def get_user_suggestions(
 async def update_profile(
     profile_update: schemas.ProfileUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     db_profile = await asyncio.to_thread(crud.update_profile_secure, db, user_id=current_user.id, profile_update=profile_update)
     if db_profile and "profile_type" not in db_profile:
@@ -102,7 +114,7 @@ async def register_device(
     device: schemas.UserDeviceCreate,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if not device.ip_address:
         device.ip_address = request.client.host
@@ -112,7 +124,7 @@ async def register_device(
 async def update_location(
     location: schemas.LocationHistoryCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     return await asyncio.to_thread(crud.update_location, db, user_id=current_user.id, loc=location)
 
@@ -120,7 +132,7 @@ async def update_location(
 async def follow_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
@@ -133,7 +145,7 @@ async def follow_user(
 async def unfollow_user(
     user_id: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     await asyncio.to_thread(crud.unfollow_user, db, follower_id=current_user.id, following_id=user_id)
     db.commit()
@@ -145,18 +157,22 @@ async def get_following(user_id: str, db: Session = Depends(get_db)):
     return await asyncio.to_thread(_sync_map_users, users)
 
 @router.get("/{user_id}/followers", response_model=List[schemas.User])
-async def get_followers(user_id: str, db: Session = Depends(get_db)):
+async def get_followers(user_id: str, db: Session = Depends(get_read_db)):
     users = await asyncio.to_thread(crud.get_followers, db, user_id=user_id)
     return await asyncio.to_thread(_sync_map_users, users)
 
 @router.get("/{user_id}/posts", response_model=List[schemas.Post])
 async def get_user_posts(
     user_id: str,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    posts = await asyncio.to_thread(crud.get_user_posts, db, user_id=user_id, skip=skip, limit=limit)
+    posts, next_cursor = await asyncio.to_thread(crud.get_user_posts, db, user_id=user_id, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     # Mapping to avoid DetachedInstanceError
     payload = []
     for p in posts:
@@ -168,6 +184,8 @@ async def get_user_posts(
             "video": p.video,
             "caption": p.caption,
             "created_at": p.created_at,
+            "likes_count": p.likes_count or 0,
+            "comments_count": p.comments_count or 0,
             "user": {
                 "id": p.user.id,
                 "username": p.user.username,
@@ -1,6 +1,6 @@
 # schemas.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -89,8 +89,8 @@ class Comment(CommentBase):
     post_id: int
     created_at: datetime
     user: User
-    likes: List[User] = []
     likes_count: int = 0
+    liked_by_me: bool = False
 
     class Config:
         from_attributes = True
@@ -131,6 +131,10 @@ class PostUpdate(PostBase):
     pass
 
 
+class PostViewBatch(BaseModel):
+    post_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
 class Post(PostBase):
     id: int
     user_id: str
@@ -142,6 +146,7 @@ class Post(PostBase):
     comments: List[Comment] = []
     likes: List[User] = []
     likes_count: int = 0
+    comments_count: int = 0
 
     class Config:
         from_attributes = True
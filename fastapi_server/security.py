@@ -0,0 +1,142 @@
+# security.py
+"""
+In-process verification of Supabase access tokens.
+
+Supabase signs access tokens either with the project's shared JWT secret
+(HS256) or with an asymmetric signing key published at
+``{SUPABASE_URL}/auth/v1/.well-known/jwks.json`` (RS256 / ES256). Both can be
+checked locally, which keeps the Supabase Auth API off the request path.
+
+``LocalTokenVerifier.verify`` returns the token claims when it could verify
+the token, ``None`` when it has no key to verify it with (the caller should
+fall back to ``supabase.auth.get_user``), and raises ``JWTError`` when the
+token is definitely invalid (bad signature, expired, wrong audience).
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import jwk, jwt, JWTError
+from jose.exceptions import JWKError, JWTClaimsError
+
+logger = logging.getLogger(__name__)
+
+AUTH_VERIFY_MODE = os.getenv("AUTH_VERIFY_MODE", "local").strip().lower()  # 'local' or 'remote'
+
+_SYMMETRIC_ALGORITHMS = ["HS256"]
+# Algorithm -> the JWK key type ("kty") it signs with.
+_ASYMMETRIC_ALGORITHMS = {"RS256": "RSA", "ES256": "EC"}
+
+
+class LocalTokenVerifier:
+    def __init__(
+        self,
+        supabase_url: Optional[str],
+        jwt_secret: Optional[str] = None,
+        audience: str = "authenticated",
+        issuer: Optional[str] = None,
+        jwks_ttl: int = 600,
+        leeway: int = 10,
+    ):
+        self.jwks_url = f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json" if supabase_url else None
+        self.jwt_secret = jwt_secret or None
+        self.audience = audience
+        self.issuer = issuer or None
+        self.jwks_ttl = jwks_ttl
+        self.leeway = leeway
+
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._keys_loaded_at = 0.0
+        self._last_refresh_attempt = 0.0
+        self._lock = threading.Lock()
+
+    # --- Signing keys ---
+
+    def needs_refresh(self) -> bool:
+        """True when the cached JWKS is older than the TTL (and a refresh may be attempted)."""
+        if not self.jwks_url:
+            return False
+        now = time.monotonic()
+        return (now - self._keys_loaded_at) > self.jwks_ttl and (now - self._last_refresh_attempt) > 30
+
+    def refresh_jwks(self, force: bool = False) -> None:
+        """Fetches the project's JWKS. Blocking — call it from a worker thread."""
+        if not self.jwks_url:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Rate-limit refreshes so a stream of tokens with an unknown kid can't hammer Supabase.
+            if not force and (now - self._last_refresh_attempt) < 30:
+                return
+            self._last_refresh_attempt = now
+            try:
+                response = httpx.get(self.jwks_url, timeout=5.0)
+                response.raise_for_status()
+                keys = {k["kid"]: k for k in response.json().get("keys", []) if k.get("kid")}
+            except Exception as e:
+                logger.warning("[auth] JWKS refresh failed: %r", e)
+                return
+            self._keys = keys
+            self._keys_loaded_at = now
+            logger.info("[auth] Loaded %d signing key(s) from JWKS.", len(keys))
+
+    def _resolve_key(self, header: Dict[str, Any]):
+        alg = header.get("alg")
+        if alg in _SYMMETRIC_ALGORITHMS:
+            return self.jwt_secret, _SYMMETRIC_ALGORITHMS
+        if alg in _ASYMMETRIC_ALGORITHMS:
+            key_data = self._keys.get(header.get("kid"))
+            if key_data is None:
+                return None, None
+            # The header is attacker-controlled; the key decides which algorithm it is used with.
+            if key_data.get("kty") != _ASYMMETRIC_ALGORITHMS[alg] or key_data.get("alg", alg) != alg:
+                raise JWTError("Token algorithm does not match its signing key.")
+            try:
+                return jwk.construct(key_data, algorithm=alg), [alg]
+            except JWKError as e:
+                raise JWTError(f"Unusable signing key: {e}")
+        return None, None
+
+    def missing_signing_key(self, token: str) -> bool:
+        """True when the token names a JWKS key id that isn't cached (e.g. after a key rotation)."""
+        header = jwt.get_unverified_header(token)
+        return header.get("alg") in _ASYMMETRIC_ALGORITHMS and header.get("kid") not in self._keys
+
+    # --- Verification ---
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Validates signature, expiry and audience without any network I/O.
+        Returns the claims, or None when no signing key is available locally.
+        """
+        header = jwt.get_unverified_header(token)
+        key, algorithms = self._resolve_key(header)
+        if key is None:
+            return None
+
+        options = {"leeway": self.leeway, "verify_iss": self.issuer is not None}
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=self.audience,
+            issuer=self.issuer,
+            options=options,
+        )
+        if not claims.get("sub"):
+            raise JWTClaimsError("Token has no subject.")
+        return claims
+
+
+token_verifier = LocalTokenVerifier(
+    supabase_url=os.getenv("SUPABASE_URL"),
+    jwt_secret=os.getenv("SUPABASE_JWT_SECRET"),
+    audience=os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated"),
+    issuer=os.getenv("SUPABASE_JWT_ISSUER"),
+    jwks_ttl=int(os.getenv("SUPABASE_JWKS_TTL", "600")),
+    leeway=int(os.getenv("SUPABASE_JWT_LEEWAY", "10")),
+)
+
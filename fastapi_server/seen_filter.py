@@ -0,0 +1,208 @@
+# seen_filter.py
+"""
+Per-user seen-post sets as Bloom filters.
+
+The feed used to pull every post id the user saw in the last 24h and push them
+into each candidate branch as `NOT IN (...)`, a list that grows with heavy
+scrollers. Each worker now keeps a `SeenFilter` per active user instead, and
+seen posts are dropped in-process after candidate retrieval.
+
+Sizing comes from SEEN_FILTER_CAPACITY (expected posts seen per day) and
+SEEN_FILTER_FP_RATE (target false-positive rate). They give the usual optimal
+bit count m = -n ln p / (ln 2)^2 and k = (m / n) ln 2 hash functions, capped
+at SEEN_FILTER_MAX_BYTES per user. A false positive only hides one unseen post
+from one feed request.
+
+Keeping the filters current:
+- The first feed request loads the last 24h of seen_posts into a new filter.
+  Later requests read only rows with seen_at after the previous sync, minus
+  SEEN_FILTER_SYNC_OVERLAP_SECONDS, as part of the feed's relations query.
+  This picks up views recorded by other workers without an extra round trip.
+- mark_post_as_seen_transactional adds to the filter in this worker straight
+  away.
+- Bloom filters cannot delete. A filter is rebuilt after
+  SEEN_FILTER_REBUILD_SECONDS so views older than 24h fall out. It is also
+  rebuilt, at twice the size, once its estimated false-positive rate passes
+  twice the target. That happens at most once per
+  SEEN_FILTER_MIN_REBUILD_SECONDS, and never for a filter already at
+  SEEN_FILTER_MAX_BYTES, since a rebuild would come out the same size.
+
+Dropping seen posts only after retrieval lets them use up the per-source
+quotas. So each filter also keeps the last SEEN_FILTER_SQL_EXCLUDE ids added to
+it, and the feed still excludes those in SQL. A bounded NOT IN covers the posts
+a scroller is most likely to be shown again.
+"""
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+from .cache import TTLCache
+
+CAPACITY = int(os.getenv("SEEN_FILTER_CAPACITY", "2000"))
+FP_RATE = float(os.getenv("SEEN_FILTER_FP_RATE", "0.01"))
+MAX_BYTES = int(os.getenv("SEEN_FILTER_MAX_BYTES", "16384"))
+REBUILD_SECONDS = float(os.getenv("SEEN_FILTER_REBUILD_SECONDS", "3600"))
+MIN_REBUILD_SECONDS = float(os.getenv("SEEN_FILTER_MIN_REBUILD_SECONDS", "300"))
+SQL_EXCLUDE = int(os.getenv("SEEN_FILTER_SQL_EXCLUDE", "500"))
+SYNC_OVERLAP_SECONDS = float(os.getenv("SEEN_FILTER_SYNC_OVERLAP_SECONDS", "60"))
+SEEN_WINDOW = timedelta(hours=24)
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: int) -> int:
+    """splitmix64 finalizer: spreads sequential post ids over all 64 bits."""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def bloom_parameters(capacity: int, fp_rate: float, max_bytes: int = MAX_BYTES):
+    """(bits, hashes) for `capacity` items at `fp_rate`, with bits capped at max_bytes * 8."""
+    capacity = max(capacity, 1)
+    bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = max(64, min(bits, max_bytes * 8))
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class BloomFilter:
+    __slots__ = ("bits", "size", "hashes", "count")
+
+    def __init__(self, size: int, hashes: int):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: int):
+        h = _mix64(item)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: int) -> None:
+        bits = self.bits
+        new = False
+        for pos in self._positions(item):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, item: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def estimated_fp_rate(self) -> float:
+        return (1.0 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class SeenFilter:
+    """A user's seen posts plus the bookkeeping for incremental syncs."""
+
+    __slots__ = ("bloom", "capacity", "built_at", "synced_at", "recent")
+
+    def __init__(self, capacity: int = CAPACITY, fp_rate: float = FP_RATE):
+        self.bloom = BloomFilter(*bloom_parameters(capacity, fp_rate))
+        self.capacity = capacity
+        self.built_at = time.monotonic()
+        self.synced_at: Optional[datetime] = None
+        self.recent = deque(maxlen=SQL_EXCLUDE)
+
+    def add(self, post_id: int) -> None:
+        self.bloom.add(post_id)
+        self.recent.append(post_id)
+
+    def add_many(self, post_ids: Iterable[int]) -> None:
+        for post_id in post_ids:
+            self.add(post_id)
+
+    def __contains__(self, post_id: int) -> bool:
+        return post_id in self.bloom
+
+    def recent_ids(self) -> FrozenSet[int]:
+        """The last SEEN_FILTER_SQL_EXCLUDE post ids added, for the feed's SQL exclusion."""
+        return frozenset(self.recent)
+
+    def needs_rebuild(self) -> bool:
+        age = time.monotonic() - self.built_at
+        if age >= REBUILD_SECONDS:
+            return True
+        # A filter at the byte cap would be rebuilt at the same size, so only age rebuilds it.
+        return (
+            age >= MIN_REBUILD_SECONDS
+            and self.bloom.nbytes() < MAX_BYTES
+            and self.bloom.estimated_fp_rate() > 2 * FP_RATE
+        )
+
+
+class SeenFilterCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._filters = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.rebuilds = 0
+
+    def sync_since(self, user_id: str, now: datetime) -> Tuple[datetime, bool]:
+        """
+        (since, full): the lower bound on seen_at for the rows this request has to
+        read for `user_id`, and whether that is the whole window (a new filter).
+        """
+        seen = self._filters.get(user_id)
+        if seen is None or seen.synced_at is None or seen.needs_rebuild():
+            return now - SEEN_WINDOW, True
+        return seen.synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS), False
+
+    def sync(self, user_id: str, post_ids: Iterable[int], now: datetime, full: bool) -> SeenFilter:
+        """Folds the rows read for `sync_since` into the user's filter."""
+        seen = self._filters.get(user_id)
+        if seen is None or full:
+            post_ids = list(post_ids)
+            capacity = CAPACITY
+            if seen is not None:
+                self.rebuilds += 1
+                if seen.bloom.estimated_fp_rate() > 2 * FP_RATE:
+                    capacity = max(seen.capacity * 2, len(post_ids) * 2)
+            seen = SeenFilter(max(capacity, len(post_ids)))
+        seen.add_many(post_ids)
+        seen.synced_at = now
+        self._filters.set(user_id, seen)
+        return seen
+
+    def add(self, user_id: str, post_id: int) -> None:
+        seen = self._filters.get(user_id)
+        if seen is not None:
+            seen.add(post_id)
+
+    def clear(self) -> None:
+        self._filters.clear()
+
+    def stats(self) -> dict:
+        filters = self._filters.values()
+        fp_rates = [f.bloom.estimated_fp_rate() for f in filters]
+        default_bits, default_hashes = bloom_parameters(CAPACITY, FP_RATE)
+        return {
+            **self._filters.stats(),
+            "capacity_per_user": CAPACITY,
+            "target_fp_rate": FP_RATE,
+            "bytes_per_user": (default_bits + 7) // 8,
+            "hashes": default_hashes,
+            "total_bytes": sum(f.bloom.nbytes() for f in filters),
+            "mean_estimated_fp_rate": round(sum(fp_rates) / len(fp_rates), 6) if fp_rates else 0.0,
+            "max_estimated_fp_rate": round(max(fp_rates), 6) if fp_rates else 0.0,
+            "rebuilds": self.rebuilds,
+        }
+
+
+seen_filters = SeenFilterCache(
+    maxsize=int(os.getenv("SEEN_FILTER_CACHE_SIZE", "20000")),
+    ttl=float(os.getenv("SEEN_FILTER_IDLE_SECONDS", "1800")),
+)
@@ -0,0 +1,212 @@
+# slow_queries.py
+"""
+Slow-query recorder with automatic EXPLAIN capture.
+
+Every statement slower than SLOW_QUERY_MS is kept in a per-worker ring buffer
+(SLOW_QUERY_LOG_SIZE entries) with its normalized shape, redacted parameters,
+duration and the request it ran for. On PostgreSQL (psycopg2 engines), read-only
+statements slower than SLOW_QUERY_EXPLAIN_MS are re-run on a separate connection
+under `EXPLAIN (ANALYZE, BUFFERS)` by a background thread and the plan is
+attached to the entry. Each shape is explained at most once per
+SLOW_QUERY_EXPLAIN_COOLDOWN seconds, since ANALYZE executes the query again.
+
+GET /admin/slow-queries lists the buffer.
+"""
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .query_metrics import current_label, statement_shape
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN_MS = float(os.getenv("SLOW_QUERY_EXPLAIN_MS", "500"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_EXPLAIN_COOLDOWN = float(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN", "300"))
+SLOW_QUERY_EXPLAIN_ENABLED = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in {"1", "true", "yes"}
+
+# Connections opened to run EXPLAIN carry this execution option so they aren't recorded themselves.
+_SKIP_OPTION = "skip_slow_query_log"
+
+_SENSITIVE_KEY = re.compile(r"pass|token|secret|email|phone|content|caption|bio", re.IGNORECASE)
+_READ_ONLY = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(insert|update|delete|merge)\b|\bfor\s+update\b", re.IGNORECASE)
+
+
+def redact_value(value):
+    """Keeps numbers, booleans, dates and NULLs (ids, limits, flags); hides text and binary values."""
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return [redact_value(v) for v in value]
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters):
+    if isinstance(parameters, dict):
+        return {
+            key: "<redacted>" if _SENSITIVE_KEY.search(str(key)) else redact_value(value)
+            for key, value in parameters.items()
+        }
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(p) if isinstance(p, (dict, list, tuple)) else redact_value(p) for p in parameters]
+    return redact_value(parameters)
+
+
+def is_explainable(statement: str) -> bool:
+    """Only plain reads are re-run under EXPLAIN ANALYZE; anything that writes or locks is skipped."""
+    return bool(_READ_ONLY.match(statement)) and not _WRITES.search(statement)
+
+
+class SlowQueryLog:
+    def __init__(self, maxsize: int = SLOW_QUERY_LOG_SIZE):
+        self._entries: deque = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self._last_explained: Dict[str, float] = {}
+        self._next_id = 0
+        self.recorded = 0
+        self.explained = 0
+        self.explain_errors = 0
+
+    def record(self, statement: str, parameters, duration_ms: float, label: str = "") -> dict:
+        with self._lock:
+            self._next_id += 1
+            entry = {
+                "id": self._next_id,
+                "at": datetime.now(timezone.utc).isoformat(),
+                "route": label,
+                "duration_ms": round(duration_ms, 2),
+                "shape": statement_shape(statement),
+                "parameters": redact_parameters(parameters),
+                "plan": None,
+            }
+            self._entries.append(entry)
+            self.recorded += 1
+        return entry
+
+    def should_explain(self, shape: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(shape)
+            if last is not None and now - last < SLOW_QUERY_EXPLAIN_COOLDOWN:
+                return False
+            self._last_explained[shape] = now
+            if len(self._last_explained) > 4 * (self._entries.maxlen or 1):
+                self._last_explained.pop(next(iter(self._last_explained)))
+            return True
+
+    def entries(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            return list(reversed(self._entries))[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._last_explained.clear()
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": SLOW_QUERY_MS,
+            "explain_threshold_ms": SLOW_QUERY_EXPLAIN_MS,
+            "buffered": len(self._entries),
+            "recorded": self.recorded,
+            "explained": self.explained,
+            "explain_errors": self.explain_errors,
+        }
+
+
+slow_query_log = SlowQueryLog()
+
+
+# --- EXPLAIN worker ---
+
+_explain_queue: "queue.Queue" = queue.Queue(maxsize=16)
+_explain_thread = None
+_explain_thread_lock = threading.Lock()
+
+
+def _explain_worker():
+    while True:
+        engine, statement, parameters, entry = _explain_queue.get()
+        try:
+            with engine.connect().execution_options(**{_SKIP_OPTION: True}) as conn:
+                rows = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters).fetchall()
+                conn.rollback()
+            entry["plan"] = "\n".join(row[0] for row in rows)
+            slow_query_log.explained += 1
+        except Exception as e:
+            slow_query_log.explain_errors += 1
+            entry["plan"] = f"EXPLAIN failed: {type(e).__name__}"
+            logger.warning(f"[slow-query] EXPLAIN failed for entry {entry['id']}: {e}")
+        finally:
+            _explain_queue.task_done()
+
+
+def _schedule_explain(engine, statement, parameters, entry) -> None:
+    global _explain_thread
+    with _explain_thread_lock:
+        if _explain_thread is None:
+            _explain_thread = threading.Thread(target=_explain_worker, name="slow-query-explain", daemon=True)
+            _explain_thread.start()
+    try:
+        _explain_queue.put_nowait((engine, statement, parameters, entry))
+    except queue.Full:
+        pass
+
+
+def _can_explain(conn) -> bool:
+    dialect = conn.engine.dialect
+    # asyncpg engines can't be driven from the worker thread; psycopg2 covers the sync path.
+    return dialect.name == "postgresql" and dialect.driver == "psycopg2"
+
+
+# --- Engine hooks ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("slow_query_start")
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000.0
+    if duration_ms < SLOW_QUERY_MS or conn.get_execution_options().get(_SKIP_OPTION):
+        return
+
+    entry = slow_query_log.record(statement, parameters, duration_ms, current_label())
+    logger.warning(f"[slow-query] {duration_ms:.0f} ms {entry['route']} {entry['shape'][:200]}")
+    if (
+        SLOW_QUERY_EXPLAIN_ENABLED
+        and duration_ms >= SLOW_QUERY_EXPLAIN_MS
+        and not executemany
+        and _can_explain(conn)
+        and is_explainable(statement)
+        and slow_query_log.should_explain(entry["shape"])
+    ):
+        _schedule_explain(conn.engine, statement, parameters, entry)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement skips after_cursor_execute; drop its start so it doesn't pile up on the connection.
+    conn = context.connection
+    if conn is not None and context.execution_context is not None and conn.info.get("slow_query_start"):
+        conn.info["slow_query_start"].pop()
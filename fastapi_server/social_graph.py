@@ -0,0 +1,370 @@
+# social_graph.py
+"""
+Per-process, array-backed social graph.
+
+The feed, suggestions, friend/following lists and stories each re-queried
+`follows` and accepted `friend_requests` (with OR filters) on every call.
+`SocialGraph` holds those edges in memory instead:
+
+- User ids are interned to dense ints (`_ids` / `_index`).
+- Each relation (following, followers, friends) is a CSR adjacency: an
+  `offsets` array with one slot per user plus one, and a `targets` array whose
+  slice targets[offsets[i]:offsets[i + 1]] holds user i's neighbours, sorted.
+  Both are `array('I')`, so an edge costs 4 bytes per relation rather than a
+  Python object.
+- The CSR arrays are immutable. Writes made through crud
+  (follow_user_transactional, unfollow_user_transactional,
+  update_friend_request_status) land in a small added/removed overlay. The
+  overlay is folded into fresh arrays once it exceeds SOCIAL_GRAPH_OVERLAY_LIMIT
+  edges.
+
+The graph loads at startup (or on first use) and is rebuilt from the database
+on a background thread every SOCIAL_GRAPH_RELOAD_SECONDS. The rebuild bounds
+staleness for writes made in other gunicorn workers, whose hooks only update
+their own copy. Writes applied while a rebuild is reading the tables are
+replayed on top of it.
+
+`check_consistency` diffs the graph against the tables and `memory_report`
+breaks down its footprint; both are exposed under /admin/social-graph.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import database, models
+
+logger = logging.getLogger(__name__)
+
+GRAPH_ENABLED = os.getenv("SOCIAL_GRAPH_ENABLED", "true").lower() in {"1", "true", "yes"}
+RELOAD_SECONDS = float(os.getenv("SOCIAL_GRAPH_RELOAD_SECONDS", "60"))
+OVERLAY_LIMIT = int(os.getenv("SOCIAL_GRAPH_OVERLAY_LIMIT", "10000"))
+
+RELATIONS = ("following", "followers", "friends")
+
+
+class _CSR:
+    __slots__ = ("offsets", "targets")
+
+    def __init__(self, size: int, edges: Iterable[Tuple[int, int]]):
+        # Encoding each edge as one int makes the dedupe and sort far cheaper than on tuples.
+        keys = sorted({src * size + dst for src, dst in edges})
+        counts = [0] * (size + 1)
+        for key in keys:
+            counts[key // size + 1] += 1
+        for i in range(size):
+            counts[i + 1] += counts[i]
+        self.offsets = array("I", counts)
+        self.targets = array("I", (key % size for key in keys))
+
+    def row(self, i: int):
+        if i + 1 >= len(self.offsets):
+            return ()
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def has_edge(self, i: int, j: int) -> bool:
+        if i + 1 >= len(self.offsets):
+            return False
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        k = bisect_left(self.targets, j, lo, hi)
+        return k < hi and self.targets[k] == j
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.offsets) + sys.getsizeof(self.targets)
+
+
+class SocialGraph:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._first_load_lock = threading.Lock()
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._csr = {rel: _CSR(0, ()) for rel in RELATIONS}
+        self._added = {rel: {} for rel in RELATIONS}
+        self._removed = {rel: {} for rel in RELATIONS}
+        self._overlay_size = 0
+        # Hook calls made while a reload is reading the tables; replayed onto the new arrays.
+        self._journal = None
+        self._reloading = False
+        self.loaded = False
+        self.last_load = 0.0
+        self.load_ms = 0.0
+        self.loads = 0
+        self.compactions = 0
+
+    # --- Loading ---
+
+    def _intern(self, user_id: str, ids: List[str] = None, index: Dict[str, int] = None) -> int:
+        ids = self._ids if ids is None else ids
+        index = self._index if index is None else index
+        i = index.get(user_id)
+        if i is None:
+            i = index[user_id] = len(ids)
+            ids.append(user_id)
+        return i
+
+    def load(self, db: Session) -> None:
+        """Rebuilds the graph from `follows` and accepted `friend_requests`."""
+        with self._reload_lock:
+            started = time.perf_counter()
+            with self._lock:
+                self._journal = []
+            try:
+                follows = db.execute(select(models.Follow.follower_id, models.Follow.following_id)).all()
+                friendships = db.execute(
+                    select(models.FriendRequest.sender_id, models.FriendRequest.receiver_id)
+                    .where(models.FriendRequest.status == "accepted")
+                ).all()
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+
+            ids: List[str] = []
+            index: Dict[str, int] = {}
+            following, friends = [], []
+            for a, b in follows:
+                if a and b:
+                    following.append((self._intern(a, ids, index), self._intern(b, ids, index)))
+            for a, b in friendships:
+                if a and b and a != b:
+                    ia, ib = self._intern(a, ids, index), self._intern(b, ids, index)
+                    friends.append((ia, ib))
+                    friends.append((ib, ia))
+            csr = {
+                "following": _CSR(len(ids), following),
+                "followers": _CSR(len(ids), ((b, a) for a, b in following)),
+                "friends": _CSR(len(ids), friends),
+            }
+
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self._ids, self._index, self._csr = ids, index, csr
+                self._added = {rel: {} for rel in RELATIONS}
+                self._removed = {rel: {} for rel in RELATIONS}
+                self._overlay_size = 0
+                for apply, args in journal:
+                    apply(*args)
+                self.loaded = True
+                self.last_load = time.monotonic()
+                self.load_ms = round((time.perf_counter() - started) * 1000.0, 2)
+                self.loads += 1
+
+    def refresh(self, db: Session) -> None:
+        """
+        Loads the graph on first use. Once loaded, a graph older than
+        SOCIAL_GRAPH_RELOAD_SECONDS is rebuilt on a background thread while
+        requests keep reading the current one.
+        """
+        if not self.loaded:
+            with self._first_load_lock:
+                if not self.loaded:
+                    self.load(db)
+            return
+        if RELOAD_SECONDS <= 0 or time.monotonic() - self.last_load < RELOAD_SECONDS:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def _reload_in_background(self) -> None:
+        # A session of its own: the caller's may be bound to an async engine, or closed by now.
+        db = database.SessionLocal()
+        try:
+            self.load(db)
+        except Exception as e:
+            logger.warning(f"[social-graph] Reload failed: {e}")
+        finally:
+            db.close()
+            self._reloading = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids, self._index = [], {}
+            self._csr = {rel: _CSR(0, ()) for rel in RELATIONS}
+            self._added = {rel: {} for rel in RELATIONS}
+            self._removed = {rel: {} for rel in RELATIONS}
+            self._overlay_size = 0
+            self.loaded = False
+
+    # --- Write hooks (called by crud after commit) ---
+
+    def _set_edge_locked(self, rel: str, a: str, b: str, present: bool) -> None:
+        ia, ib = self._intern(a), self._intern(b)
+        added, removed = self._added[rel], self._removed[rel]
+        in_csr = self._csr[rel].has_edge(ia, ib)
+        if present:
+            removed.get(ia, set()).discard(ib)
+            if not in_csr:
+                added.setdefault(ia, set()).add(ib)
+        else:
+            added.get(ia, set()).discard(ib)
+            if in_csr:
+                removed.setdefault(ia, set()).add(ib)
+        self._overlay_size += 1
+
+    def _apply_follow_locked(self, follower_id: str, following_id: str, present: bool) -> None:
+        self._set_edge_locked("following", follower_id, following_id, present)
+        self._set_edge_locked("followers", following_id, follower_id, present)
+
+    def _apply_friend_locked(self, a: str, b: str, present: bool) -> None:
+        self._set_edge_locked("friends", a, b, present)
+        self._set_edge_locked("friends", b, a, present)
+
+    def _hook(self, apply, *args) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((apply, args))
+            if self.loaded:
+                apply(*args)
+                if self._overlay_size > OVERLAY_LIMIT:
+                    self._compact_locked()
+
+    def follow(self, follower_id: str, following_id: str) -> None:
+        self._hook(self._apply_follow_locked, follower_id, following_id, True)
+
+    def unfollow(self, follower_id: str, following_id: str) -> None:
+        self._hook(self._apply_follow_locked, follower_id, following_id, False)
+
+    def befriend(self, a: str, b: str) -> None:
+        self._hook(self._apply_friend_locked, a, b, True)
+
+    def unfriend(self, a: str, b: str) -> None:
+        self._hook(self._apply_friend_locked, a, b, False)
+
+    def _compact_locked(self) -> None:
+        size = len(self._ids)
+        self._csr = {
+            rel: _CSR(size, ((i, j) for i in range(size) for j in self._row_locked(rel, i)))
+            for rel in RELATIONS
+        }
+        self._added = {rel: {} for rel in RELATIONS}
+        self._removed = {rel: {} for rel in RELATIONS}
+        self._overlay_size = 0
+        self.compactions += 1
+
+    # --- Lookups ---
+
+    def _row_locked(self, rel: str, i: int):
+        row = self._csr[rel].row(i)
+        added = self._added[rel].get(i)
+        removed = self._removed[rel].get(i)
+        if not added and not removed:
+            return row
+        return (set(row) - (removed or set())) | (added or set())
+
+    def _neighbours(self, db: Session, rel: str, user_id: str) -> FrozenSet[str]:
+        self.refresh(db)
+        with self._lock:
+            i = self._index.get(user_id)
+            if i is None:
+                return frozenset()
+            ids = self._ids
+            return frozenset(ids[j] for j in self._row_locked(rel, i))
+
+    def following(self, db: Session, user_id: str) -> FrozenSet[str]:
+        return self._neighbours(db, "following", user_id)
+
+    def followers(self, db: Session, user_id: str) -> FrozenSet[str]:
+        return self._neighbours(db, "followers", user_id)
+
+    def friends(self, db: Session, user_id: str) -> FrozenSet[str]:
+        return self._neighbours(db, "friends", user_id)
+
+    def mutual_friends(self, db: Session, a: str, b: str) -> FrozenSet[str]:
+        return self.friends(db, a) & self.friends(db, b)
+
+    def is_following(self, db: Session, follower_id: str, following_id: str) -> bool:
+        return following_id in self.following(db, follower_id)
+
+    # --- Diagnostics ---
+
+    def _edges_locked(self, rel: str) -> Set[Tuple[str, str]]:
+        ids = self._ids
+        return {(ids[i], ids[j]) for i in range(len(ids)) for j in self._row_locked(rel, i)}
+
+    def check_consistency(self, db: Session, sample: int = 5) -> dict:
+        """Diffs the in-memory edges against the tables (a full scan of both)."""
+        follows = {
+            (a, b) for a, b in db.query(models.Follow.follower_id, models.Follow.following_id) if a and b
+        }
+        friends = set()
+        for a, b in db.query(models.FriendRequest.sender_id, models.FriendRequest.receiver_id).filter(
+            models.FriendRequest.status == "accepted"
+        ):
+            if a and b and a != b:
+                friends.update(((a, b), (b, a)))
+        expected = {
+            "following": follows,
+            "followers": {(b, a) for a, b in follows},
+            "friends": friends,
+        }
+        with self._lock:
+            actual = {rel: self._edges_locked(rel) for rel in RELATIONS}
+        report = {}
+        for rel in RELATIONS:
+            missing = expected[rel] - actual[rel]
+            extra = actual[rel] - expected[rel]
+            report[rel] = {
+                "edges": len(expected[rel]),
+                "missing": len(missing),
+                "extra": len(extra),
+                "sample_missing": sorted(missing)[:sample],
+                "sample_extra": sorted(extra)[:sample],
+            }
+        report["consistent"] = all(not report[rel]["missing"] and not report[rel]["extra"] for rel in RELATIONS)
+        return report
+
+    def memory_report(self) -> dict:
+        """Approximate bytes held by the graph, by component."""
+        with self._lock:
+            csr = {rel: self._csr[rel].nbytes() for rel in RELATIONS}
+            interned = (
+                sys.getsizeof(self._ids)
+                + sys.getsizeof(self._index)
+                + sum(sys.getsizeof(uid) for uid in self._ids)
+            )
+            overlay = sum(
+                sys.getsizeof(row) + sys.getsizeof(i)
+                for part in (self._added, self._removed)
+                for rows in part.values()
+                for i, row in rows.items()
+            )
+            edges = sum(len(self._csr[rel].targets) for rel in RELATIONS)
+        total = sum(csr.values()) + interned + overlay
+        return {
+            "users": len(self._ids),
+            "edges": edges,
+            "csr_bytes": csr,
+            "interned_ids_bytes": interned,
+            "overlay_bytes": overlay,
+            "total_bytes": total,
+            "bytes_per_edge": round(total / edges, 1) if edges else None,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "enabled": GRAPH_ENABLED,
+            "loaded": self.loaded,
+            "users": len(self._ids),
+            "following_edges": len(self._csr["following"].targets),
+            "friend_edges": len(self._csr["friends"].targets) // 2,
+            "overlay_edges": self._overlay_size,
+            "age_seconds": round(time.monotonic() - self.last_load, 3) if self.loaded else None,
+            "load_ms": self.load_ms,
+            "loads": self.loads,
+            "compactions": self.compactions,
+        }
+
+
+social_graph = SocialGraph()
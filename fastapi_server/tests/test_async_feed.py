@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import async_crud, crud, feed_session, feed_window, models, schemas
+from fastapi_server.database import Base
+from fastapi_server.seen_filter import seen_filters
+from fastapi_server.social_graph import social_graph
+
+
+def _reset():
+    feed_window.candidate_window.clear()
+    social_graph.clear()
+    seen_filters.clear()
+    feed_session.feed_sessions.clear()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_window, "REFRESH_SECONDS", 0)
+    _reset()
+    path = tmp_path / "feed.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("viewer", "author"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+        session.add(models.Profile(user_id=uid, university="UNILAG"))
+    session.commit()
+    for i in range(7):
+        crud.create_post_transactional(session, schemas.PostCreate(caption=f"post {i}"), "author")
+    session.close()
+    engine.dispose()
+    yield path
+    _reset()
+
+
+def _feed_page(db_path, **kwargs):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        sync_engine = create_engine(f"sqlite:///{db_path}")
+        with sessionmaker(bind=sync_engine)() as db:
+            async with async_sessionmaker(engine)() as adb:
+                page = await async_crud.get_feed_page(adb, db, "viewer", **kwargs)
+        await engine.dispose()
+        sync_engine.dispose()
+        return page
+
+    return asyncio.run(scenario())
+
+
+def test_async_feed_ranks_off_the_event_loop(db_path, monkeypatch):
+    threads = []
+    rank = crud.rank_feed_post_ids
+    monkeypatch.setattr(crud, "rank_feed_post_ids", lambda *a: threads.append(threading.current_thread()) or rank(*a))
+
+    posts, cursor = _feed_page(db_path, limit=3)
+
+    assert len(posts) == 3 and cursor is not None
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_concurrent_async_feeds_on_a_cold_worker_finish(db_path):
+    # Feed caches (candidate window, social graph) hold threading locks while they load.
+    # Loading them on the event loop thread froze the loop when requests raced the first load.
+    results = []
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        sync_engine = create_engine(f"sqlite:///{db_path}")
+        factory, sync_factory = async_sessionmaker(engine), sessionmaker(bind=sync_engine)
+
+        async def one():
+            with sync_factory() as db:
+                async with factory() as adb:
+                    return await async_crud.get_feed_page(adb, db, "viewer", limit=3)
+
+        results.extend(await asyncio.gather(*(one() for _ in range(20))))
+        await engine.dispose()
+        sync_engine.dispose()
+
+    worker = threading.Thread(target=asyncio.run, args=(scenario(),), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+
+    assert not worker.is_alive(), "async feed requests deadlocked the event loop"
+    assert len(results) == 20 and all(len(posts) == 3 for posts, _ in results)
@@ -0,0 +1,139 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import asyncio
+import json
+
+from fastapi_server.backplane import LocalBackplane, LoopbackHub, backplane_dsn
+from fastapi_server.routers.messages import ConnectionManager, _fit
+
+
+class FakeSocket:
+    def __init__(self):
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.received.append(message)
+
+
+def _workers(n):
+    hub = LoopbackHub()
+    return [ConnectionManager(bus=LocalBackplane(hub)) for _ in range(n)]
+
+
+async def _start(managers):
+    for manager in managers:
+        await manager.backplane.start(manager.deliver)
+
+
+async def _drain():
+    # Let the per-socket writer tasks run.
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_broadcast_reaches_participants_on_other_workers():
+    async def scenario():
+        a, b, c = _workers(3)
+        await _start([a, b, c])
+        alice, bob, carol = FakeSocket(), FakeSocket(), FakeSocket()
+        await a.connect("alice", alice)
+        await b.connect("bob", bob)
+        await c.connect("carol", carol)
+
+        message = {"type": "new_message", "message": {"id": 1, "content": "hi"}}
+        await a.broadcast_to_conversation(message, ["alice", "bob"])
+        await _drain()
+
+        assert alice.received == [message]
+        assert bob.received == [message]
+        assert carol.received == []  # not a participant
+        assert a.backplane.published == 1
+
+    asyncio.run(scenario())
+
+
+def test_background_broadcasts_are_held_until_sent():
+    async def scenario():
+        a, b = _workers(2)
+        await _start([a, b])
+        bob = FakeSocket()
+        await b.connect("bob", bob)
+
+        message = {"type": "new_message", "message": {"id": 1, "content": "hi"}}
+        a.broadcast_in_background(message, ["alice", "bob"])
+        assert len(a._broadcasts) == 1
+        await _drain()
+
+        assert bob.received == [message]
+        assert not a._broadcasts
+
+    asyncio.run(scenario())
+
+
+def test_each_device_gets_the_message_once():
+    async def scenario():
+        a, b = _workers(2)
+        await _start([a, b])
+        phone, laptop, bob = FakeSocket(), FakeSocket(), FakeSocket()
+        await a.connect("alice", phone)
+        await b.connect("alice", laptop)
+        await a.connect("bob", bob)
+
+        await a.broadcast_to_conversation({"type": "new_message"}, ["alice", "bob"])
+        await _drain()
+
+        assert len(phone.received) == len(laptop.received) == len(bob.received) == 1
+
+    asyncio.run(scenario())
+
+
+def test_oversized_message_is_truncated_to_fit():
+    envelope = {"participants": ["bob"], "payload": {"type": "new_message", "message": {"id": 1, "content": "é\"x" * 5000}}}
+
+    fitted = _fit(envelope, 7900)
+
+    assert len(json.dumps({**fitted, "origin": "0" * 32}).encode()) < 7900
+    assert fitted["payload"]["message"]["truncated"] is True
+    assert envelope["payload"]["message"]["content"].startswith(fitted["payload"]["message"]["content"])
+    assert _fit(envelope, None) is envelope
+
+
+def test_backplane_dsn_uses_session_port_for_supabase_pooler():
+    dsn, ssl = backplane_dsn("postgresql+psycopg2://u:p@aws-0-eu.pooler.supabase.com:6543/postgres?sslmode=require")
+    assert dsn == "postgresql://u:p@aws-0-eu.pooler.supabase.com:5432/postgres"
+    assert ssl == "require"
+
+    dsn, ssl = backplane_dsn("postgres://u:p@localhost:5433/app")
+    assert dsn == "postgresql://u:p@localhost:5433/app"
+    assert ssl is None
+
+    assert backplane_dsn("sqlite:///./local.db") == (None, None)
+
+
+def test_notifications_are_dispatched_from_held_tasks():
+    from fastapi_server.backplane import PostgresBackplane
+
+    async def scenario():
+        bus = PostgresBackplane("postgresql://unused")
+        received = []
+
+        async def handler(envelope):
+            received.append(envelope)
+
+        await bus.start(handler)
+        bus._task.cancel()  # no database here; drive _on_notify by hand
+        bus._on_notify(None, 0, bus.channel, json.dumps({"type": "x", "origin": "other"}))
+        assert len(bus._dispatches) == 1
+        await _drain()
+        return received, len(bus._dispatches)
+
+    received, pending = asyncio.run(scenario())
+    assert received == [{"type": "x", "origin": "other"}]
+    assert pending == 0
@@ -0,0 +1,96 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import cache, crud, models
+from fastapi_server.cache import Principal, TTLCache, principal_cache
+from fastapi_server.database import Base
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    entries = TTLCache(maxsize=10, ttl=60)
+    entries.set("a", 1)
+    entries.set("b", 2, ttl=5)
+
+    clock.now += 5
+    assert entries.get("a") == 1
+    assert entries.get("b", "gone") == "gone"
+    assert entries.values() == [1]
+
+    clock.now += 55
+    assert entries.get("a") is None
+    assert len(entries) == 0  # expired entries are dropped when looked up
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")  # "b" is now the least recently used
+    entries.set("c", 3)
+
+    assert entries.get("b") is None
+    assert (entries.get("a"), entries.get("c")) == (1, 3)
+    assert entries.stats()["evictions"] == 1
+
+
+def test_stats_count_hits_and_misses(clock):
+    entries = TTLCache(maxsize=10, ttl=60)
+    entries.set("a", 1)
+    entries.get("a")
+    entries.get("a")
+    entries.get("missing")
+    entries.invalidate("a")
+    entries.get("a")
+
+    stats = entries.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 0)
+    assert stats["hit_rate"] == 0.5
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user = models.User(id="member", username="member", email="member@example.com", role="user", is_active=True)
+    session.add(user)
+    session.commit()
+    principal_cache.clear()
+    principal_cache.set("member", Principal.from_user(user))
+    yield session
+    session.close()
+    principal_cache.clear()
+
+
+def test_role_and_status_changes_invalidate_the_cached_principal(db):
+    crud.update_user_role(db, "member", "moderator")
+    assert principal_cache.get("member") is None
+
+    principal_cache.set("member", Principal.from_user(db.get(models.User, "member")))
+    crud.toggle_user_active(db, "member")
+    assert principal_cache.get("member") is None
+    assert Principal.from_user(db.get(models.User, "member")) == Principal("member", "member", "moderator", False)
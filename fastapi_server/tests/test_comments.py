@@ -0,0 +1,75 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import analytics, crud, dependencies, models, schemas
+from fastapi_server.database import Base
+from fastapi_server.main import app
+
+FANS = [f"fan{i}" for i in range(30)]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'comments.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(dependencies, "SessionLocal", factory)
+    monkeypatch.setattr(dependencies, "ReadSessionLocal", factory)
+    monkeypatch.setattr(analytics, "posthog", None)
+
+    with factory() as db:
+        for uid in ["author", "viewer"] + FANS:
+            db.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+        db.commit()
+        post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="hi"), "author")["id"]
+        comment_ids = [
+            crud.create_comment_transactional(db, schemas.CommentCreate(content=f"c{i}"), "author", post_id)["id"]
+            for i in range(5)
+        ]
+        for uid in FANS:
+            crud.like_comment(db, comment_ids[0], uid)
+        crud.like_comment(db, comment_ids[1], "viewer")
+
+    viewer = factory().get(models.User, "viewer")
+    api = app.app  # the FastAPI app inside the CORS wrapper
+    api.dependency_overrides[dependencies.get_current_user] = lambda: viewer
+    yield TestClient(app), post_id, comment_ids
+    api.dependency_overrides.pop(dependencies.get_current_user, None)
+
+
+def test_comment_pages_carry_counts_and_viewer_flags(client):
+    client, post_id, comment_ids = client
+    response = client.get(f"/posts/{post_id}/comments", params={"limit": 3})
+    assert response.status_code == 200
+    page = response.json()
+    assert [c["id"] for c in page] == comment_ids[:3]
+    assert [c["likes_count"] for c in page] == [30, 1, 0]
+    assert [c["liked_by_me"] for c in page] == [False, True, False]
+    assert "likes" not in page[0]
+    # Comments, the viewer's likes: no liker rows, whatever the like counts.
+    assert int(response.headers["x-db-query-count"]) <= 3
+
+    rest = client.get(f"/posts/{post_id}/comments", params={"cursor": response.headers["x-next-cursor"]})
+    assert [c["id"] for c in rest.json()] == comment_ids[3:]
+    assert "x-next-cursor" not in rest.headers
+
+
+def test_likers_are_a_separate_paginated_endpoint(client):
+    client, _, comment_ids = client
+    likers, cursor = [], None
+    while True:
+        response = client.get(f"/comments/{comment_ids[0]}/likes", params={"limit": 12, "cursor": cursor})
+        assert response.status_code == 200
+        likers.extend(u["id"] for u in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert likers == sorted(FANS)
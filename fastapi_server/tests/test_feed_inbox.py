@@ -0,0 +1,99 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, feed_inbox, models, schemas
+from fastapi_server.database import Base
+from fastapi_server.social_graph import social_graph
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_inbox, "FEED_MODE", "inbox")
+    monkeypatch.setattr(feed_inbox, "FANOUT_MAX_FOLLOWERS", 2)
+    feed_inbox._high_fanout_cache.clear()
+    social_graph.clear()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'inbox.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("author", "star", "fan1", "fan2", "fan3", "friend", "stranger"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    for follower in ("fan1", "fan2"):
+        session.add(models.Follow(follower_id=follower, following_id="author"))
+    for follower in ("fan1", "fan2", "fan3"):
+        session.add(models.Follow(follower_id=follower, following_id="star"))
+    session.add(models.FriendRequest(sender_id="author", receiver_id="friend", status="accepted"))
+    session.commit()
+    yield session
+    session.close()
+    feed_inbox._high_fanout_cache.clear()
+    social_graph.clear()
+
+
+def _feed_ids(db, user_id):
+    return [p["id"] for p in feed_inbox.get_inbox_feed(db, user_id)]
+
+
+def test_posts_fan_out_to_followers_friends_and_author(db):
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="hello"), "author")["id"]
+
+    recipients = {r.user_id for r in db.query(models.FeedItem).filter(models.FeedItem.post_id == post_id)}
+    assert recipients == {"author", "fan1", "fan2", "friend"}
+    assert _feed_ids(db, "fan1") == [post_id]
+    assert _feed_ids(db, "stranger") == []
+
+
+def test_high_fanout_authors_are_merged_on_read(db):
+    star_post = crud.create_post_transactional(db, schemas.PostCreate(caption="big news"), "star")["id"]
+    author_post = crud.create_post_transactional(db, schemas.PostCreate(caption="small news"), "author")["id"]
+
+    assert db.query(models.FeedItem).filter(models.FeedItem.post_id == star_post).count() == 1  # the star only
+    assert set(_feed_ids(db, "fan1")) == {star_post, author_post}
+    assert _feed_ids(db, "fan3") == [star_post]
+
+
+def test_unfollow_removes_author_from_inbox(db):
+    crud.create_post_transactional(db, schemas.PostCreate(caption="hello"), "author")
+    crud.unfollow_user_transactional(db, "fan1", "author")
+    assert _feed_ids(db, "fan1") == []
+
+
+def test_unfollowing_a_friend_keeps_their_posts(db):
+    crud.follow_user_transactional(db, "friend", "author")
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="hello"), "author")["id"]
+    crud.unfollow_user_transactional(db, "friend", "author")
+    assert _feed_ids(db, "friend") == [post_id]
+
+
+@pytest.mark.parametrize("on_conflict", [True, False])
+def test_backfill_is_idempotent(db, monkeypatch, on_conflict):
+    if not on_conflict:
+        # Exercise the NOT EXISTS fallback used on dialects without ON CONFLICT.
+        monkeypatch.setattr(feed_inbox, "ON_CONFLICT_DIALECTS", {})
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="hello"), "author")["id"]
+    db.query(models.FeedItem).delete()
+    db.commit()
+
+    assert feed_inbox.backfill_feed_inbox(db) == 1
+    assert feed_inbox.backfill_feed_inbox(db) == 1
+    assert db.query(models.FeedItem).filter(models.FeedItem.post_id == post_id).count() == 4
+
+
+def test_prune_drops_only_expired_rows(db):
+    old_id = crud.create_post_transactional(db, schemas.PostCreate(caption="old"), "author")["id"]
+    new_id = crud.create_post_transactional(db, schemas.PostCreate(caption="new"), "author")["id"]
+    expired = datetime.now(timezone.utc) - timedelta(days=feed_inbox.INBOX_DAYS + 1)
+    db.query(models.FeedItem).filter(models.FeedItem.post_id == old_id).update({"created_at": expired})
+    db.commit()
+
+    assert feed_inbox.prune_feed_inbox(db) == 4
+    assert {r.post_id for r in db.query(models.FeedItem)} == {new_id}
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fastapi_server import feed_scoring
+from fastapi_server.feed_scoring import FeedWeights
+from fastapi_server.feed_window import Candidate
+
+NOW = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def _c(post_id, author, hours_ago, likes=0, university=None):
+    return Candidate(post_id, author, None, NOW - timedelta(hours=hours_ago), university, likes, 0)
+
+
+CANDIDATES = [
+    _c(1, "me", 10),
+    _c(2, "friend", 1),
+    _c(3, "idol", 1),
+    _c(4, "stranger", 1, likes=100),
+    _c(5, "stranger", 1, university="UNILAG"),
+    _c(6, "stranger", 30),
+]
+
+
+def _rank(use_numpy, **kwargs):
+    return [c.id for c in feed_scoring.rank_candidates(
+        CANDIDATES, "me", "UNILAG", {"friend"}, {"idol", "friend"}, now=NOW, use_numpy=use_numpy, **kwargs
+    )]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_ranking_and_page_selection(use_numpy):
+    ranked = _rank(use_numpy)
+    assert ranked == [4, 2, 3, 5, 1, 6]
+    assert _rank(use_numpy, limit=2) == ranked[:2]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_weights_change_the_order(use_numpy):
+    no_engagement = FeedWeights(like=0)
+    assert _rank(use_numpy, weights=no_engagement)[:3] == [2, 3, 5]
+
+
+def test_experiment_bucket_is_stable(monkeypatch):
+    variant = FeedWeights(like=5)
+    monkeypatch.setattr(feed_scoring, "EXPERIMENT_WEIGHTS", variant)
+    monkeypatch.setattr(feed_scoring, "EXPERIMENT_PERCENT", 50)
+    buckets = {uid: feed_scoring.ranking_variant(uid)[0] for uid in (f"user-{i}" for i in range(200))}
+    assert set(buckets.values()) == {"control", "experiment"}
+    assert all(feed_scoring.ranking_variant(uid)[0] == b for uid, b in buckets.items())
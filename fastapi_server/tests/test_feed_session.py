@@ -0,0 +1,99 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, feed_session, feed_window, models, schemas
+from fastapi_server.database import Base
+from fastapi_server.seen_filter import seen_filters
+from fastapi_server.social_graph import social_graph
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_window, "REFRESH_SECONDS", 0)
+    feed_window.candidate_window.clear()
+    social_graph.clear()
+    seen_filters.clear()
+    feed_session.feed_sessions.clear()
+    feed_session._latest_sessions.clear()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'session.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("viewer", "author", "other"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+        session.add(models.Profile(user_id=uid, university="UNILAG"))
+    session.commit()
+    for i in range(7):
+        crud.create_post_transactional(session, schemas.PostCreate(caption=f"post {i}"), "author")
+    yield session
+    session.close()
+    feed_window.candidate_window.clear()
+    social_graph.clear()
+    seen_filters.clear()
+    feed_session.feed_sessions.clear()
+    feed_session._latest_sessions.clear()
+
+
+def _scroll(db, user_id="viewer", limit=3):
+    seen, cursor = [], None
+    while True:
+        posts, cursor = feed_session.get_feed_page(db, user_id, cursor, limit=limit)
+        seen.extend(p["id"] for p in posts)
+        if cursor is None:
+            return seen
+
+
+def test_pages_slice_one_ranking_without_duplicates(db, monkeypatch):
+    calls = []
+    rank = crud.rank_feed_post_ids
+    monkeypatch.setattr(crud, "rank_feed_post_ids", lambda *a: calls.append(a) or rank(*a))
+
+    first_page, cursor = feed_session.get_feed_page(db, "viewer", limit=3)
+    # Engagement moves between pages and would reorder a fresh ranking.
+    db.execute(update(models.Post).where(models.Post.caption == "post 0").values(likes_count=500))
+    db.commit()
+    ids = [p["id"] for p in first_page]
+    while cursor:
+        page, cursor = feed_session.get_feed_page(db, "viewer", cursor, limit=3)
+        ids.extend(p["id"] for p in page)
+
+    assert len(calls) == 1
+    assert sorted(ids) == sorted(set(ids)) and len(ids) == 7
+
+
+def test_seed_anchors_skip_pagination(db):
+    page1, _ = feed_session.get_feed_page(db, "viewer", skip=0, limit=4, seed=0.25)
+    crud.create_post_transactional(db, schemas.PostCreate(caption="brand new"), "author")
+    page2, next_cursor = feed_session.get_feed_page(db, "viewer", skip=4, limit=4, seed=0.25)
+
+    assert len(page1) + len(page2) == 7
+    assert not {p["id"] for p in page1} & {p["id"] for p in page2}
+    assert next_cursor is None
+
+
+def test_unknown_or_foreign_cursor_starts_a_fresh_session(db):
+    _, cursor = feed_session.get_feed_page(db, "viewer", limit=3)
+    fresh, _ = feed_session.get_feed_page(db, "other", cursor, limit=3)
+    restarted, _ = feed_session.get_feed_page(db, "viewer", "garbage", limit=3)
+
+    assert len(fresh) == 3 and len(restarted) == 3
+    assert len(_scroll(db)) == 7
+
+
+def test_refreshing_replaces_the_users_previous_session(db):
+    _, first = feed_session.get_feed_page(db, "viewer", limit=3)
+    for _ in range(5):
+        feed_session.get_feed_page(db, "viewer", limit=3)
+    feed_session.get_feed_page(db, "other", limit=3)
+
+    assert len(feed_session.feed_sessions) == 2  # one per user
+    stale, _ = feed_session.get_feed_page(db, "viewer", first, limit=3)
+    assert len(stale) == 3  # the old cursor starts over
+
@@ -0,0 +1,92 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import feed_sources, feed_window, models
+from fastapi_server.database import Base
+from fastapi_server.feed_window import Candidate
+
+
+@pytest.fixture(params=[True, False], ids=["window", "sql"])
+def db(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_window, "WINDOW_ENABLED", request.param)
+    monkeypatch.setattr(feed_window, "REFRESH_SECONDS", 0)
+    feed_window.candidate_window.clear()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'sources.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid, uni in (("viewer", "UNILAG"), ("friend", "OAU"), ("idol", "UI"), ("classmate", "UNILAG"), ("crowd", "ABU")):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+        session.add(models.Profile(user_id=uid, university=uni))
+    session.add(models.FriendRequest(sender_id="viewer", receiver_id="friend", status="accepted"))
+    session.add(models.Follow(follower_id="viewer", following_id="idol"))
+    session.add(models.Group(id=1, name="chess", creator_id="crowd", privacy="public"))
+    session.add(models.GroupMember(group_id=1, user_id="viewer"))
+    session.commit()
+    yield session
+    session.close()
+    feed_window.candidate_window.clear()
+
+
+def _add_posts(db, user_id, count, hours_ago, **extra):
+    created = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours_ago)
+    posts = [models.Post(user_id=user_id, caption=f"{user_id}-{i}", created_at=created, **extra) for i in range(count)]
+    db.add_all(posts)
+    db.commit()
+    return [p.id for p in posts]
+
+
+def _sources(db):
+    return feed_sources.fetch_sources(
+        db, "viewer", "UNILAG", {"friend"}, {"idol"}, set(), datetime.now(timezone.utc) - timedelta(days=14)
+    )
+
+
+def test_friend_posts_behind_the_global_firehose_are_candidates(db, monkeypatch):
+    monkeypatch.setattr(feed_window, "CANDIDATE_LIMIT", 20)
+    old_friend_post = _add_posts(db, "friend", 1, hours_ago=100)[0]
+    _add_posts(db, "crowd", 50, hours_ago=1)
+
+    candidate_ids = {c.id for c in feed_sources.gather_candidates(
+        db, "viewer", "UNILAG", {"friend"}, set(), set(), datetime.now(timezone.utc) - timedelta(days=14)
+    )}
+    assert len(candidate_ids) == 20
+    assert old_friend_post in candidate_ids
+
+
+def test_each_source_is_capped_by_its_quota(db, monkeypatch):
+    monkeypatch.setitem(feed_sources.SOURCE_QUOTAS, "follows", 3)
+    monkeypatch.setitem(feed_sources.SOURCE_QUOTAS, "university", 2)
+    _add_posts(db, "idol", 10, hours_ago=2)
+    _add_posts(db, "classmate", 10, hours_ago=3)
+    group_posts = _add_posts(db, "crowd", 2, hours_ago=4, group_id=1)
+    liked = _add_posts(db, "crowd", 1, hours_ago=5, likes_count=99)[0]
+
+    sources = _sources(db)
+    assert len(sources["follows"]) == 3
+    assert {c.user_id for c in sources["follows"]} == {"idol"}
+    assert len(sources["university"]) == 2  # classmate (viewer has no posts)
+    assert {c.id for c in sources["groups"]} == set(group_posts)
+    assert liked in {c.id for c in sources["trending"]}
+
+
+def test_merge_is_newest_first_and_deduplicated():
+    now = datetime.now(timezone.utc)
+
+    def c(post_id, minutes_ago):
+        return Candidate(post_id, "u", None, now - timedelta(minutes=minutes_ago), None, 0, 0)
+
+    merged = feed_sources.merge_sources(
+        {"a": [c(5, 1), c(3, 10)], "b": [c(4, 2), c(3, 10), c(1, 30)], "c": []}, limit=10
+    )
+    assert [m.id for m in merged] == [5, 4, 3, 1]
+    assert len(feed_sources.merge_sources({"a": [c(5, 1), c(3, 10)], "b": [c(4, 2)]}, limit=2)) == 2
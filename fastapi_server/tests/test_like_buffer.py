@@ -0,0 +1,169 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, like_buffer, models, schemas
+from fastapi_server.database import Base
+from fastapi_server.like_buffer import LikeBuffer
+
+FANS = [f"fan{i}" for i in range(6)]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Flushes are driven by the tests, not the background thread.
+    monkeypatch.setattr(like_buffer, "FLUSH_MS", 3_600_000)
+    monkeypatch.setattr(like_buffer, "COMBINING_ENABLED", True)
+    monkeypatch.setattr(like_buffer, "HOT_PER_SECOND", 3)
+    engine = create_engine(f"sqlite:///{tmp_path / 'likes.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ["author"] + FANS:
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _likes(db, post_id):
+    db.expire_all()
+    rows = db.query(models.post_likes.c.user_id).filter(models.post_likes.c.post_id == post_id).count()
+    return rows, db.get(models.Post, post_id).likes_count
+
+
+def test_hot_post_likes_are_combined_and_idempotent(db):
+    buffer = LikeBuffer(session_factory=sessionmaker(bind=db.get_bind()))
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="viral"), "author")["id"]
+
+    # The first likes go straight to the database until the post turns hot.
+    assert buffer.like(db, post_id, "fan0") == (True, 1)
+    assert buffer.like(db, post_id, "fan1") == (True, 2)
+    assert buffer.like(db, post_id, "fan2") == (True, 3)  # third like in a second: hot
+    assert buffer.like(db, post_id, "fan3") == (True, 4)
+    assert buffer.like(db, post_id, "fan3") == (False, 4)  # double tap while buffered
+    assert buffer.like(db, post_id, "fan0") == (False, 4)  # liked before the post turned hot
+    assert buffer.like(db, post_id, "fan4") == (True, 5)
+    assert buffer.stats()["pending"] == 3
+    assert _likes(db, post_id) == (2, 2)
+
+    assert buffer.unlike(db, post_id, "fan4")  # cancelled before it was written
+    assert buffer.flush() == 2
+    assert _likes(db, post_id) == (4, 4)
+    assert buffer.like(db, post_id, "fan4") == (True, 5)
+    assert buffer.flush() == 1
+    assert _likes(db, post_id) == (5, 5)
+
+    assert buffer.unlike(db, post_id, "fan3")  # already flushed: deleted in the database
+    assert buffer.like(db, post_id, "fan5") == (True, 5)
+    assert buffer.flush() == 1
+    assert _likes(db, post_id) == (5, 5)
+
+    senders = sorted(s for (s,) in db.query(models.Notification.sender_id).filter(models.Notification.type == "like"))
+    assert senders == ["fan0", "fan1", "fan2", "fan3", "fan4", "fan5"]
+
+
+def test_flush_reseeds_counts_from_other_writers(db):
+    buffer = LikeBuffer(session_factory=sessionmaker(bind=db.get_bind()))
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="viral"), "author")["id"]
+    for uid in FANS[:4]:
+        buffer.like(db, post_id, uid)
+
+    # Another worker likes the post directly, including a user buffered here.
+    crud.like_post_returning_count(db, post_id, "fan3")
+    crud.like_post_returning_count(db, post_id, "fan5")
+    assert buffer.flush() == 1
+    assert _likes(db, post_id) == (5, 5)
+    assert buffer.like(db, post_id, "fan4") == (True, 6)
+    assert buffer.like(db, 9999, "fan4") is None
+
+
+def test_relike_after_an_unlike_on_another_worker_is_written(db):
+    factory = sessionmaker(bind=db.get_bind())
+    hot_worker, other_worker = LikeBuffer(session_factory=factory), LikeBuffer(session_factory=factory)
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="viral"), "author")["id"]
+    for uid in FANS[:4]:
+        hot_worker.like(db, post_id, uid)
+    assert hot_worker.flush() == 2
+    assert hot_worker.like(db, post_id, "fan3") == (False, 4)
+
+    assert other_worker.unlike(db, post_id, "fan3")  # cold there: deleted directly
+    # Counts here catch up with the other worker's unlike on the next flush.
+    assert hot_worker.like(db, post_id, "fan3") == (True, 5)
+    assert hot_worker.flush() == 1
+    assert _likes(db, post_id) == (4, 4)
+
+
+class _ForbiddenLock:
+    def __enter__(self):
+        raise AssertionError("cold-post unlikes must not wait for flushes")
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_unlike_of_a_cold_post_skips_the_flush_lock(db):
+    buffer = LikeBuffer(session_factory=sessionmaker(bind=db.get_bind()))
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="quiet"), "author")["id"]
+    buffer.like(db, post_id, "fan0")
+    buffer._flush_lock = _ForbiddenLock()
+
+    assert buffer.unlike(db, post_id, "fan0")
+    assert _likes(db, post_id) == (0, 0)
+
+
+def test_unlike_cancels_a_like_requeued_by_a_failed_flush(db, monkeypatch):
+    factory = sessionmaker(bind=db.get_bind())
+    buffer = LikeBuffer(session_factory=factory)
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="viral"), "author")["id"]
+    for uid in FANS[:4]:
+        buffer.like(db, post_id, uid)
+
+    writing, release = threading.Event(), threading.Event()
+
+    def failing_write(session, likes):
+        writing.set()
+        release.wait(5)
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(like_buffer, "write_likes", failing_write)
+    flusher = threading.Thread(target=lambda: pytest.raises(RuntimeError, buffer.flush))
+    flusher.start()
+    writing.wait(5)  # fan3's like has left pending and is being written
+
+    def unlike():
+        with factory() as session:
+            results.append(buffer.unlike(session, post_id, "fan3"))
+
+    results = []
+    unliker = threading.Thread(target=unlike)
+    unliker.start()
+    time.sleep(0.1)  # the unlike misses pending and queues on the flush lock
+    release.set()  # the write fails and puts fan3's like back
+    flusher.join(5)
+    unliker.join(5)
+
+    assert results == [True]
+    monkeypatch.undo()
+    buffer.flush()
+    db.expire_all()
+    likers = {u for (u,) in db.query(models.post_likes.c.user_id).filter(models.post_likes.c.post_id == post_id)}
+    assert likers == {"fan0", "fan1", "fan2"}
+
+
+def test_unsupported_dialects_write_likes_directly(db, monkeypatch):
+    monkeypatch.setattr(like_buffer, "COMBINING_DIALECTS", {})
+    buffer = LikeBuffer(session_factory=sessionmaker(bind=db.get_bind()))
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="viral"), "author")["id"]
+
+    for i, uid in enumerate(FANS, start=1):
+        assert buffer.like(db, post_id, uid) == (True, i)
+    assert buffer.stats()["direct"] == len(FANS) and buffer.stats()["buffered"] == 0
@@ -0,0 +1,82 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models
+from fastapi_server.database import Base
+from fastapi_server.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pages.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("author", "reader", "zed"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    # Pairs of posts share a timestamp so pages have to split ties by id.
+    for i in range(10):
+        session.add(models.Post(user_id="author", caption=f"p{i}", created_at=base + timedelta(minutes=i // 2)))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _scroll(fetch, limit):
+    seen, cursor = [], None
+    while True:
+        page, cursor = fetch(cursor, limit)
+        seen.extend(page)
+        if cursor is None:
+            return seen
+
+
+def test_cursor_pages_cover_every_row_once_in_order(db):
+    expected = [p.id for p in db.query(models.Post).order_by(models.Post.created_at.desc(), models.Post.id.desc())]
+    scrolled = _scroll(lambda c, n: crud.get_user_posts(db, "author", limit=n, cursor=c), 3)
+    assert [p.id for p in scrolled] == expected
+
+    # The legacy offset path gives the same page and a cursor to continue from.
+    offset_page, cursor = crud.get_user_posts(db, "author", skip=3, limit=3)
+    assert [p.id for p in offset_page] == expected[3:6]
+    assert [p.id for p in crud.get_user_posts(db, "author", limit=3, cursor=cursor)[0]] == expected[6:9]
+
+
+def test_new_rows_do_not_shift_later_pages(db):
+    first, cursor = crud.get_user_posts(db, "author", limit=4)
+    db.add(models.Post(user_id="author", caption="fresh", created_at=datetime(2026, 1, 2)))
+    db.commit()
+    second, _ = crud.get_user_posts(db, "author", limit=4, cursor=cursor)
+    assert not {p.id for p in first} & {p.id for p in second}
+    assert "fresh" not in {p.caption for p in second}
+
+
+def test_users_page_by_id_and_bad_cursors_are_rejected(db):
+    users = _scroll(lambda c, n: crud.get_all_users(db, limit=n, cursor=c), 2)
+    assert [u.id for u in users] == ["author", "reader", "zed"]
+
+    columns = (models.Post.created_at, models.Post.id)
+    stamp = datetime(2026, 1, 1, 12, 30, 0, 123456)
+    assert decode_cursor(encode_cursor([stamp, 7]), columns) == (stamp, 7)
+    for bad in ("not-a-cursor!", encode_cursor([1]), encode_cursor(["yesterday", 1])):
+        with pytest.raises(InvalidCursor):
+            crud.get_posts(db, cursor=bad)
+
+
+def test_sqlite_server_default_timestamps_page_across_ties(db):
+    # created_at from CURRENT_TIMESTAMP is stored without fractional seconds.
+    for i in range(5):
+        db.add(models.Post(user_id="reader", caption=f"r{i}"))
+    db.commit()
+    expected = [p.id for p in db.query(models.Post).filter(models.Post.user_id == "reader").order_by(models.Post.id.desc())]
+    scrolled = _scroll(lambda c, n: crud.get_user_posts(db, "reader", limit=n, cursor=c), 2)
+    assert [p.id for p in scrolled] == expected
@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import sqlite3
+import time
+
+import pytest
+
+from fastapi_server import pool_metrics
+from fastapi_server.pool_metrics import InstrumentedQueuePool, PoolMetrics
+
+
+@pytest.fixture
+def adaptive(monkeypatch):
+    monkeypatch.setattr(pool_metrics, "ADAPTIVE_ENABLED", True)
+    monkeypatch.setattr(pool_metrics, "ADAPTIVE_MIN_OVERFLOW", 1)
+    monkeypatch.setattr(pool_metrics, "ADAPTIVE_MAX_OVERFLOW", 6)
+    monkeypatch.setattr(pool_metrics, "ADAPTIVE_TARGET_WAIT_MS", 50.0)
+    monkeypatch.setattr(pool_metrics, "ADAPTIVE_INTERVAL_SECONDS", 0.0)
+
+
+def _pool(pool_size=2, max_overflow=2):
+    return InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=pool_size, max_overflow=max_overflow)
+
+
+def test_checkout_waits_feed_the_recent_percentiles():
+    metrics = PoolMetrics()
+    for wait_ms in range(1, 101):
+        metrics.record_wait(float(wait_ms))
+
+    assert metrics.recent_wait_percentiles() == {"p50": 51.0, "p95": 95.0, "p99": 99.0}
+    snapshot = metrics.snapshot()
+    assert (snapshot["checkouts"], snapshot["checkout_wait_avg_ms"], snapshot["checkout_wait_max_ms"]) == (100, 50.5, 100.0)
+
+    # Only the last _WAIT_WINDOW waits count towards the percentiles; the totals keep everything.
+    for _ in range(pool_metrics._WAIT_WINDOW):
+        metrics.record_wait(1.0)
+    assert metrics.recent_wait_percentiles()["p99"] == 1.0
+    assert metrics.snapshot()["checkout_wait_max_ms"] == 100.0
+
+
+def test_checkouts_are_timed_and_counted():
+    pool = _pool()
+    held = [pool.connect() for _ in range(3)]
+
+    snapshot = pool.metrics.snapshot()
+    assert snapshot["checkouts"] == 3
+    assert (snapshot["peak_checked_out"], snapshot["peak_overflow"]) == (3, 1)
+    assert snapshot["checkout_wait_recent_ms"]["p50"] >= 0.0
+    for conn in held:
+        conn.close()
+
+
+def test_slow_checkouts_grow_the_overflow_and_idle_ones_shrink_it(adaptive):
+    pool = _pool(pool_size=4, max_overflow=2)
+    assert pool.adaptive and pool._max_overflow == 2
+
+    for _ in range(20):
+        pool.metrics.record_wait(80.0)
+    pool._maybe_adapt()
+    assert pool._max_overflow == 4  # + pool_size // 2
+    pool._maybe_adapt()
+    assert pool._max_overflow == 6  # clamped to DB_POOL_MAX_OVERFLOW_LIMIT
+    pool._maybe_adapt()
+    assert pool.metrics.resizes == 2
+
+    # Waits well under a tenth of the target and no overflow in use: give one slot back per round.
+    for _ in range(pool_metrics._WAIT_WINDOW):
+        pool.metrics.record_wait(0.1)
+    pool._maybe_adapt()
+    assert pool._max_overflow == 5
+    for _ in range(10):
+        pool._maybe_adapt()
+    assert pool._max_overflow == 1  # DB_POOL_MIN_OVERFLOW
+    assert pool.size() == 4  # pool_size is never changed
+
+
+def test_adaptation_waits_for_the_interval(adaptive, monkeypatch):
+    monkeypatch.setattr(pool_metrics, "ADAPTIVE_INTERVAL_SECONDS", 60.0)
+    pool = _pool()
+    for _ in range(20):
+        pool.metrics.record_wait(80.0)
+
+    pool._maybe_adapt()
+    assert pool._max_overflow == 2
+    pool._last_adapt = time.monotonic() - 61
+    pool._maybe_adapt()
+    assert pool._max_overflow == 3
@@ -0,0 +1,115 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models, schemas
+from fastapi_server.database import Base
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'counters.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("author", "fan1", "fan2"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _counters(db, post_id):
+    db.expire_all()
+    post = db.get(models.Post, post_id)
+    return post.likes_count, post.comments_count
+
+
+def test_likes_and_comments_maintain_post_counters(db):
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="hi"), "author")["id"]
+    assert _counters(db, post_id) == (0, 0)
+
+    assert crud.add_post_like_ultra_performance(db, post_id, "fan1")
+    assert crud.add_post_like_ultra_performance(db, post_id, "fan2")
+    assert not crud.add_post_like_ultra_performance(db, post_id, "fan2")  # duplicate like
+    comment = crud.create_comment_transactional(db, schemas.CommentCreate(content="nice"), "fan1", post_id)
+    crud.create_comment_transactional(db, schemas.CommentCreate(content="+1"), "fan2", post_id)
+    assert _counters(db, post_id) == (2, 2)
+    assert crud.get_post_likes_count(db, post_id) == 2
+
+    assert crud.remove_post_like_transactional(db, post_id, "fan1")
+    assert not crud.remove_post_like_transactional(db, post_id, "fan1")
+    crud.delete_comment(db, comment["id"])
+    assert _counters(db, post_id) == (1, 1)
+
+
+def test_reconcile_repairs_drift(db):
+    first = crud.create_post_transactional(db, schemas.PostCreate(caption="a"), "author")["id"]
+    second = crud.create_post_transactional(db, schemas.PostCreate(caption="b"), "author")["id"]
+    crud.add_post_like_ultra_performance(db, first, "fan1")
+    crud.create_comment_transactional(db, schemas.CommentCreate(content="c"), "fan1", second)
+
+    db.execute(update(models.Post).values(likes_count=7, comments_count=0))
+    db.commit()
+
+    assert crud.reconcile_post_counters(db, batch_size=1) == 2
+    assert _counters(db, first) == (1, 0)
+    assert _counters(db, second) == (0, 1)
+    assert crud.reconcile_post_counters(db) == 0
+
+
+def test_like_returns_count_and_notifies_author_once(db):
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="hi"), "author")["id"]
+
+    assert crud.like_post_returning_count(db, post_id, "fan1") == (True, 1)
+    assert crud.like_post_returning_count(db, post_id, "fan1") == (False, 1)
+    assert crud.like_post_returning_count(db, post_id, "author") == (True, 2)
+    assert crud.like_post_returning_count(db, 9999, "fan1") is None
+
+    # Unlike and like again: the count moves, the author still has one notification.
+    crud.remove_post_like_transactional(db, post_id, "fan1")
+    assert crud.like_post_returning_count(db, post_id, "fan1") == (True, 2)
+    notifications = db.query(models.Notification).filter(models.Notification.type == "like").all()
+    assert [(n.user_id, n.sender_id, n.post_id, n.is_read) for n in notifications] == [
+        ("author", "fan1", post_id, False)
+    ]
+    assert notifications[0].created_at is not None
+
+
+def test_profile_and_group_listings_return_the_counter_columns(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import inspect
+    from fastapi_server import dependencies
+    from fastapi_server.main import app
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'listings.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(dependencies, "SessionLocal", factory)
+    with factory() as db:
+        for uid in ("author", "fan1"):
+            db.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+        db.add(models.Group(id=1, name="campus", privacy="public", creator_id="author"))
+        db.commit()
+        post_id = crud.create_group_post(db, schemas.PostCreate(caption="hi"), 1, "author").id
+        crud.add_post_like_ultra_performance(db, post_id, "fan1")
+        crud.create_comment_transactional(db, schemas.CommentCreate(content="nice"), "fan1", post_id)
+
+        posts, _ = crud.get_user_posts(db, "author")
+        assert "likes" in inspect(posts[0]).unloaded  # the counter column replaces loading every like
+
+    viewer = factory().get(models.User, "fan1")
+    api = app.app  # the FastAPI app inside the CORS wrapper
+    api.dependency_overrides[dependencies.get_current_user] = lambda: viewer
+    try:
+        client = TestClient(app)
+        for url in ("/users/author/posts", "/groups/1/posts/"):
+            [post] = client.get(url).json()
+            assert (post["likes_count"], post["comments_count"]) == (1, 1)
+    finally:
+        api.dependency_overrides.pop(dependencies.get_current_user, None)
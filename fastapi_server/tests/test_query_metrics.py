@@ -0,0 +1,90 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import analytics, dependencies, models, query_metrics
+from fastapi_server.database import Base
+from fastapi_server.main import app
+from fastapi_server.query_metrics import count_queries, statement_shape
+
+
+@pytest.fixture
+def db_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queries.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(dependencies, "SessionLocal", factory)
+    monkeypatch.setattr(dependencies, "ReadSessionLocal", factory)
+    monkeypatch.setattr(analytics, "posthog", None)
+
+    with factory() as db:
+        for i in range(6):
+            db.add(models.User(id=f"u{i}", username=f"user{i}", email=f"u{i}@example.com", role="user", is_active=True))
+            db.add(models.Group(name=f"group{i}", creator_id=f"u{i}", privacy="public"))
+        db.commit()
+    return factory
+
+
+def test_statement_shape_ignores_literals_and_in_lists():
+    assert statement_shape("SELECT * FROM users WHERE id = 'a'  AND n = 3") == statement_shape(
+        "SELECT * FROM users\n WHERE id = 'b' AND n = 42"
+    )
+    assert statement_shape("SELECT 1 WHERE id IN (?, ?, ?)") == statement_shape("SELECT 1 WHERE id IN (?)")
+
+
+def test_lazy_loads_in_a_loop_are_reported_as_repeated(db_factory):
+    with db_factory() as db:
+        groups = db.query(models.Group).all()
+        with count_queries() as stats:
+            [g.member_count for g in groups]  # lazy loads Group.members once per group
+
+    assert stats.count == 6
+    assert stats.repeated(threshold=5)[0][1] == 6
+
+
+def test_list_groups_reports_query_count_without_n_plus_one(db_factory, caplog):
+    client = TestClient(app)
+    with caplog.at_level(logging.WARNING, logger=query_metrics.__name__):
+        response = client.get("/groups/")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 6
+    assert int(response.headers["x-db-query-count"]) <= 3
+    assert float(response.headers["x-db-time-ms"]) >= 0
+    assert "[n+1]" not in caplog.text
+
+
+def test_budget_overrun_is_logged(db_factory, caplog):
+    with caplog.at_level(logging.WARNING, logger=query_metrics.__name__):
+        with count_queries() as stats:
+            with db_factory() as db:
+                db.query(models.Group).all()
+        query_metrics.check_budget("GET /groups/", stats, budget=0)
+
+    assert "[query-budget] GET /groups/ ran 1 statements" in caplog.text
+
+
+def test_failed_statement_does_not_leave_its_start_time(db_factory):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    with db_factory() as db:
+        with count_queries() as stats:
+            with pytest.raises(OperationalError):
+                db.execute(text("SELECT * FROM no_such_table"))
+            db.rollback()
+            db.execute(text("SELECT 1"))
+            info = db.connection().info
+            assert info.get("query_start") == []
+            assert info.get("slow_query_start") == []  # slow_queries keeps its own stack
+
+    assert stats.count == 1
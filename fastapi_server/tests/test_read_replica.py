@@ -0,0 +1,124 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import analytics, dependencies, models
+from fastapi_server.cache import principal_cache
+from fastapi_server.database import Base
+from fastapi_server.main import app
+from fastapi_server.security import token_verifier
+
+JWT_SECRET = "replica-test-secret"
+
+
+class ReplicatedSQLite:
+    """Primary + replica SQLite files; the replica only catches up when `replicate()` runs."""
+
+    def __init__(self, tmp_path):
+        self.primary_path = str(tmp_path / "primary.db")
+        self.replica_path = str(tmp_path / "replica.db")
+        self.primary = create_engine(f"sqlite:///{self.primary_path}", connect_args={"check_same_thread": False})
+        self.replica = create_engine(f"sqlite:///{self.replica_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.primary)
+        self.replicate()
+
+    def replicate(self):
+        self.replica.dispose()
+        src, dst = sqlite3.connect(self.primary_path), sqlite3.connect(self.replica_path)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    cluster = ReplicatedSQLite(tmp_path)
+    monkeypatch.setattr(dependencies, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=cluster.primary))
+    monkeypatch.setattr(dependencies, "ReadSessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=cluster.replica))
+    monkeypatch.setattr(dependencies, "AsyncSessionLocal", None)
+    monkeypatch.setattr(dependencies, "AUTH_VERIFY_MODE", "local")
+    monkeypatch.setattr(token_verifier, "jwt_secret", JWT_SECRET)
+    monkeypatch.setattr(token_verifier, "jwks_url", None)
+    monkeypatch.setattr(analytics, "posthog", None)
+    principal_cache.clear()
+    dependencies._recent_writers.clear()
+
+    with sessionmaker(bind=cluster.primary)() as db:
+        db.add(models.User(id="author", username="author", email="author@example.com", role="user", is_active=True))
+        db.add(models.Profile(user_id="author"))
+        db.commit()
+    cluster.replicate()
+    yield cluster
+    principal_cache.clear()
+    dependencies._recent_writers.clear()
+
+
+def _auth_headers(user_id):
+    token = jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 300},
+        JWT_SECRET,
+        algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_reads_are_served_by_the_lagging_replica(cluster):
+    client = TestClient(app)
+    response = client.post("/posts/", json={"caption": "fresh"}, headers=_auth_headers("author"))
+    assert response.status_code == 200
+
+    # Replica hasn't caught up yet: anonymous reads don't see the new post.
+    assert client.get("/posts/").json() == []
+
+    cluster.replicate()
+    assert [p["caption"] for p in client.get("/posts/").json()] == ["fresh"]
+
+
+def test_writes_go_to_the_primary(cluster):
+    client = TestClient(app)
+    client.post("/posts/", json={"caption": "primary only"}, headers=_auth_headers("author"))
+
+    with sessionmaker(bind=cluster.primary)() as db:
+        assert db.query(models.Post).count() == 1
+    with sessionmaker(bind=cluster.replica)() as db:
+        assert db.query(models.Post).count() == 0
+
+
+def test_writer_reads_their_own_writes_from_the_primary(cluster):
+    client = TestClient(app)
+    headers = _auth_headers("author")
+    client.post("/posts/", json={"caption": "mine"}, headers=headers)
+
+    assert [p["caption"] for p in client.get("/posts/", headers=headers).json()] == ["mine"]
+    assert client.get("/posts/").json() == []
+
+    dependencies._recent_writers.clear()  # sticky window elapsed
+    assert client.get("/posts/", headers=headers).json() == []
+
+
+def test_writers_other_sessions_also_read_from_the_primary(cluster):
+    client = TestClient(app)
+    client.post("/posts/", json={"caption": "from my phone"}, headers=_auth_headers("author"))
+
+    laptop_token = jwt.encode(
+        {"sub": "author", "aud": "authenticated", "exp": int(time.time()) + 300, "session_id": "laptop"},
+        JWT_SECRET,
+        algorithm="HS256",
+    )
+    laptop = {"Authorization": f"Bearer {laptop_token}"}
+    assert laptop != _auth_headers("author")
+    assert [p["caption"] for p in client.get("/posts/", headers=laptop).json()] == ["from my phone"]
+    assert client.get("/posts/", headers={"Authorization": "Bearer not-a-jwt"}).json() == []
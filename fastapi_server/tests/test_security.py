@@ -0,0 +1,113 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt, JWTError
+
+from fastapi_server import security
+from fastapi_server.security import LocalTokenVerifier
+
+SECRET = "test-secret"
+
+
+def _claims(**overrides):
+    now = int(time.time())
+    claims = {"sub": "user-1", "aud": "authenticated", "iat": now, "exp": now + 3600}
+    claims.update(overrides)
+    return claims
+
+
+@pytest.fixture
+def rsa_key():
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = jwk.construct(pem, algorithm="RS256").public_key().to_dict()
+    return pem, {**public, "kid": "key-2", "alg": "RS256", "use": "sig"}
+
+
+class FakeJWKSEndpoint:
+    def __init__(self, keys):
+        self.keys = keys
+        self.calls = 0
+
+    def __call__(self, url, timeout=None):
+        self.calls += 1
+        endpoint = self
+
+        class Response:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return {"keys": endpoint.keys}
+
+        return Response()
+
+
+def test_hs256_token_is_verified_locally():
+    verifier = LocalTokenVerifier(supabase_url=None, jwt_secret=SECRET)
+    token = jwt.encode(_claims(), SECRET, algorithm="HS256")
+
+    assert verifier.verify(token)["sub"] == "user-1"
+
+    with pytest.raises(JWTError):
+        verifier.verify(jwt.encode(_claims(), "other-secret", algorithm="HS256"))
+
+
+def test_expired_or_wrong_audience_token_is_rejected():
+    verifier = LocalTokenVerifier(supabase_url=None, jwt_secret=SECRET, leeway=0)
+
+    with pytest.raises(JWTError):
+        verifier.verify(jwt.encode(_claims(exp=int(time.time()) - 60), SECRET, algorithm="HS256"))
+    with pytest.raises(JWTError):
+        verifier.verify(jwt.encode(_claims(aud="anon"), SECRET, algorithm="HS256"))
+
+
+def test_unknown_key_id_is_fetched_then_refreshes_are_rate_limited(rsa_key, monkeypatch):
+    pem, public = rsa_key
+    endpoint = FakeJWKSEndpoint([])
+    monkeypatch.setattr(security.httpx, "get", endpoint)
+    verifier = LocalTokenVerifier(supabase_url="https://project.supabase.co")
+    token = jwt.encode(_claims(), pem, algorithm="RS256", headers={"kid": "key-2"})
+
+    verifier.refresh_jwks(force=True)
+    assert verifier.verify(token) is None  # no key yet: the caller falls back to Supabase
+    assert verifier.missing_signing_key(token)
+
+    # The key is rotated in, but refreshes within 30 s of the last one are skipped.
+    endpoint.keys = [public]
+    verifier.refresh_jwks()
+    assert endpoint.calls == 1
+    assert verifier.verify(token) is None
+
+    verifier._last_refresh_attempt -= 31
+    verifier.refresh_jwks()
+    assert endpoint.calls == 2
+    assert not verifier.missing_signing_key(token)
+    assert verifier.verify(token)["sub"] == "user-1"
+
+
+def test_header_algorithm_must_match_the_signing_key(rsa_key, monkeypatch):
+    pem, public = rsa_key
+    monkeypatch.setattr(security.httpx, "get", FakeJWKSEndpoint([public]))
+    verifier = LocalTokenVerifier(supabase_url="https://project.supabase.co")
+    verifier.refresh_jwks(force=True)
+    token = jwt.encode(_claims(), pem, algorithm="RS256", headers={"kid": "key-2"})
+    header, payload, signature = token.split(".")
+    forged_header = jwt.encode({}, "x", algorithm="HS256", headers={"alg": "ES256", "kid": "key-2"}).split(".")[0]
+
+    with pytest.raises(JWTError):
+        verifier.verify(f"{forged_header}.{payload}.{signature}")
+
+    verifier._keys["key-2"] = {**public, "alg": "RS512"}  # key pinned to another algorithm
+    with pytest.raises(JWTError):
+        verifier.verify(token)
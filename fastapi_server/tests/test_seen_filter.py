@@ -0,0 +1,93 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, feed_window, models, schemas
+from fastapi_server.database import Base
+from fastapi_server.seen_filter import BloomFilter, bloom_parameters, seen_filters
+from fastapi_server.social_graph import social_graph
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed_window, "REFRESH_SECONDS", 0)
+    feed_window.candidate_window.clear()
+    social_graph.clear()
+    seen_filters.clear()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'seen.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("viewer", "author"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    session.commit()
+    yield session
+    session.close()
+    feed_window.candidate_window.clear()
+    social_graph.clear()
+    seen_filters.clear()
+
+
+def test_false_positive_rate_matches_the_sizing():
+    bits, hashes = bloom_parameters(2000, 0.01)
+    bloom = BloomFilter(bits, hashes)
+    for post_id in range(1, 2001):
+        bloom.add(post_id)
+
+    assert all(post_id in bloom for post_id in range(1, 2001))
+    false_positives = sum(post_id in bloom for post_id in range(100_000, 120_000))
+    assert false_positives / 20_000 < 0.02
+    assert bloom.estimated_fp_rate() == pytest.approx(0.01, rel=0.2)
+    assert bloom.nbytes() == (bits + 7) // 8
+
+
+def test_seen_posts_are_filtered_from_the_feed(db):
+    posts = [crud.create_post_transactional(db, schemas.PostCreate(caption=f"p{i}"), "author")["id"] for i in range(4)]
+    assert set(crud.rank_feed_post_ids(db, "viewer")) == set(posts)
+
+    # Seen through this worker (hook) and through another one (picked up by the incremental sync).
+    crud.mark_post_as_seen_transactional(db, "viewer", posts[0])
+    db.add(models.SeenPost(user_id="viewer", post_id=posts[1]))
+    db.commit()
+
+    assert set(crud.rank_feed_post_ids(db, "viewer")) == set(posts[2:])
+    stats = seen_filters.stats()
+    assert stats["size"] == 1 and stats["total_bytes"] == stats["bytes_per_user"]
+
+
+def test_recently_seen_posts_do_not_use_up_the_quotas(db, monkeypatch):
+    from fastapi_server import feed_sources
+
+    monkeypatch.setattr(feed_sources, "SOURCE_QUOTAS", {**feed_sources.SOURCE_QUOTAS, "friends": 2, "university": 0, "groups": 0, "trending": 0})
+    posts = [crud.create_post_transactional(db, schemas.PostCreate(caption=f"p{i}"), "viewer")["id"] for i in range(4)]
+    crud.rank_feed_post_ids(db, "viewer")
+    for post_id in posts[2:]:  # the two newest, which the friends quota would pick first
+        crud.mark_post_as_seen_transactional(db, "viewer", post_id)
+
+    assert set(crud.rank_feed_post_ids(db, "viewer")) == set(posts[:2])
+
+
+def test_false_positive_rebuilds_are_rate_limited(monkeypatch):
+    from fastapi_server import seen_filter
+
+    monkeypatch.setattr(seen_filter, "CAPACITY", 10)
+    cache = seen_filter.SeenFilterCache(maxsize=10, ttl=60)
+    now = datetime.now(timezone.utc)
+    cache.sync("viewer", [1], now, full=True)
+    seen = cache.sync("viewer", range(2, 101), now, full=False)
+    assert seen.bloom.estimated_fp_rate() > 2 * seen_filter.FP_RATE
+
+    assert cache.sync_since("viewer", now)[1] is False  # built moments ago
+    seen.built_at -= seen_filter.MIN_REBUILD_SECONDS
+    assert cache.sync_since("viewer", now)[1] is True
+    # Already at the byte cap, a rebuild wouldn't get any bigger; only age rebuilds it.
+    monkeypatch.setattr(seen_filter, "MAX_BYTES", seen.bloom.nbytes())
+    assert cache.sync_since("viewer", now)[1] is False
@@ -0,0 +1,108 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import time
+
+import pytest
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models, social_graph as social_graph_module
+from fastapi_server.database import Base
+from fastapi_server.social_graph import SocialGraph, social_graph
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(social_graph_module, "RELOAD_SECONDS", 0)
+    social_graph.clear()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'graph.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("ada", "bola", "chidi", "dayo"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    session.add(models.Follow(follower_id="ada", following_id="bola"))
+    session.add(models.Follow(follower_id="chidi", following_id="bola"))
+    session.add(models.FriendRequest(sender_id="ada", receiver_id="chidi", status="accepted"))
+    session.add(models.FriendRequest(sender_id="dayo", receiver_id="chidi", status="accepted"))
+    session.add(models.FriendRequest(sender_id="bola", receiver_id="ada", status="pending"))
+    session.commit()
+    yield session
+    session.close()
+    social_graph.clear()
+
+
+def test_lookups_match_the_tables(db):
+    graph = SocialGraph()
+    assert graph.following(db, "ada") == {"bola"}
+    assert graph.followers(db, "bola") == {"ada", "chidi"}
+    assert graph.friends(db, "chidi") == {"ada", "dayo"}
+    assert graph.mutual_friends(db, "ada", "dayo") == {"chidi"}
+    assert graph.friends(db, "bola") == frozenset()
+    assert graph.following(db, "nobody") == frozenset()
+    assert graph.check_consistency(db)["consistent"]
+
+    memory = graph.memory_report()
+    assert memory["users"] == 4 and memory["edges"] == 8
+    assert memory["total_bytes"] > 0
+
+
+def test_crud_hooks_keep_the_graph_current(db):
+    social_graph.load(db)
+    loads = social_graph.loads
+    crud.follow_user_transactional(db, "dayo", "bola")
+    crud.unfollow_user_transactional(db, "ada", "bola")
+    request = crud.get_existing_friend_request(db, "bola", "ada")
+    crud.update_friend_request_status(db, request, "accepted")
+
+    assert social_graph.followers(db, "bola") == {"chidi", "dayo"}
+    assert social_graph.friends(db, "ada") == {"bola", "chidi"}
+    assert {u.id for u in crud.get_friends(db, "ada")} == {"bola", "chidi"}
+    assert social_graph.check_consistency(db)["consistent"]
+    assert social_graph.loads == loads
+
+    social_graph._compact_locked()
+    assert social_graph.followers(db, "bola") == {"chidi", "dayo"}
+    assert social_graph.stats()["overlay_edges"] == 0
+
+
+def test_consistency_check_reports_writes_that_bypassed_the_hooks(db):
+    social_graph.load(db)
+    db.execute(delete(models.Follow).where(models.Follow.follower_id == "ada"))
+    db.commit()
+
+    report = social_graph.check_consistency(db)
+    assert not report["consistent"]
+    assert report["following"]["extra"] == 1
+    assert report["following"]["sample_extra"] == [("ada", "bola")]
+
+
+def test_declining_a_duplicate_request_keeps_the_friendship(db):
+    social_graph.load(db)
+    duplicate = models.FriendRequest(sender_id="chidi", receiver_id="ada", status="pending")
+    db.add(duplicate)
+    db.commit()
+
+    crud.update_friend_request_status(db, duplicate, "rejected")
+    assert social_graph.friends(db, "ada") == {"chidi"}
+
+
+def test_stale_graph_reloads_from_its_own_session(db, monkeypatch):
+    from fastapi_server import database
+
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    social_graph.load(db)
+    loads = social_graph.loads
+    monkeypatch.setattr(social_graph_module, "RELOAD_SECONDS", 0.01)
+    social_graph.last_load -= 1
+
+    social_graph.refresh(None)  # the caller's session isn't used for the reload
+    for _ in range(200):
+        if social_graph.loads > loads and not social_graph._reloading:
+            break
+        time.sleep(0.01)
+    assert social_graph.loads == loads + 1
@@ -0,0 +1,83 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from sqlalchemy import create_engine, delete, event
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_server import crud, models, schemas, view_buffer
+from fastapi_server.database import Base
+from fastapi_server.seen_filter import seen_filters
+from fastapi_server.view_buffer import ViewBuffer
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # Flushes are driven by the tests, not the background thread.
+    monkeypatch.setattr(view_buffer, "FLUSH_SECONDS", 3600)
+    engine = create_engine(f"sqlite:///{tmp_path / 'views.db'}")
+    Base.metadata.create_all(bind=engine)
+    seen_filters.clear()
+    yield engine
+    seen_filters.clear()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    for uid in ("viewer", "author"):
+        session.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_views_coalesce_and_flush_in_one_transaction(engine, db):
+    posts = [crud.create_post_transactional(db, schemas.PostCreate(caption=f"p{i}"), "author")["id"] for i in range(50)]
+    deleted = posts.pop()
+    db.execute(delete(models.Post).where(models.Post.id == deleted))
+    db.commit()
+
+    buffer = ViewBuffer(session_factory=sessionmaker(bind=engine))
+    for _ in range(3):  # the same posts scrolled past three times
+        buffer.add("viewer", posts + [deleted])
+    assert buffer.stats()["pending"] == 50
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    assert buffer.flush() == 49
+    assert len(commits) == 1
+    assert db.query(models.SeenPost).filter(models.SeenPost.user_id == "viewer").count() == 49
+
+    buffer.add("viewer", posts[:5])
+    assert buffer.flush() == 5  # re-views update seen_at in place
+    assert db.query(models.SeenPost).count() == 49
+    assert buffer.stats()["coalesced"] == 100
+
+
+def test_failed_flush_requeues_views(engine, db):
+    post_id = crud.create_post_transactional(db, schemas.PostCreate(caption="p"), "author")["id"]
+    broken = sessionmaker(bind=create_engine("sqlite:///file:missing?mode=ro&uri=true"))
+    buffer = ViewBuffer(session_factory=broken)
+    buffer.add("viewer", [post_id])
+
+    with pytest.raises(Exception):
+        buffer.flush()
+    assert buffer.stats()["pending"] == 1 and buffer.errors == 1
+    assert buffer.flush(db) == 1
+
+
+def test_flush_falls_back_to_row_by_row_upserts(engine, db, monkeypatch):
+    # Dialects without ON CONFLICT update existing rows and insert the rest.
+    monkeypatch.setattr(view_buffer, "UPSERT_DIALECTS", {})
+    posts = [crud.create_post_transactional(db, schemas.PostCreate(caption=f"p{i}"), "author")["id"] for i in range(3)]
+    buffer = ViewBuffer(session_factory=sessionmaker(bind=engine))
+
+    buffer.add("viewer", posts[:2])
+    assert buffer.flush() == 2
+    buffer.add("viewer", posts)
+    assert buffer.flush() == 3
+    assert db.query(models.SeenPost).count() == 3
@@ -0,0 +1,181 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.websockets import WebSocketDisconnect
+
+from fastapi_server import crud, dependencies, models, ws_chat
+from fastapi_server.backplane import LocalBackplane
+from fastapi_server.cache import Principal, principal_cache
+from fastapi_server.routers import messages
+from fastapi_server.ws_connections import ConnectionRegistry
+
+
+async def _authenticate(token, db, adb=None):
+    # Tokens in these tests are "<user id>-token".
+    if not token.endswith("-token"):
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    uid = token[: -len("-token")]
+    return Principal(id=uid, username=uid, role="user", is_active=True)
+
+
+@pytest.fixture
+def chat(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(dependencies, "SessionLocal", factory)
+    monkeypatch.setattr(dependencies, "authenticate_token", _authenticate)
+    monkeypatch.setattr(messages.manager, "registry", ConnectionRegistry(ping_interval=0))
+    monkeypatch.setattr(messages.manager, "backplane", LocalBackplane())
+    principal_cache.clear()
+
+    with factory() as db:
+        for uid in ["alice", "bob", "carol"]:
+            db.add(models.User(id=uid, username=uid, email=f"{uid}@example.com", role="user", is_active=True))
+        db.commit()
+        conversation_id = crud.get_or_create_direct_conversation(db, "alice", "bob")
+        db.commit()
+    # One app and one client context, so every socket is served on the same event loop.
+    api = FastAPI()
+    api.include_router(messages.router)
+    with TestClient(api) as client:
+        yield client, factory, conversation_id
+    principal_cache.clear()
+
+
+def _login(ws, uid):
+    ws.send_json({"type": "auth", "token": f"{uid}-token"})
+    assert ws.receive_json() == {"type": "auth_ok", "user_id": uid}
+
+
+def test_send_over_socket_acks_and_fans_out(chat, monkeypatch):
+    client, factory, conversation_id = chat
+    lookups = []
+    lookup = crud.get_conversation_participant_ids
+    monkeypatch.setattr(crud, "get_conversation_participant_ids", lambda db, cid: lookups.append(cid) or lookup(db, cid))
+
+    with client.websocket_connect("/conversations/ws/bob?token=bob-token") as bob:
+        assert bob.receive_json() == {"type": "auth_ok", "user_id": "bob"}
+        with client.websocket_connect("/conversations/ws/alice") as alice:
+            _login(alice, "alice")
+            for n in range(2):
+                alice.send_json({"type": "send", "client_id": f"c{n}", "conversation_id": conversation_id, "content": f"hi {n}"})
+                ack = alice.receive_json()
+                assert ack["type"] == "ack" and ack["client_id"] == f"c{n}"
+                assert alice.receive_json() == {"type": "new_message", "message": ack["message"]}
+                assert bob.receive_json() == {"type": "new_message", "message": ack["message"]}
+
+            bob.send_json({"type": "read", "conversation_id": conversation_id})
+            read = {"type": "read", "conversation_id": conversation_id, "message_id": None, "user_id": "bob"}
+            assert alice.receive_json() == read
+            assert bob.receive_json() == read
+
+    assert lookups == [conversation_id, conversation_id]  # once per socket, not per frame
+    with factory() as db:
+        stored = db.query(models.Message).filter(models.Message.conversation_id == conversation_id).all()
+        assert [(m.sender_id, m.content, m.is_read) for m in stored] == [("alice", "hi 0", True), ("alice", "hi 1", True)]
+
+
+def test_frames_need_membership(chat):
+    client, factory, conversation_id = chat
+    with client.websocket_connect("/conversations/ws/carol") as carol:
+        _login(carol, "carol")
+        carol.send_json({"type": "send", "client_id": "x", "conversation_id": conversation_id, "content": "hey"})
+        error = carol.receive_json()
+        assert (error["code"], error["client_id"]) == ("forbidden", "x")
+
+        carol.send_text("not json")
+        assert carol.receive_json()["code"] == "bad_frame"
+        carol.send_json({"type": "send", "conversation_id": "7"})
+        assert carol.receive_json()["code"] == "bad_frame"
+
+    with factory() as db:
+        assert db.query(models.Message).count() == 0
+
+
+def test_sockets_must_authenticate_before_registering(chat, monkeypatch):
+    client, _, conversation_id = chat
+    monkeypatch.setattr(messages.manager, "registry", ConnectionRegistry(max_per_user=1, ping_interval=0))
+    monkeypatch.setattr(ws_chat, "AUTH_TIMEOUT_SECONDS", 0.2)
+
+    with client.websocket_connect("/conversations/ws/alice?token=alice-token") as alice:
+        assert alice.receive_json() == {"type": "auth_ok", "user_id": "alice"}
+
+        # Neither a frame other than auth, nor silence, gets a socket registered,
+        # so they can't push alice's authenticated device out.
+        with client.websocket_connect("/conversations/ws/alice") as intruder:
+            intruder.send_json({"type": "send", "client_id": "x", "conversation_id": conversation_id, "content": "hey"})
+            assert intruder.receive_json()["code"] == "unauthenticated"
+            with pytest.raises(WebSocketDisconnect) as closed:
+                intruder.receive_json()
+            assert closed.value.code == 1008
+        with client.websocket_connect("/conversations/ws/alice") as silent:
+            assert silent.receive_json()["code"] == "unauthenticated"
+            with pytest.raises(WebSocketDisconnect):
+                silent.receive_json()
+
+        assert len(messages.manager.registry.connections("alice")) == 1
+        alice.send_json({"type": "ping"})
+        assert alice.receive_json() == {"type": "pong"}
+
+
+def test_token_for_another_user_closes_the_socket(chat):
+    client, _, _ = chat
+    with client.websocket_connect("/conversations/ws/alice") as ws:
+        ws.send_json({"type": "auth", "token": "bob-token"})
+        assert ws.receive_json()["code"] == "unauthenticated"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 1008
+
+
+def _assert_refused(ws, detail):
+    error = ws.receive_json()
+    assert (error["code"], error["detail"]) == ("unauthenticated", detail)
+    with pytest.raises(WebSocketDisconnect) as closed:
+        ws.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_suspended_account_is_disconnected_on_its_next_frame(chat):
+    client, factory, conversation_id = chat
+    with client.websocket_connect("/conversations/ws/alice?token=alice-token") as alice:
+        assert alice.receive_json() == {"type": "auth_ok", "user_id": "alice"}
+        alice.send_json({"type": "ping"})
+        assert alice.receive_json() == {"type": "pong"}
+
+        with factory() as db:
+            crud.toggle_user_active(db, "alice")  # also drops alice from principal_cache
+        alice.send_json({"type": "send", "client_id": "c0", "conversation_id": conversation_id, "content": "hi"})
+        _assert_refused(alice, "Your account has been suspended.")
+
+    with factory() as db:
+        assert db.query(models.Message).count() == 0
+
+
+def test_expired_token_closes_the_socket(chat):
+    client, _, conversation_id = chat
+    with client.websocket_connect("/conversations/ws/alice?token=alice-token") as alice:
+        assert alice.receive_json() == {"type": "auth_ok", "user_id": "alice"}
+        (connection,) = messages.manager.registry.connections("alice")
+        connection.expires_at = time.monotonic() - 1
+
+        alice.send_json({"type": "read", "conversation_id": conversation_id})
+        _assert_refused(alice, "Token expired.")
+
+
+def test_token_expiry_comes_from_the_exp_claim():
+    token = jwt.encode({"sub": "alice", "exp": int(time.time()) + 600}, "secret", algorithm="HS256")
+    assert ws_chat.token_expiry(token) == pytest.approx(time.monotonic() + 600, abs=2)
+    assert ws_chat.token_expiry("alice-token") is None
@@ -0,0 +1,204 @@
+import sys
+import os
+
+# Add project root directory to path to allow importing fastapi_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import asyncio
+
+from fastapi_server.ws_connections import (
+    CLOSE_IDLE,
+    CLOSE_SLOW_CONSUMER,
+    CLOSE_TOO_MANY_SOCKETS,
+    CLOSE_UNAUTHORIZED,
+    PING,
+    TOKEN_EXPIRED,
+    ConnectionRegistry,
+)
+
+
+class FakeSocket:
+    def __init__(self, stalled: bool = False):
+        self.received = []
+        self.closed_with = None
+        self.stalled = stalled
+
+    async def send_json(self, message):
+        if self.stalled:
+            await asyncio.Event().wait()  # a client that stopped reading
+        self.received.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _drain():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_every_device_of_a_user_receives():
+    async def scenario():
+        registry = ConnectionRegistry()
+        phone, laptop = FakeSocket(), FakeSocket()
+        registry.add("alice", phone)
+        tab = registry.add("alice", laptop)
+
+        assert registry.send({"n": 1}, ["alice", "nobody"]) == 2
+        await _drain()
+        assert phone.received == laptop.received == [{"n": 1}]
+
+        registry.remove(tab)
+        registry.send({"n": 2}, ["alice"])
+        await _drain()
+        assert phone.received == [{"n": 1}, {"n": 2}]
+        assert laptop.received == [{"n": 1}]
+        assert registry.stats()["sockets"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_is_closed_without_blocking_others():
+    async def scenario():
+        registry = ConnectionRegistry(queue_size=3, overflow_policy="close")
+        slow, fast = FakeSocket(stalled=True), FakeSocket()
+        registry.add("slow", slow)
+        registry.add("fast", fast)
+
+        for n in range(10):
+            registry.send({"n": n}, ["slow", "fast"])
+            await _drain()
+
+        assert [m["n"] for m in fast.received] == list(range(10))
+        assert slow.closed_with == CLOSE_SLOW_CONSUMER
+        assert not registry.is_connected("slow")
+        assert registry.stats()["slow_closed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_drop_oldest_keeps_the_connection_and_the_latest_messages():
+    async def scenario():
+        registry = ConnectionRegistry(queue_size=2, overflow_policy="drop_oldest")
+        conn = registry.add("alice", FakeSocket(stalled=True))
+
+        for n in range(5):
+            registry.send({"n": n}, ["alice"])
+
+        assert registry.is_connected("alice")
+        assert [conn.queue.get_nowait()["n"] for _ in range(conn.queue.qsize())] == [3, 4]
+        assert conn.dropped == registry.dropped == 3
+
+    asyncio.run(scenario())
+
+
+def test_oldest_socket_is_closed_past_the_per_user_limit():
+    async def scenario():
+        registry = ConnectionRegistry(max_per_user=2)
+        sockets = [FakeSocket() for _ in range(3)]
+        for socket in sockets:
+            registry.add("alice", socket)
+        assert len(registry._closing) == 1  # held until the close finishes
+        await _drain()
+
+        assert sockets[0].closed_with == CLOSE_TOO_MANY_SOCKETS
+        assert not registry._closing
+        assert [c.websocket for c in registry.connections("alice")] == sockets[1:]
+
+    asyncio.run(scenario())
+
+
+def test_heartbeat_pings_live_sockets_and_reaps_silent_ones():
+    async def scenario():
+        registry = ConnectionRegistry(ping_interval=0, idle_timeout=60)
+        silent, chatty, listener = FakeSocket(), FakeSocket(), FakeSocket()
+        gone = registry.add("alice", silent)
+        alive = registry.add("bob", chatty)
+        registry.add("carol", listener)  # receive-only: has never sent a frame
+        registry.touch(gone)
+        registry.touch(alive)
+        now = gone.last_seen + 61
+        alive.last_seen = now - 5  # a pong arrived recently
+
+        assert registry.heartbeat(now=now) == 1
+        await _drain()
+
+        assert silent.closed_with == CLOSE_IDLE
+        assert chatty.received == [PING]
+        assert listener.received == [PING] and listener.closed_with is None
+        assert not registry.is_connected("alice")
+        stats = registry.stats()
+        assert (stats["sockets"], stats["reaped"], stats["pings"]) == (2, 1, 2)
+        assert stats["bytes_per_socket"] > 0
+
+    asyncio.run(scenario())
+
+
+def test_receive_only_sockets_are_reaped_after_missed_pings():
+    async def scenario():
+        registry = ConnectionRegistry(ping_interval=0, idle_timeout=60, max_missed_pings=3)
+        dead, listening = FakeSocket(), FakeSocket()
+        registry.add("alice", dead)
+        quiet = registry.add("bob", listening)
+        for _ in range(3):
+            registry.heartbeat()
+            await _drain()
+        registry.touch(quiet)  # bob answers the third ping
+
+        assert registry.heartbeat() == 1
+        await _drain()
+
+        assert dead.received == [PING] * 3 and dead.closed_with == CLOSE_IDLE
+        assert listening.closed_with is None and quiet.unanswered == 1
+
+    asyncio.run(scenario())
+
+
+def test_socket_memory_includes_queued_messages():
+    async def scenario():
+        registry = ConnectionRegistry()
+        idle = registry.add("alice", FakeSocket())
+        busy = registry.add("bob", FakeSocket(stalled=True))
+        await _drain()
+        registry.send({"type": "new_message", "message": {"content": "x" * 1000}}, ["bob"] * 5)
+
+        stats = registry.stats()
+        assert busy.approx_bytes() > idle.approx_bytes()
+        assert stats["socket_bytes"] == idle.approx_bytes() + busy.approx_bytes()
+        assert stats["max_socket_bytes"] == busy.approx_bytes()
+        assert stats["bytes_per_socket"] == round(stats["socket_bytes"] / 2)
+
+    asyncio.run(scenario())
+
+
+def test_reaper_runs_on_its_own_and_stops_when_idle():
+    async def scenario():
+        registry = ConnectionRegistry(ping_interval=0.01, idle_timeout=0.03)
+        socket = FakeSocket()
+        registry.touch(registry.add("alice", socket))
+
+        await asyncio.sleep(0.2)
+
+        assert socket.closed_with == CLOSE_IDLE
+        assert PING in socket.received
+        assert registry._reaper is None
+
+    asyncio.run(scenario())
+
+
+def test_heartbeat_closes_sockets_whose_token_expired():
+    async def scenario():
+        registry = ConnectionRegistry(ping_interval=0, idle_timeout=60)
+        expired, valid = FakeSocket(), FakeSocket()
+        conn = registry.add("alice", expired)
+        registry.add("bob", valid).expires_at = conn.last_seen + 3600
+        conn.expires_at = conn.last_seen + 10
+
+        assert registry.heartbeat(now=conn.last_seen + 11) == 0
+        await _drain()
+
+        assert expired.received == [TOKEN_EXPIRED] and expired.closed_with == CLOSE_UNAUTHORIZED
+        assert valid.received == [PING] and valid.closed_with is None
+        assert registry.stats()["expired"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,219 @@
+# view_buffer.py
+"""
+Write-behind buffer for post views.
+
+Clients report every post scrolled past. Each report used to be its own
+`db.merge(SeenPost)` and commit. Views are now buffered per worker, keyed by
+(user_id, post_id) so repeats coalesce into the latest timestamp. A background
+thread flushes them every VIEW_FLUSH_SECONDS, or sooner once VIEW_FLUSH_SIZE
+pairs are pending. A flush is one transaction:
+
+  1. SELECT id FROM posts WHERE id IN (...)    drops views of deleted posts (FK)
+  2. INSERT INTO seen_posts ... VALUES (...), (...), ...
+     ON CONFLICT (user_id, post_id) DO UPDATE SET seen_at = excluded.seen_at
+     (on dialects without ON CONFLICT: an UPDATE per row, then an INSERT in a
+     savepoint for rows that weren't there)
+
+The viewer's seen filter (seen_filter.py) is updated when the view is buffered,
+so this worker's feed hides the post immediately. Other workers see it after the
+flush. Views still buffered when a worker dies are lost; the shutdown hook in
+main.py flushes on a clean stop. A failed flush puts its views back, up to
+VIEW_BUFFER_MAX_PENDING.
+
+VIEW_BUFFER_ENABLED=false writes each view synchronously as before.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .seen_filter import seen_filters
+
+logger = logging.getLogger(__name__)
+
+BUFFER_ENABLED = os.getenv("VIEW_BUFFER_ENABLED", "true").lower() in {"1", "true", "yes"}
+FLUSH_SECONDS = float(os.getenv("VIEW_FLUSH_SECONDS", "2"))
+FLUSH_SIZE = int(os.getenv("VIEW_FLUSH_SIZE", "500"))
+MAX_PENDING = int(os.getenv("VIEW_BUFFER_MAX_PENDING", "50000"))
+# Rows per INSERT statement; keeps bind parameters well under driver limits.
+CHUNK_SIZE = 1000
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _set_seen_at(db: Session, row: dict) -> int:
+    table = models.SeenPost.__table__
+    return db.execute(
+        update(table)
+        .where(table.c.user_id == row["user_id"], table.c.post_id == row["post_id"])
+        .values(seen_at=row["seen_at"])
+    ).rowcount
+
+
+def _upsert_row_by_row(db: Session, rows: List[dict]) -> None:
+    # A row inserted concurrently between the UPDATE and the INSERT fails the
+    # savepoint only; it then exists, so the UPDATE is retried.
+    for row in rows:
+        if _set_seen_at(db, row):
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.SeenPost.__table__).values(row))
+        except IntegrityError:
+            _set_seen_at(db, row)
+
+
+def upsert_seen_posts(db: Session, views: Dict[Tuple[str, int], datetime]) -> int:
+    """Writes (user_id, post_id) -> seen_at views for posts that still exist; returns rows written."""
+    if not views:
+        return 0
+    post_ids = {post_id for _, post_id in views}
+    existing = {
+        pid for (pid,) in db.query(models.Post.id).filter(models.Post.id.in_(post_ids))
+    }
+    rows = [
+        {"user_id": user_id, "post_id": post_id, "seen_at": seen_at}
+        for (user_id, post_id), seen_at in views.items()
+        if post_id in existing
+    ]
+    if not rows:
+        return 0
+    upsert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if upsert is None:
+        _upsert_row_by_row(db, rows)
+        return len(rows)
+    table = models.SeenPost.__table__
+    for start in range(0, len(rows), CHUNK_SIZE):
+        stmt = upsert(table).values(rows[start:start + CHUNK_SIZE])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.post_id],
+            set_={"seen_at": stmt.excluded.seen_at},
+        ))
+    return len(rows)
+
+
+class ViewBuffer:
+    def __init__(self, session_factory=None):
+        # Defaults to database.SessionLocal (imported lazily so tests can swap engines first).
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, int], datetime] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.received = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    def add(self, user_id: str, post_ids: Iterable[int]) -> int:
+        """Buffers views of `post_ids` by `user_id`; returns how many were accepted."""
+        post_ids = list(post_ids)
+        now = datetime.now(timezone.utc)
+        accepted = 0
+        with self._lock:
+            for post_id in post_ids:
+                key = (user_id, post_id)
+                if key in self._pending:
+                    self.coalesced += 1
+                elif len(self._pending) >= MAX_PENDING:
+                    self.dropped += 1
+                    continue
+                self._pending[key] = now
+                accepted += 1
+            self.received += accepted
+            pending = len(self._pending)
+        for post_id in post_ids:
+            seen_filters.add(user_id, post_id)
+        self._ensure_flusher()
+        if pending >= FLUSH_SIZE:
+            self._wake.set()
+        return accepted
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="view-buffer-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"[view-buffer] Flush failed: {e}")
+
+    def flush(self, db: Session = None) -> int:
+        """Writes every pending view in one transaction; returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                views, self._pending = self._pending, {}
+            if not views:
+                return 0
+            started = time.perf_counter()
+            own_session = db is None
+            if own_session:
+                factory = self.session_factory
+                if factory is None:
+                    from .database import SessionLocal as factory
+                db = factory()
+            try:
+                written = upsert_seen_posts(db, views)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.errors += 1
+                self._requeue(views)
+                raise
+            finally:
+                if own_session:
+                    db.close()
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000.0, 2)
+            return written
+
+    def _requeue(self, views: Dict[Tuple[str, int], datetime]) -> None:
+        with self._lock:
+            for key, seen_at in views.items():
+                if key in self._pending:
+                    continue  # a newer view of the same post arrived meanwhile
+                if len(self._pending) >= MAX_PENDING:
+                    self.dropped += 1
+                    continue
+                self._pending[key] = seen_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending = {}
+
+    def stats(self) -> dict:
+        return {
+            "enabled": BUFFER_ENABLED,
+            "pending": len(self._pending),
+            "received": self.received,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_flush_ms": self.last_flush_ms,
+            "flush_seconds": FLUSH_SECONDS,
+            "flush_size": FLUSH_SIZE,
+        }
+
+
+view_buffer = ViewBuffer()
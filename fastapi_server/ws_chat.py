@@ -0,0 +1,319 @@
+# ws_chat.py
+"""
+Chat frames sent by clients over /conversations/ws/{user_id}.
+
+The socket used to be receive-only. Each chat message went through
+POST /conversations/messages/, which repeated the Supabase token check,
+is_user_in_conversation, create_message (with a sender and profile reload) and
+_sync_get_full_message for every send. A `ChatSession` now handles frames on
+the open socket. The client authenticates once, and after that each send is one
+INSERT ... RETURNING.
+
+Authentication comes first. `handshake` reads the token from ?token= or from
+the first frame, {"type": "auth", "token": "<access token>"}, which must arrive
+within WS_AUTH_TIMEOUT_SECONDS. The socket joins the registry only once the
+token checks out and belongs to the user in the URL, so an unauthenticated
+socket never counts towards WS_MAX_SOCKETS_PER_USER and can't push a user's
+devices out. A missing, late or bad token gets an error frame and a 1008 close.
+
+The principal is checked again before each frame is handled. It is read from
+principal_cache, and from the users table when the entry has expired or been
+invalidated, e.g. by toggle_user_active. A suspended or deleted account, or a
+token past its exp, gets the same error frame and 1008 close. The heartbeat
+closes sockets whose token expired even if they never send anything. Clients
+keep a socket open past exp by re-authenticating with a refreshed token:
+
+  {"type": "auth", "token": "<access token>"}
+      -> {"type": "auth_ok", "user_id": ...}. Re-authenticates, e.g. with a
+         refreshed token; a bad one closes the socket as above.
+  {"type": "send", "client_id": "c-42", "conversation_id": 7, "content": "hi"}
+      -> {"type": "ack", "client_id": "c-42", "message": {...}} to this socket,
+         with the server-assigned id and created_at, then the usual
+         {"type": "new_message"} broadcast to the participants (including this
+         user's other devices).
+  {"type": "ack", "conversation_id": 7, "message_id": 123}
+      the client received a message. The other participants get
+      {"type": "delivered", ...}. Nothing is stored.
+  {"type": "read", "conversation_id": 7, "message_id": 123}
+      marks the other participants' messages read, up to message_id when it
+      is given, and broadcasts {"type": "read", ...} to the participants.
+  {"type": "ping"} -> {"type": "pong"}. {"type": "pong"} answers the heartbeat.
+
+Failures get {"type": "error", "code": ..., "detail": ..., "client_id": ...} and
+the socket stays open. Codes: bad_frame, unauthenticated, forbidden, failed.
+
+Each session caches the participant ids of the conversations it touches for
+WS_MEMBERSHIP_TTL_SECONDS. One query answers both "may this user post here?"
+and "who receives it?". A participant removed from a conversation can keep
+posting to it from an open socket until the entry expires.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from jose import jwt
+
+from . import crud, dependencies, schemas
+from .cache import Principal, principal_cache
+from .security import JWTError
+from .ws_connections import CLOSE_UNAUTHORIZED, ClientConnection
+
+logger = logging.getLogger(__name__)
+
+AUTH_TIMEOUT_SECONDS = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+MEMBERSHIP_TTL_SECONDS = float(os.getenv("WS_MEMBERSHIP_TTL_SECONDS", "60"))
+# Conversations cached per socket; the oldest entry is dropped past this.
+MAX_CACHED_CONVERSATIONS = 256
+
+
+class FrameError(Exception):
+    def __init__(self, code: str, detail: str):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+def _int_field(frame: dict, name: str, required: bool = True) -> Optional[int]:
+    value = frame.get(name)
+    if value is None and not required:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise FrameError("bad_frame", f"{name} must be an integer.")
+    return value
+
+
+def _open_session(session_factory=None):
+    # dependencies.SessionLocal is looked up per call so tests can swap it.
+    return (session_factory or dependencies.SessionLocal)()
+
+
+def _auth_error(detail: str) -> dict:
+    return {"type": "error", "code": "unauthenticated", "detail": detail, "client_id": None}
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """time.monotonic() deadline for a token's exp claim. Only call this once the token is verified."""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
+    if not isinstance(exp, (int, float)):
+        return None
+    return time.monotonic() + (exp - time.time())
+
+
+def _load_principal(db, user_id: str) -> Optional[Principal]:
+    user = crud.get_user(db, user_id)
+    return Principal.from_user(user) if user is not None else None
+
+
+async def verify_token(token: str, user_id: str, session_factory=None) -> Principal:
+    """The principal for `token` if it belongs to `user_id`; FrameError otherwise."""
+    db = _open_session(session_factory)
+    try:
+        principal = await dependencies.authenticate_token(token, db)
+    except HTTPException as e:
+        raise FrameError("unauthenticated", str(e.detail))
+    finally:
+        db.close()
+    if principal.id != user_id:
+        raise FrameError("unauthenticated", "Token does not belong to this user.")
+    return principal
+
+
+async def handshake(websocket, user_id: str, session_factory=None) -> Optional[Tuple[Principal, Optional[float]]]:
+    """
+    Authenticates an accepted socket before it is registered: ?token= or an auth
+    frame within WS_AUTH_TIMEOUT_SECONDS. Returns (principal, token expiry), or
+    None after closing the socket with 1008.
+    """
+    try:
+        token = websocket.query_params.get("token")
+        if not token:
+            try:
+                text = await asyncio.wait_for(websocket.receive_text(), AUTH_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                raise FrameError("unauthenticated", "No auth frame received in time.")
+            try:
+                frame = json.loads(text)
+            except ValueError:
+                frame = None
+            token = frame.get("token") if isinstance(frame, dict) and frame.get("type") == "auth" else None
+            if not isinstance(token, str) or not token:
+                raise FrameError("unauthenticated", "Send an auth frame first.")
+        return await verify_token(token, user_id, session_factory), token_expiry(token)
+    except FrameError as e:
+        try:
+            await websocket.send_json(_auth_error(e.detail))
+            await websocket.close(code=CLOSE_UNAUTHORIZED)
+        except Exception:
+            pass  # already gone
+        return None
+
+
+def message_payload(message: dict) -> dict:
+    """The message fields pushed to sockets; the same shape the REST send path broadcasts."""
+    return {
+        "id": message["id"],
+        "conversation_id": message["conversation_id"],
+        "content": message["content"],
+        "sender_id": message["sender_id"],
+        "created_at": message["created_at"].isoformat(),
+    }
+
+
+class ChatSession:
+    """Frames from one socket. `manager` is the ConnectionManager that owns `connection`."""
+
+    def __init__(self, manager, connection: ClientConnection, principal: Principal, session_factory=None):
+        self.manager = manager
+        self.connection = connection
+        self.session_factory = session_factory
+        self.principal = principal
+        self._participants: Dict[int, Tuple[float, List[str]]] = {}
+        self._handlers = {
+            "send": self._send,
+            "ack": self._ack,
+            "read": self._read,
+        }
+
+    def _reply(self, frame: dict) -> None:
+        self.manager.registry.send_to(self.connection, frame)
+
+    def _run(self, fn, *args):
+        db = _open_session(self.session_factory)
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    async def _db(self, fn, *args) -> Any:
+        return await asyncio.to_thread(self._run, fn, *args)
+
+    async def authenticate(self, token: str) -> bool:
+        """Re-authenticates the open socket; closes it when the token is refused."""
+        try:
+            self.principal = await verify_token(token, self.connection.user_id, self.session_factory)
+        except FrameError as e:
+            return self._refuse(e.detail)
+        self.connection.expires_at = token_expiry(token)
+        self._reply({"type": "auth_ok", "user_id": self.principal.id})
+        return True
+
+    def _refuse(self, detail: str) -> bool:
+        self.manager.registry.close(self.connection, CLOSE_UNAUTHORIZED, final=_auth_error(detail))
+        return False
+
+    async def revalidate(self) -> bool:
+        """Whether the socket's token and account are still good; closes the socket otherwise."""
+        expires_at = self.connection.expires_at
+        if expires_at is not None and time.monotonic() >= expires_at:
+            return self._refuse("Token expired.")
+        user_id = self.principal.id
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            principal = await self._db(_load_principal, user_id)
+            if principal is None:
+                return self._refuse("Account not found.")
+            principal_cache.set(user_id, principal)
+        if not principal.is_active:
+            return self._refuse("Your account has been suspended.")
+        self.principal = principal
+        return True
+
+    async def handle(self, text: str) -> None:
+        """Handles one text frame from the client."""
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            frame = None
+        if not isinstance(frame, dict):
+            self._reply({"type": "error", "code": "bad_frame", "detail": "Frames must be JSON objects.", "client_id": None})
+            return
+        kind = frame.get("type")
+        if kind == "auth":
+            token = frame.get("token")
+            if isinstance(token, str) and token:
+                await self.authenticate(token)
+            else:
+                self._refuse("token is required.")
+            return
+
+        client_id = frame.get("client_id")
+        try:
+            if not await self.revalidate():
+                return
+            if kind == "pong":
+                return
+            if kind == "ping":
+                self._reply({"type": "pong"})
+                return
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise FrameError("bad_frame", f"Unknown frame type {kind!r}.")
+            await handler(frame)
+        except FrameError as e:
+            self._reply({"type": "error", "code": e.code, "detail": e.detail, "client_id": client_id})
+        except Exception as e:
+            logger.error(f"[ws] {kind} frame from {self.connection.user_id} failed: {e}")
+            self._reply({"type": "error", "code": "failed", "detail": "Could not process the frame.", "client_id": client_id})
+
+    async def participants(self, conversation_id: int) -> List[str]:
+        """Participant ids of a conversation this user belongs to; FrameError otherwise."""
+        now = time.monotonic()
+        cached = self._participants.get(conversation_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        ids = await self._db(crud.get_conversation_participant_ids, conversation_id)
+        if self.principal.id not in ids:
+            self._participants.pop(conversation_id, None)
+            raise FrameError("forbidden", "You are not a participant of this conversation.")
+        if conversation_id not in self._participants and len(self._participants) >= MAX_CACHED_CONVERSATIONS:
+            del self._participants[next(iter(self._participants))]
+        self._participants[conversation_id] = (now + MEMBERSHIP_TTL_SECONDS, ids)
+        return ids
+
+    async def _send(self, frame: dict) -> None:
+        conversation_id = _int_field(frame, "conversation_id")
+        try:
+            msg = schemas.MessageBase(
+                content=frame.get("content"),
+                image_url=frame.get("image_url"),
+                video_url=frame.get("video_url"),
+            )
+        except ValidationError as e:
+            raise FrameError("bad_frame", str(e.errors()[0]["msg"]))
+        participant_ids = await self.participants(conversation_id)
+        message = await self._db(crud.insert_message, msg, self.principal.id, conversation_id)
+        payload = message_payload(message)
+        self._reply({"type": "ack", "client_id": frame.get("client_id"), "message": payload})
+        await self.manager.broadcast_to_conversation({"type": "new_message", "message": payload}, participant_ids)
+
+    async def _ack(self, frame: dict) -> None:
+        conversation_id = _int_field(frame, "conversation_id")
+        message_id = _int_field(frame, "message_id")
+        others = [pid for pid in await self.participants(conversation_id) if pid != self.principal.id]
+        await self.manager.broadcast_to_conversation({
+            "type": "delivered",
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "user_id": self.principal.id,
+        }, others)
+
+    async def _read(self, frame: dict) -> None:
+        conversation_id = _int_field(frame, "conversation_id")
+        message_id = _int_field(frame, "message_id", required=False)
+        participant_ids = await self.participants(conversation_id)
+        await self._db(crud.mark_conversation_read, conversation_id, self.principal.id, message_id)
+        await self.manager.broadcast_to_conversation({
+            "type": "read",
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "user_id": self.principal.id,
+        }, participant_ids)
@@ -0,0 +1,279 @@
+# ws_connections.py
+"""
+This worker's WebSocket connections, several per user.
+
+ConnectionManager used to map each user id to one WebSocket. A second device
+replaced the first, and broadcasts awaited `send_json` on each recipient in
+turn, so one slow client held up everyone after it. The registry keeps a list
+of `ClientConnection`s per user (phone, laptop, second tab). Each connection
+has a bounded outbound queue drained by its own writer task:
+
+- `send` only enqueues, with `put_nowait`, so a broadcast never waits on a
+  socket and all recipients' writers run concurrently.
+- A writer whose `send_json` takes longer than WS_SEND_TIMEOUT_SECONDS, or
+  fails, closes its connection.
+- When a queue holds WS_SEND_QUEUE_SIZE messages, WS_OVERFLOW_POLICY decides:
+    close        (default) close the socket with 1013 "try again later". The
+                 client reconnects and refetches the conversation, so it
+                 misses nothing.
+    drop_oldest  discard the oldest queued message to make room. The
+                 connection stays open but skips messages.
+- A user's oldest connection is closed once they open more than
+  WS_MAX_SOCKETS_PER_USER. Sockets are only added after they authenticate
+  (ws_chat.handshake), so only the user's own devices count towards the limit.
+
+Heartbeat: a phone that loses signal leaves a half-open socket that nothing
+reads from or writes to, so it lingered until the worker restarted and showed
+as connected. One reaper task per registry wakes every
+WS_PING_INTERVAL_SECONDS and queues {"type": "ping"} on every socket. Any frame
+from the client counts as a sign of life (clients should answer
+{"type": "pong"}). A socket that has sent at least one frame since it was
+registered and then stays silent for WS_IDLE_TIMEOUT_SECONDS is closed with
+1001. Receive-only clients, which never send anything, get a longer grace: they
+are closed the same way after WS_MAX_MISSED_PINGS pings in a row go unanswered
+(10 by default, about four minutes; 0 never closes them). A dead peer may also
+fill the queue or time out the writer on a ping first, which closes the socket
+too. WS_PING_INTERVAL_SECONDS=0 turns the heartbeat off. The same round closes
+sockets whose access token has expired (`expires_at`, set by ws_chat) with 1008,
+so a receive-only client can't keep listening on a token that is no longer
+valid.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "close").lower()
+MAX_SOCKETS_PER_USER = int(os.getenv("WS_MAX_SOCKETS_PER_USER", "10"))
+PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL_SECONDS", "25"))
+IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+MAX_MISSED_PINGS = int(os.getenv("WS_MAX_MISSED_PINGS", "10"))
+
+# WebSocket close codes: 1001 going away, 1008 policy violation, 1013 try again later.
+CLOSE_IDLE = 1001
+CLOSE_TOO_MANY_SOCKETS = 1008
+CLOSE_UNAUTHORIZED = 1008
+CLOSE_SLOW_CONSUMER = 1013
+
+PING = {"type": "ping"}
+TOKEN_EXPIRED = {"type": "error", "code": "unauthenticated", "detail": "Token expired.", "client_id": None}
+
+
+class ClientConnection:
+    __slots__ = ("user_id", "websocket", "queue", "task", "sent", "dropped", "closed", "last_seen", "heard_from", "unanswered", "expires_at")
+
+    def __init__(self, user_id: str, websocket: Any, queue_size: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self.last_seen = time.monotonic()
+        # Set by the first frame from the client; such sockets are reaped after idle_timeout.
+        self.heard_from = False
+        # Pings sent since the client's last frame; receive-only sockets are reaped on these.
+        self.unanswered = 0
+        # time.monotonic() deadline of the socket's access token, if known.
+        self.expires_at: Optional[float] = None
+
+    def approx_bytes(self) -> int:
+        """
+        This connection's own objects: itself, its queue with the messages waiting
+        in it (shallow) and its writer task. Excludes the ASGI server's buffers.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.queue) + sys.getsizeof(self.queue._queue)
+        size += sum(sys.getsizeof(m) for m in self.queue._queue)
+        if self.task is not None:
+            coro = self.task.get_coro()
+            size += sys.getsizeof(self.task) + sys.getsizeof(coro)
+            frame = getattr(coro, "cr_frame", None)
+            if frame is not None:
+                size += sys.getsizeof(frame)
+        return size
+
+
+class ConnectionRegistry:
+    def __init__(
+        self,
+        queue_size: int = None,
+        overflow_policy: str = None,
+        max_per_user: int = None,
+        ping_interval: float = None,
+        idle_timeout: float = None,
+        max_missed_pings: int = None,
+    ):
+        self.queue_size = queue_size or SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or OVERFLOW_POLICY
+        self.max_per_user = max_per_user or MAX_SOCKETS_PER_USER
+        self.ping_interval = PING_INTERVAL_SECONDS if ping_interval is None else ping_interval
+        self.idle_timeout = idle_timeout or IDLE_TIMEOUT_SECONDS
+        self.max_missed_pings = MAX_MISSED_PINGS if max_missed_pings is None else max_missed_pings
+        self._by_user: Dict[str, List[ClientConnection]] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        # The loop only keeps weak references to tasks; hold socket closes until they finish.
+        self._closing: Set[asyncio.Task] = set()
+        self.enqueued = 0
+        self.dropped = 0
+        self.slow_closed = 0
+        self.send_failures = 0
+        self.pings = 0
+        self.reaped = 0
+        self.expired = 0
+
+    def add(self, user_id: str, websocket: Any) -> ClientConnection:
+        """Registers an accepted socket and starts its writer. Must run on the event loop."""
+        conn = ClientConnection(user_id, websocket, self.queue_size)
+        conn.task = asyncio.get_running_loop().create_task(self._write(conn))
+        conns = self._by_user.setdefault(user_id, [])
+        conns.append(conn)
+        while len(conns) > self.max_per_user:
+            self.close(conns[0], CLOSE_TOO_MANY_SOCKETS)
+        if self.ping_interval > 0 and self._reaper is None:
+            self._reaper = asyncio.get_running_loop().create_task(self._run_heartbeat())
+        return conn
+
+    def touch(self, conn: ClientConnection) -> None:
+        """Records a frame from the client."""
+        conn.last_seen = time.monotonic()
+        conn.heard_from = True
+        conn.unanswered = 0
+
+    def remove(self, conn: ClientConnection) -> None:
+        if conn.closed:
+            return
+        conn.closed = True
+        conns = self._by_user.get(conn.user_id)
+        if conns is not None:
+            if conn in conns:
+                conns.remove(conn)
+            if not conns:
+                del self._by_user[conn.user_id]
+        if conn.task is not None and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+
+    def is_connected(self, user_id: str) -> bool:
+        return user_id in self._by_user
+
+    def connections(self, user_id: str) -> List[ClientConnection]:
+        return list(self._by_user.get(user_id, ()))
+
+    def send(self, message: dict, user_ids: Iterable[str]) -> int:
+        """Queues `message` on every socket of `user_ids`; returns how many sockets took it."""
+        queued = 0
+        for user_id in user_ids:
+            for conn in self.connections(user_id):
+                if self._offer(conn, message):
+                    queued += 1
+        return queued
+
+    def send_to(self, conn: ClientConnection, message: dict) -> bool:
+        """Queues `message` on one socket, e.g. a reply to a frame it sent."""
+        return self._offer(conn, message)
+
+    def _offer(self, conn: ClientConnection, message: dict) -> bool:
+        try:
+            conn.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if self.overflow_policy != "drop_oldest":
+                self.close(conn, CLOSE_SLOW_CONSUMER)
+                self.slow_closed += 1
+                return False
+            conn.queue.get_nowait()
+            conn.queue.put_nowait(message)
+            conn.dropped += 1
+            self.dropped += 1
+        self.enqueued += 1
+        return True
+
+    async def _write(self, conn: ClientConnection) -> None:
+        try:
+            while True:
+                message = await conn.queue.get()
+                await asyncio.wait_for(conn.websocket.send_json(message), SEND_TIMEOUT_SECONDS)
+                conn.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.send_failures += 1
+            logger.info(f"[ws] Closing {conn.user_id} socket after failed send: {e!r}")
+            self.close(conn, CLOSE_SLOW_CONSUMER)
+
+    def heartbeat(self, now: float = None) -> int:
+        """
+        One heartbeat round: closes sockets whose token expired, reaps those that
+        went silent and pings the rest. Returns how many were reaped.
+        """
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for conn in [c for user_conns in self._by_user.values() for c in user_conns]:
+            if conn.expires_at is not None and now >= conn.expires_at:
+                self.close(conn, CLOSE_UNAUTHORIZED, final=TOKEN_EXPIRED)
+                self.expired += 1
+            elif conn.heard_from and now - conn.last_seen > self.idle_timeout:
+                self.close(conn, CLOSE_IDLE)
+                reaped += 1
+            elif not conn.heard_from and 0 < self.max_missed_pings <= conn.unanswered:
+                self.close(conn, CLOSE_IDLE)
+                reaped += 1
+            elif not conn.queue.full() and self._offer(conn, PING):
+                conn.unanswered += 1
+                self.pings += 1
+        self.reaped += reaped
+        return reaped
+
+    async def _run_heartbeat(self) -> None:
+        # Exits once the worker has no sockets left; the next `add` restarts it.
+        try:
+            while self._by_user:
+                await asyncio.sleep(self.ping_interval)
+                self.heartbeat()
+        finally:
+            self._reaper = None
+
+    def close(self, conn: ClientConnection, code: int, final: dict = None) -> None:
+        """Unregisters `conn` and closes its socket, sending `final` first if given. Queued messages are discarded."""
+        self.remove(conn)
+        task = asyncio.get_running_loop().create_task(self._close_socket(conn, code, final))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_socket(conn: ClientConnection, code: int, final: dict = None) -> None:
+        try:
+            if final is not None:
+                await asyncio.wait_for(conn.websocket.send_json(final), SEND_TIMEOUT_SECONDS)
+            await conn.websocket.close(code=code)
+        except Exception:
+            pass  # already gone
+
+    def stats(self) -> dict:
+        conns = [c for user_conns in self._by_user.values() for c in user_conns]
+        sizes = [c.approx_bytes() for c in conns]
+        return {
+            "users": len(self._by_user),
+            "sockets": len(conns),
+            "queued": sum(c.queue.qsize() for c in conns),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "slow_closed": self.slow_closed,
+            "send_failures": self.send_failures,
+            "pings": self.pings,
+            "reaped": self.reaped,
+            "expired": self.expired,
+            "socket_bytes": sum(sizes),
+            "bytes_per_socket": round(sum(sizes) / len(sizes)) if sizes else None,
+            "max_socket_bytes": max(sizes, default=None),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "ping_interval": self.ping_interval,
+            "idle_timeout": self.idle_timeout,
+            "max_missed_pings": self.max_missed_pings,
+        }